@@ -28,15 +28,18 @@ from apps.goods.views import (
     bgm_get_characters_by_subject_id,
     CategoryViewSet,
     CharacterViewSet,
+    ChunkedUploadViewSet,
     GoodsViewSet,
     IPViewSet,
     ShowcaseViewSet,
     ThemeViewSet,
+    name_autocomplete,
 )
 from apps.location.views import (
     StorageNodeDetailView,
     StorageNodeGoodsView,
     StorageNodeListCreateView,
+    StorageNodeMoveView,
     StorageNodeTreeView,
 )
 from apps.users import views as user_views
@@ -48,6 +51,7 @@ router.register("characters", CharacterViewSet, basename="characters")
 router.register("categories", CategoryViewSet, basename="categories")
 router.register("themes", ThemeViewSet, basename="themes")
 router.register("showcases", ShowcaseViewSet, basename="showcases")
+router.register("uploads", ChunkedUploadViewSet, basename="uploads")
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -67,10 +71,13 @@ urlpatterns = [
     # BGM 两步式搜索接口
     path("api/bgm/search-subjects/", bgm_search_subjects, name="bgm-search-subjects"),
     path("api/bgm/get-characters-by-id/", bgm_get_characters_by_subject_id, name="bgm-get-characters-by-id"),
+    # 名称模糊检索（IP / 角色自动补全）
+    path("api/search/autocomplete/", name_autocomplete, name="search-autocomplete"),
     # 位置相关接口
     path("api/location/nodes/", StorageNodeListCreateView.as_view(), name="location-nodes"),
     path("api/location/nodes/<int:pk>/", StorageNodeDetailView.as_view(), name="location-node-detail"),
     path("api/location/nodes/<int:pk>/goods/", StorageNodeGoodsView.as_view(), name="location-node-goods"),
+    path("api/location/nodes/<int:pk>/move/", StorageNodeMoveView.as_view(), name="location-node-move"),
     path("api/location/tree/", StorageNodeTreeView.as_view(), name="location-tree"),
     # 导出 Schema 文件 (YAML格式)
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
@@ -5,10 +5,10 @@ class GoodsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.goods'
 
-    # def ready(self):
-    #     # 导入信号，确保模型文件清理逻辑生效
-    #     import apps.goods.signals  # noqa: F401
-        
+    def ready(self):
+        # 导入信号，确保幂等指纹维护与模型文件清理逻辑生效
+        import apps.goods.signals  # noqa: F401
+
     #     # 初始化品类数据
     #     self._init_categories()
     
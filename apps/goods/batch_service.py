@@ -0,0 +1,420 @@
+"""
+谷子批量操作服务模块
+一次请求内处理多条 create / update / delete 操作：
+- 逐条校验字段，外键（IP / 角色 / 品类 / 主题 / 位置）按关联各做一次 IN 查询
+- 任一操作校验失败则整体不生效，返回逐条结果
+- 校验通过后在同一事务内通过 bulk_create / bulk_update / 集合删除落库
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from apps.location.models import StorageNode
+from core.permissions import is_admin
+
+from .models import IP, Category, Character, Goods, ShowcaseGoods, Theme
+from .serializers import GoodsBatchOperationSerializer
+from .showcase_service import invalidate_goods_public_cache
+
+# 单次请求允许的最大操作数
+BATCH_MAX_OPERATIONS = 500
+# 稀疏排序步长（与 GoodsViewSet.ORDER_STEP 保持一致）
+ORDER_STEP = 1000
+
+OP_CREATE = "create"
+OP_UPDATE = "update"
+OP_DELETE = "delete"
+
+# 可直接赋值到模型上的字段：请求字段名 -> 模型属性名
+_FIELD_MAP = {
+    "name": "name",
+    "ip_id": "ip_id",
+    "category_id": "category_id",
+    "theme_id": "theme_id",
+    "location": "location_id",
+    "quantity": "quantity",
+    "price": "price",
+    "purchase_date": "purchase_date",
+    "is_official": "is_official",
+    "status": "status",
+    "notes": "notes",
+}
+_FINGERPRINT_KEYS = {"ip_id", "name", "purchase_date", "price", "character_ids"}
+
+
+class GoodsBatchProcessor:
+    """
+    谷子批量操作处理器。
+
+    可操作范围与 GoodsViewSet.get_queryset 一致（管理员可操作全部谷子），
+    新建的谷子归属 user，幂等规则与创建接口相同（命中已有指纹时返回已有谷子）。
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.queryset = Goods.objects.all() if is_admin(user) else Goods.objects.filter(user=user)
+        self.results = []
+        self.summary = {
+            "created": 0,
+            "updated": 0,
+            "deleted": 0,
+            "duplicated": 0,
+            "failed": 0,
+        }
+
+    # ---- 入口 ----
+
+    def run(self, operations):
+        """
+        处理操作列表，返回 (是否已落库, 响应数据)。
+        """
+        items = self._validate(operations)
+        if self.summary["failed"]:
+            # 整体不生效：校验通过的操作标记为 skipped
+            for item in items:
+                if not item["errors"]:
+                    self.results[item["index"]]["status"] = "skipped"
+            return False, self._payload(applied=False)
+
+        with transaction.atomic():
+            self._apply_deletes([item for item in items if item["op"] == OP_DELETE])
+            updates = [item for item in items if item["op"] == OP_UPDATE]
+            self._apply_updates(updates)
+            if updates:
+                # bulk_update 不触发信号，手动使相关公开展柜的缓存失效
+                invalidate_goods_public_cache([item["id"] for item in updates])
+            self._apply_creates([item for item in items if item["op"] == OP_CREATE])
+
+        for item in items:
+            if item["status"] == "error":
+                # 并发冲突且已有记录不可见的新建操作（见 _insert_goods）
+                self.results[item["index"]].update(status="error", errors=item["errors"])
+                self.summary["failed"] += 1
+                continue
+            self.results[item["index"]].update(id=str(item["id"]), status=item["status"])
+            self.summary[item["status"]] += 1
+        return True, self._payload(applied=True)
+
+    # ---- 校验 ----
+
+    def _payload(self, applied):
+        return {"applied": applied, **self.summary, "results": self.results}
+
+    def _fail(self, item, errors):
+        self.results[item["index"]].update(status="error", errors=errors)
+        item["errors"] = errors
+
+    def _validate(self, operations):
+        items = []
+        for index, raw in enumerate(operations):
+            op = raw.get("op") if isinstance(raw, dict) else None
+            self.results.append({"index": index, "op": op})
+            serializer = GoodsBatchOperationSerializer(data=raw)
+            item = {"index": index, "op": op, "errors": None}
+            if not serializer.is_valid():
+                self._fail(item, serializer.errors)
+            else:
+                validated = serializer.validated_data
+                item.update(
+                    id=validated.get("id"),
+                    data=dict(validated.get("data") or {}),
+                )
+                if "character_ids" in item["data"]:
+                    # 去重并保持顺序
+                    item["data"]["character_ids"] = list(dict.fromkeys(item["data"]["character_ids"]))
+            items.append(item)
+
+        valid = [item for item in items if not item["errors"]]
+        self._check_targets(valid)
+        self._check_relations(valid)
+
+        self.summary["failed"] = sum(1 for item in items if item["errors"])
+        return items
+
+    def _check_targets(self, items):
+        """
+        update / delete 的目标谷子：一次 IN 查询，并禁止同一谷子重复出现；
+        展柜中的谷子不能删除（ShowcaseGoods.goods 为 PROTECT），一次 IN 查询找出。
+        """
+        targeted = [item for item in items if item["op"] in (OP_UPDATE, OP_DELETE)]
+        if not targeted:
+            return
+
+        seen = set()
+        for item in targeted:
+            if item["id"] in seen:
+                self._fail(item, {"id": "同一谷子在一次批量请求中只能出现一次"})
+            seen.add(item["id"])
+
+        targets = self.queryset.in_bulk(list(seen))
+        for item in targeted:
+            if item["errors"]:
+                continue
+            goods = targets.get(item["id"])
+            if goods is None:
+                self._fail(item, {"id": "谷子不存在"})
+            else:
+                item["instance"] = goods
+
+        deletes = [item for item in targeted if item["op"] == OP_DELETE and not item["errors"]]
+        if not deletes:
+            return
+        in_showcase = set(
+            ShowcaseGoods.objects.filter(goods_id__in=[item["id"] for item in deletes])
+            .order_by()
+            .values_list("goods_id", flat=True)
+            .distinct()
+        )
+        for item in deletes:
+            if item["id"] in in_showcase:
+                self._fail(item, {"id": "谷子已加入展柜，请先从展柜中移除"})
+
+    def _private_queryset(self, model):
+        """主题 / 位置为私有数据，非管理员只能关联自己的"""
+        if is_admin(self.user):
+            return model.objects.all()
+        return model.objects.filter(user=self.user)
+
+    def _check_relations(self, items):
+        """按关联收集本批引用的外键ID，每类一次 IN 查询校验存在性与归属"""
+        items = [item for item in items if not item["errors"] and item["op"] != OP_DELETE]
+        if not items:
+            return
+
+        wanted = {key: set() for key in ("ip_id", "category_id", "theme_id", "location", "character_ids")}
+        for item in items:
+            data = item["data"]
+            for key in ("ip_id", "category_id", "theme_id", "location"):
+                if data.get(key) is not None:
+                    wanted[key].add(data[key])
+            wanted["character_ids"].update(data.get("character_ids", ()))
+
+        sources = {
+            "ip_id": (IP.objects.all(), "IP作品不存在"),
+            "category_id": (Category.objects.all(), "品类不存在"),
+            "theme_id": (self._private_queryset(Theme), "主题不存在"),
+            "location": (self._private_queryset(StorageNode), "位置节点不存在"),
+            "character_ids": (Character.objects.all(), "角色不存在"),
+        }
+        found = {}
+        for key, ids in wanted.items():
+            found[key] = set(sources[key][0].in_bulk(ids)) if ids else set()
+
+        for item in items:
+            data = item["data"]
+            errors = {}
+            for key in ("ip_id", "category_id", "theme_id", "location"):
+                value = data.get(key)
+                if value is not None and value not in found[key]:
+                    errors[key] = f"{sources[key][1]}: {value}"
+            unknown = [cid for cid in data.get("character_ids", ()) if cid not in found["character_ids"]]
+            if unknown:
+                errors["character_ids"] = f"角色不存在: {', '.join(str(cid) for cid in unknown)}"
+            if errors:
+                self._fail(item, {"data": errors})
+
+    # ---- 落库 ----
+
+    def _apply_deletes(self, items):
+        if not items:
+            return
+        # 走 QuerySet.delete：一次收集 + 批量删除，图片清理信号照常触发
+        self.queryset.filter(pk__in=[item["id"] for item in items]).delete()
+        for item in items:
+            item["status"] = "deleted"
+
+    @staticmethod
+    def _replace_characters(character_map, clear=True):
+        """整体替换若干谷子的角色关联：一次 DELETE + 一次 bulk_create"""
+        if not character_map:
+            return
+        Through = Goods.characters.through
+        if clear:
+            Through.objects.filter(goods_id__in=list(character_map)).delete()
+        Through.objects.bulk_create(
+            [
+                Through(goods_id=goods_id, character_id=cid)
+                for goods_id, character_ids in character_map.items()
+                for cid in character_ids
+            ]
+        )
+
+    def _apply_updates(self, items):
+        if not items:
+            return
+
+        now = timezone.now()
+        fields = {"updated_at"}
+        character_map = {}
+        recompute = []
+        for item in items:
+            goods = item["instance"]
+            data = item["data"]
+            for key, value in data.items():
+                attr = _FIELD_MAP.get(key)
+                if attr is None:
+                    continue
+                setattr(goods, attr, value)
+                fields.add(attr)
+            goods.updated_at = now
+            if "character_ids" in data:
+                character_map[goods.pk] = data["character_ids"]
+            if _FINGERPRINT_KEYS.intersection(data):
+                recompute.append(goods)
+            item["status"] = "updated"
+
+        released = set()
+        if recompute:
+            previous = {goods.pk: goods.fingerprint for goods in recompute}
+            self._recompute_fingerprints(recompute, character_map)
+            fields.add("fingerprint")
+            released = {
+                (goods.user_id, previous[goods.pk])
+                for goods in recompute
+                if previous[goods.pk] and previous[goods.pk] != goods.fingerprint
+            }
+
+        Goods.objects.bulk_update(
+            [item["instance"] for item in items],
+            sorted(fields),
+        )
+        self._replace_characters(character_map)
+        Goods.hand_over_fingerprints(released)
+
+    def _recompute_fingerprints(self, goods_list, character_map):
+        """
+        批量重算指纹。与 Goods.sync_fingerprint 语义一致：
+        目标指纹已被其它谷子持有时，当前谷子不占用指纹（置为 None）。
+        """
+        Through = Goods.characters.through
+        need_characters = [g.pk for g in goods_list if g.pk not in character_map]
+        current_characters = {}
+        for goods_id, cid in Through.objects.filter(goods_id__in=need_characters).values_list(
+            "goods_id", "character_id"
+        ):
+            current_characters.setdefault(goods_id, []).append(cid)
+
+        new_fingerprints = {}
+        for goods in goods_list:
+            character_ids = character_map.get(goods.pk, current_characters.get(goods.pk, []))
+            new_fingerprints[goods.pk] = Goods.build_fingerprint(
+                goods.ip_id, goods.name, goods.purchase_date, goods.price, character_ids
+            )
+
+        recompute_ids = set(new_fingerprints)
+        # 本批之外已持有目标指纹的谷子
+        taken = set(
+            Goods.objects.filter(fingerprint__in=set(new_fingerprints.values()))
+            .exclude(pk__in=recompute_ids)
+            .values_list("user_id", "fingerprint")
+        )
+        # 本批内谷子当前持有的指纹：保守地视为已占用，避免 UPDATE 过程中出现瞬时冲突
+        holders = {(g.user_id, g.fingerprint): g.pk for g in goods_list if g.fingerprint}
+        for goods in goods_list:
+            fingerprint = new_fingerprints[goods.pk]
+            key = (goods.user_id, fingerprint)
+            if fingerprint == goods.fingerprint:
+                taken.add(key)
+                continue
+            if key in taken or holders.get(key, goods.pk) != goods.pk:
+                goods.fingerprint = None
+                continue
+            goods.fingerprint = fingerprint
+            taken.add(key)
+
+    def _apply_creates(self, items):
+        if not items:
+            return
+
+        fingerprints = []
+        for item in items:
+            data = item["data"]
+            fingerprints.append(
+                Goods.build_fingerprint(
+                    data["ip_id"],
+                    data.get("name"),
+                    data.get("purchase_date"),
+                    data.get("price"),
+                    data["character_ids"],
+                )
+            )
+        existing = self._existing_fingerprints(fingerprints)
+
+        min_order = (
+            Goods.objects.filter(user=self.user)
+            .aggregate(min_order=Min("order"))
+            .get("min_order")
+        )
+        # 新建的谷子整体排在最前面，请求中靠前的操作更靠前
+        next_order = (min_order or 0) - ORDER_STEP * len(items)
+
+        created = []
+        character_map = {}
+        for item, fingerprint in zip(items, fingerprints):
+            if fingerprint in existing:
+                item.update(id=existing[fingerprint], status="duplicated")
+                continue
+            data = item["data"]
+            goods = Goods(
+                user=self.user,
+                order=next_order,
+                fingerprint=fingerprint,
+                **{
+                    _FIELD_MAP[key]: value
+                    for key, value in data.items()
+                    if key in _FIELD_MAP
+                },
+            )
+            next_order += ORDER_STEP
+            existing[fingerprint] = goods.pk
+            created.append((item, goods))
+            character_map[goods.pk] = data["character_ids"]
+            item.update(id=goods.pk, status="created")
+
+        replaced = self._insert_goods(created)
+        if replaced:
+            # 本批内指向被替换谷子的重复项同样改为指向已有记录
+            for item in items:
+                if item["status"] == "duplicated" and item["id"] in replaced:
+                    self._resolve_conflict(item, replaced[item["id"]])
+            for goods_id in replaced:
+                character_map.pop(goods_id, None)
+        self._replace_characters(character_map, clear=False)
+
+    def _existing_fingerprints(self, fingerprints):
+        """当前用户已持有的指纹：{fingerprint: goods_id}"""
+        return dict(
+            Goods.objects.filter(user=self.user, fingerprint__in=set(fingerprints))
+            .values_list("fingerprint", "id")
+        )
+
+    def _insert_goods(self, created):
+        """
+        一次 bulk_create 写入新谷子，返回 {未写入的谷子ID: 已有谷子ID 或 None}。
+        并发请求在校验之后抢先写入了相同指纹时，(user, fingerprint) 唯一约束会使整批插入失败：
+        此时回滚到保存点逐条插入，冲突的操作改为 duplicated 并返回已有谷子。
+        """
+        try:
+            with transaction.atomic():
+                Goods.objects.bulk_create([goods for _, goods in created])
+            return {}
+        except IntegrityError:
+            pass
+
+        replaced = {}
+        for item, goods in created:
+            try:
+                with transaction.atomic():
+                    Goods.objects.bulk_create([goods])
+            except IntegrityError:
+                existing_id = self._existing_fingerprints([goods.fingerprint]).get(goods.fingerprint)
+                replaced[goods.pk] = existing_id
+                self._resolve_conflict(item, existing_id)
+        return replaced
+
+    @staticmethod
+    def _resolve_conflict(item, existing_id):
+        if existing_id is None:
+            item.update(status="error", errors={"data": "与同时提交的谷子冲突，请重试"})
+        else:
+            item.update(id=existing_id, status="duplicated")
@@ -0,0 +1,137 @@
+"""
+目录缓存服务模块
+IP、IP 关键词、角色、品类是全局数据：由管理员维护、读多写少，却在每条谷子的序列化
+以及下拉 / 自动补全列表中被反复读取。这里在每个进程内存中保存一份目录快照：
+- 快照：IP（含关键词与角色数量）、角色（所属 IP 指向快照中的 IP 对象）、品类，加载共 4 条查询
+- 版本：目录数据写入时在同一事务中把 CatalogueVersion 更换为一个新的随机版本号（模型信号触发；
+  bulk_update、queryset.update、_raw_delete 等绕过信号的写入由调用方显式调用 bump_version）。
+  不使用递增计数：事务回滚后计数会退回原值，下一次递增得到的版本号可能与回滚前已加载的快照相同
+- 刷新：各进程最多每 CATALOGUE_CHECK_INTERVAL 秒读取一次版本号（一条单行查询），与快照版本不同时重新加载；
+  发起写入的进程立即重新核对（事务提交后再核对一次），其他进程最多滞后一个检查间隔
+
+版本号放在数据库而不是 Django 缓存中：默认的本地内存缓存按进程隔离，无法在多个 worker 之间传递变更。
+快照只用于序列化与只读列表：快照中取不到的对象（如刚在其他进程中创建）由调用方回退到数据库查询。
+写入时的外键存在性校验始终查库——快照最多滞后一个检查间隔，其他进程刚删除的对象仍可能命中快照，
+以它通过校验会在写入时触发外键约束错误。
+快照中的对象在进程内的各请求之间共享，只能读取，不要修改或保存。
+"""
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .models import IP, CatalogueVersion, Category, Character, IPKeyword
+
+# 两次核对版本号之间的最短间隔（秒）
+CHECK_INTERVAL = getattr(settings, "CATALOGUE_CHECK_INTERVAL", 1.0)
+# 版本号只有一行（由迁移创建）
+VERSION_ROW_ID = 1
+
+# 写入后需要更新版本号的模型
+CATALOGUE_MODELS = (IP, IPKeyword, Character, Category)
+# 快照中可按主键查找的模型
+CACHED_MODELS = (IP, Character, Category)
+
+_lock = threading.Lock()
+_snapshot = None
+_checked_at = 0.0
+
+
+class Catalogue:
+    """某一版本的目录快照，列表顺序与对应列表接口一致"""
+
+    def __init__(self, version):
+        self.version = version
+        self.ips = list(
+            IP.objects.prefetch_related("keywords")
+            .annotate(character_count=Count("characters"))
+            .order_by("order", "id")
+        )
+        ips_by_id = {ip.pk: ip for ip in self.ips}
+
+        self.characters = list(Character.objects.order_by("created_at"))
+        for character in self.characters:
+            ip = ips_by_id.get(character.ip_id)
+            if ip is not None:
+                # 所属 IP 直接指向快照中的对象，序列化角色时不再查询
+                Character.ip.field.set_cached_value(character, ip)
+
+        self.categories = list(Category.objects.order_by("order", "id"))
+
+        self._by_model = {
+            IP: ips_by_id,
+            Character: {character.pk: character for character in self.characters},
+            Category: {category.pk: category for category in self.categories},
+        }
+
+    def get(self, model, pk):
+        """按主键取快照中的对象，不存在时返回 None"""
+        return self._by_model[model].get(pk)
+
+    def in_bulk(self, model, pks):
+        """按主键批量取快照中的对象，返回 {pk: obj}（只包含找到的主键）"""
+        objects = self._by_model[model]
+        return {pk: objects[pk] for pk in pks if pk in objects}
+
+
+def _current_version():
+    return (
+        CatalogueVersion.objects.filter(pk=VERSION_ROW_ID)
+        .values_list("version", flat=True)
+        .first()
+    ) or 0
+
+
+def _fresh(now):
+    return _snapshot is not None and now - _checked_at < CHECK_INTERVAL
+
+
+def get_catalogue():
+    """
+    返回当前进程的目录快照；距上次核对超过检查间隔时先读取版本号，版本变化则重新加载。
+    """
+    global _snapshot, _checked_at
+    if _fresh(time.monotonic()):
+        return _snapshot
+    with _lock:
+        if _fresh(time.monotonic()):
+            return _snapshot
+        # 先读版本号再加载：加载期间发生的写入会使版本号前进，下次核对时重新加载
+        version = _current_version()
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = Catalogue(version)
+        _checked_at = time.monotonic()
+        return _snapshot
+
+
+def lookup(model, pk):
+    """从目录快照中按主键取对象；主键非法或不在快照中时返回 None（调用方回退到数据库）"""
+    if isinstance(pk, bool):
+        return None
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    return get_catalogue().get(model, pk)
+
+
+def expire():
+    """使本进程的快照在下次读取时重新核对版本号"""
+    global _checked_at
+    _checked_at = 0.0
+
+
+def bump_version():
+    """
+    目录数据变化后更换版本号（在写入所在的事务中调用，随事务一起提交或回滚）。
+    本进程立即重新核对，事务提交后再核对一次；回滚时数据库中的版本号退回原值，与回滚前加载的快照不同，下次核对时重新加载。
+    """
+    version = secrets.randbits(63)
+    updated = CatalogueVersion.objects.filter(pk=VERSION_ROW_ID).update(version=version)
+    if not updated:
+        CatalogueVersion.objects.update_or_create(pk=VERSION_ROW_ID, defaults={"version": version})
+    expire()
+    transaction.on_commit(expire)
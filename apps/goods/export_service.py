@@ -0,0 +1,251 @@
+"""
+谷子导出服务模块
+以流式方式将用户的谷子数据导出为 JSONL / CSV / ZIP（含图片），
+全程基于 QuerySet.iterator(chunk_size=...) 分批读取，内存占用与收藏规模无关。
+"""
+import csv
+import json
+import tempfile
+import time
+import zipfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+# 每批从数据库读取的谷子数量（iterator 配合 prefetch_related 时按批预取关联数据）
+EXPORT_CHUNK_SIZE = 500
+# 从存储读取图片时的分块大小（字节）
+FILE_CHUNK_SIZE = 64 * 1024
+# ZIP 清单在内存中暂存的上限（字节），超过后落盘到临时文件
+MANIFEST_SPOOL_SIZE = 1024 * 1024
+
+EXPORT_FORMAT_JSONL = "jsonl"
+EXPORT_FORMAT_CSV = "csv"
+EXPORT_FORMAT_ZIP = "zip"
+EXPORT_FORMATS = (EXPORT_FORMAT_JSONL, EXPORT_FORMAT_CSV, EXPORT_FORMAT_ZIP)
+
+# ZIP 包内的清单文件名与图片目录前缀
+ZIP_MANIFEST_NAME = "goods.jsonl"
+ZIP_MEDIA_PREFIX = "media/"
+
+CSV_HEADERS = (
+    "id",
+    "name",
+    "ip_id",
+    "ip_name",
+    "character_ids",
+    "character_names",
+    "category_id",
+    "category_path",
+    "location_id",
+    "location_path",
+    "theme_id",
+    "theme_name",
+    "main_photo",
+    "additional_photos",
+    "quantity",
+    "price",
+    "purchase_date",
+    "is_official",
+    "status",
+    "notes",
+    "order",
+    "created_at",
+    "updated_at",
+)
+
+
+def _file_name(field_file):
+    """返回 ImageField 在存储中的相对路径，无文件时返回 None"""
+    if field_file and getattr(field_file, "name", None):
+        return field_file.name
+    return None
+
+
+def build_goods_row(goods):
+    """
+    将单个谷子（需预加载 ip/category/location/theme/characters/additional_photos）
+    转换为可 JSON 序列化的字典。图片字段输出存储内相对路径。
+    """
+    location = goods.location
+    category = goods.category
+    theme = goods.theme
+    return {
+        "id": str(goods.id),
+        "name": goods.name,
+        "ip": {"id": goods.ip_id, "name": goods.ip.name},
+        "characters": [
+            {"id": c.id, "name": c.name} for c in goods.characters.all()
+        ],
+        "category": {
+            "id": category.id,
+            "name": category.name,
+            "path_name": category.path_name or category.name,
+        },
+        "location_path": (location.path_name or location.name) if location else None,
+        "location_id": goods.location_id,
+        "theme": {"id": theme.id, "name": theme.name} if theme else None,
+        "main_photo": _file_name(goods.main_photo),
+        "additional_photos": [
+            {"id": p.id, "image": _file_name(p.image), "label": p.label}
+            for p in goods.additional_photos.all()
+        ],
+        "quantity": goods.quantity,
+        "price": goods.price,
+        "purchase_date": goods.purchase_date,
+        "is_official": goods.is_official,
+        "status": goods.status,
+        "notes": goods.notes,
+        "order": goods.order,
+        "created_at": goods.created_at,
+        "updated_at": goods.updated_at,
+    }
+
+
+def _dumps_line(row):
+    return json.dumps(row, ensure_ascii=False, cls=DjangoJSONEncoder) + "\n"
+
+
+def _iter_rows(queryset):
+    for goods in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield build_goods_row(goods)
+
+
+def iter_jsonl(queryset):
+    """逐行生成 JSONL 文本"""
+    for row in _iter_rows(queryset):
+        yield _dumps_line(row)
+
+
+class _Echo:
+    """
+    只实现 write 的伪文件对象：csv.writer 写入的内容原样返回，由生成器直接 yield。
+    """
+
+    def write(self, value):
+        return value
+
+
+class _StreamBuffer:
+    """
+    供 zipfile 写入的伪文件对象：写入内容暂存后由生成器及时 drain 并 yield，
+    不在内存中累积整个压缩包。未实现 seek/tell，zipfile 会按不可 seek 的流处理。
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks = self._chunks
+        self._chunks = []
+        return chunks
+
+
+def _csv_values(row):
+    ip = row["ip"]
+    category = row["category"]
+    theme = row["theme"]
+    return (
+        row["id"],
+        row["name"],
+        ip["id"],
+        ip["name"],
+        "|".join(str(c["id"]) for c in row["characters"]),
+        "|".join(c["name"] for c in row["characters"]),
+        category["id"],
+        category["path_name"],
+        row["location_id"] or "",
+        row["location_path"] or "",
+        theme["id"] if theme else "",
+        theme["name"] if theme else "",
+        row["main_photo"] or "",
+        "|".join(p["image"] for p in row["additional_photos"] if p["image"]),
+        row["quantity"],
+        "" if row["price"] is None else row["price"],
+        row["purchase_date"].isoformat() if row["purchase_date"] else "",
+        "true" if row["is_official"] else "false",
+        row["status"],
+        row["notes"] or "",
+        row["order"],
+        row["created_at"].isoformat() if row["created_at"] else "",
+        row["updated_at"].isoformat() if row["updated_at"] else "",
+    )
+
+
+def iter_csv(queryset):
+    """逐行生成 CSV 文本（带 UTF-8 BOM，方便 Excel 直接打开中文）"""
+    writer = csv.writer(_Echo())
+    yield "\ufeff" + writer.writerow(CSV_HEADERS)
+    for row in _iter_rows(queryset):
+        yield writer.writerow(_csv_values(row))
+
+
+def _media_files(goods):
+    """谷子引用的所有图片 (storage, 相对路径)（主图 + 补充图片）"""
+    main_name = _file_name(goods.main_photo)
+    if main_name:
+        yield goods.main_photo.storage, main_name
+    for photo in goods.additional_photos.all():
+        image_name = _file_name(photo.image)
+        if image_name:
+            yield photo.image.storage, image_name
+
+
+def _write_media(archive, output, storage, name, date_time):
+    """将一张图片按块写入压缩包，逐块 yield 输出；存储中已缺失的文件直接跳过"""
+    try:
+        source = storage.open(name, "rb")
+    except (FileNotFoundError, OSError):
+        return
+    # 图片已压缩为 JPEG，再次压缩收益很小，直接 STORED
+    info = zipfile.ZipInfo(ZIP_MEDIA_PREFIX + name, date_time=date_time)
+    info.compress_type = zipfile.ZIP_STORED
+    with source, archive.open(info, mode="w") as target:
+        for chunk in iter(lambda: source.read(FILE_CHUNK_SIZE), b""):
+            target.write(chunk)
+            yield from output.drain()
+    yield from output.drain()
+
+
+def iter_zip(queryset):
+    """
+    生成 ZIP 字节流：
+    - goods.jsonl：清单文件，图片字段为存储内相对路径
+    - media/<相对路径>：对应的图片文件
+
+    zipfile 写入不可 seek 的输出时会自动使用 data descriptor，
+    因此可以边写边 yield；图片按 FILE_CHUNK_SIZE 分块拷贝，不会整张读入内存。
+
+    只遍历一次谷子：每条记录的图片紧随其后写入压缩包，
+    避免两次遍历之间谷子增删导致 media/ 与 goods.jsonl 不一致。
+    同一时刻压缩包只能写一个条目，清单行先写入临时文件（超过 MANIFEST_SPOOL_SIZE 落盘），
+    遍历结束后再作为 goods.jsonl 写入；多件谷子共用的图片按压缩包已有条目去重，
+    不额外保存图片路径集合。
+    """
+    output = _StreamBuffer()
+    date_time = time.localtime()[:6]
+    with zipfile.ZipFile(output, mode="w") as archive, tempfile.SpooledTemporaryFile(
+        max_size=MANIFEST_SPOOL_SIZE
+    ) as manifest_lines:
+        for goods in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            manifest_lines.write(_dumps_line(build_goods_row(goods)).encode("utf-8"))
+            for storage, name in _media_files(goods):
+                if ZIP_MEDIA_PREFIX + name not in archive.NameToInfo:
+                    yield from _write_media(archive, output, storage, name, date_time)
+
+        manifest_lines.seek(0)
+        manifest_info = zipfile.ZipInfo(ZIP_MANIFEST_NAME, date_time=date_time)
+        manifest_info.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(manifest_info, mode="w", force_zip64=True) as manifest:
+            for chunk in iter(lambda: manifest_lines.read(FILE_CHUNK_SIZE), b""):
+                manifest.write(chunk)
+                yield from output.drain()
+
+    # 中央目录在 close 时写出
+    yield from output.drain()
@@ -0,0 +1,92 @@
+"""
+谷子列表分面统计服务模块
+列表接口传入 ?facets=ip,status,... 时，在当前过滤 / 搜索条件下统计各维度取值的谷子数：
+- 当前条件只求一次谷子 ID 集合，以子查询形式内联到每个维度的分组统计中（每个维度一条 GROUP BY）
+- 每个维度只返回数量最多的前 N 个取值，结果大小与收藏规模无关
+"""
+from django.db.models import Count
+
+from .models import Goods
+
+FACET_DEFAULT_LIMIT = 10
+FACET_MAX_LIMIT = 50
+
+# 维度名 -> (分组字段, 展示名字段)；展示名字段为 None 时由 _label 处理
+FACET_FIELDS = {
+    "ip": ("ip_id", "ip__name"),
+    "category": ("category_id", "category__path_name"),
+    "location": ("location_id", "location__path_name"),
+    "theme": ("theme_id", "theme__name"),
+    "character": ("characters__id", "characters__name"),
+    "status": ("status", None),
+    "is_official": ("is_official", None),
+}
+
+STATUS_LABELS = dict(Goods.STATUS_CHOICES)
+
+
+class InvalidFacet(ValueError):
+    pass
+
+
+def parse_facets(value):
+    """解析 ?facets=ip,status，返回去重后的维度名列表；包含未知维度时抛出 InvalidFacet"""
+    names = []
+    for name in (value or "").split(","):
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+    unknown = [name for name in names if name not in FACET_FIELDS]
+    if unknown:
+        raise InvalidFacet(
+            f"不支持的分面：{', '.join(unknown)}，可选：{', '.join(FACET_FIELDS)}"
+        )
+    return names
+
+
+def parse_limit(value):
+    """每个维度返回的取值个数，非法时使用默认值"""
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return FACET_DEFAULT_LIMIT
+    return max(1, min(limit, FACET_MAX_LIMIT))
+
+
+def _label(name, value):
+    if name == "status":
+        return STATUS_LABELS.get(value, value)
+    if name == "is_official":
+        return "官谷" if value else "非官谷"
+    return None
+
+
+def compute_facets(queryset, names, limit=FACET_DEFAULT_LIMIT):
+    """
+    统计 queryset（已应用过滤 / 搜索）中各维度取值的谷子数。
+
+    返回 {维度名: [{"value": ..., "label": ..., "count": ...}, ...]}，
+    按 count 倒序、value 正序；value 为 null 表示未设置该维度（如未指定位置）。
+    """
+    # 搜索跨多对多关联时 queryset 可能含重复行，先收敛为谷子 ID 集合
+    goods_ids = queryset.order_by().values("id")
+    base = Goods.objects.filter(id__in=goods_ids).order_by()
+
+    facets = {}
+    for name in names:
+        field, label_field = FACET_FIELDS[name]
+        columns = (field, label_field) if label_field else (field,)
+        rows = (
+            base.values(*columns)
+            .annotate(count=Count("id", distinct=True))
+            .order_by("-count", field)[:limit]
+        )
+        facets[name] = [
+            {
+                "value": row[field],
+                "label": row[label_field] if label_field else _label(name, row[field]),
+                "count": row["count"],
+            }
+            for row in rows
+        ]
+    return facets
@@ -0,0 +1,467 @@
+"""
+谷子批量导入服务模块
+从 CSV / JSONL 文件流式读取谷子数据，按批解析 IP / 角色 / 品类 / 位置 / 主题名称，
+以集合方式做幂等去重，并通过 bulk_create 批量写入谷子及角色关联。
+
+文件格式与导出接口（export_service）保持一致，导出的文件可直接导入。
+"""
+import csv
+import datetime
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Min, Q
+
+from apps.location.models import StorageNode
+
+from .models import IP, Category, Character, Goods, Theme
+
+IMPORT_FORMAT_CSV = "csv"
+IMPORT_FORMAT_JSONL = "jsonl"
+IMPORT_FORMATS = (IMPORT_FORMAT_CSV, IMPORT_FORMAT_JSONL)
+
+# 每批解析 / 写入的行数
+IMPORT_BATCH_SIZE = 500
+# 稀疏排序步长（与 GoodsViewSet.ORDER_STEP 保持一致）
+ORDER_STEP = 1000
+# 多值字段（角色等）在 CSV 中的分隔符
+MULTI_VALUE_SEPARATOR = "|"
+
+_STATUS_VALUES = {value for value, _ in Goods.STATUS_CHOICES}
+_TRUE_VALUES = {"1", "true", "yes", "y", "是", "官谷"}
+_FALSE_VALUES = {"0", "false", "no", "n", "否", "非官谷"}
+_PRICE_LIMIT = Decimal("100000000")  # 对应 DecimalField(max_digits=10, decimal_places=2)
+
+
+def detect_format(filename, default=IMPORT_FORMAT_CSV):
+    """根据文件扩展名推断导入格式"""
+    lower = (filename or "").lower()
+    if lower.endswith(".jsonl") or lower.endswith(".ndjson") or lower.endswith(".json"):
+        return IMPORT_FORMAT_JSONL
+    if lower.endswith(".csv"):
+        return IMPORT_FORMAT_CSV
+    return default
+
+
+def _split_multi(value):
+    if not value:
+        return []
+    return [item.strip() for item in str(value).split(MULTI_VALUE_SEPARATOR) if item.strip()]
+
+
+def _normalize_jsonl(obj):
+    """将导出格式的 JSON 对象转换为与 CSV 相同的扁平字段"""
+    ip = obj.get("ip")
+    category = obj.get("category")
+    theme = obj.get("theme")
+    characters = obj.get("characters")
+    if isinstance(characters, list):
+        character_names = [
+            c.get("name") if isinstance(c, dict) else c for c in characters
+        ]
+    else:
+        character_names = _split_multi(obj.get("character_names"))
+    return {
+        "name": obj.get("name"),
+        "ip_name": ip.get("name") if isinstance(ip, dict) else obj.get("ip_name", ip),
+        "character_names": [n for n in character_names if n],
+        "category_path": (
+            (category.get("path_name") or category.get("name"))
+            if isinstance(category, dict)
+            else obj.get("category_path", category)
+        ),
+        "location_path": obj.get("location_path"),
+        "theme_name": theme.get("name") if isinstance(theme, dict) else obj.get("theme_name", theme),
+        "quantity": obj.get("quantity"),
+        "price": obj.get("price"),
+        "purchase_date": obj.get("purchase_date"),
+        "is_official": obj.get("is_official"),
+        "status": obj.get("status"),
+        "notes": obj.get("notes"),
+    }
+
+
+def _normalize_csv(row):
+    return {
+        "name": row.get("name"),
+        "ip_name": row.get("ip_name"),
+        "character_names": _split_multi(row.get("character_names")),
+        "category_path": row.get("category_path"),
+        "location_path": row.get("location_path"),
+        "theme_name": row.get("theme_name"),
+        "quantity": row.get("quantity"),
+        "price": row.get("price"),
+        "purchase_date": row.get("purchase_date"),
+        "is_official": row.get("is_official"),
+        "status": row.get("status"),
+        "notes": row.get("notes"),
+    }
+
+
+def iter_records(binary_file, file_format):
+    """
+    流式读取上传文件，逐条产出 (行号, 扁平字段字典 或 None, 解析错误 或 None)。
+    不会将整个文件读入内存。
+    """
+    binary_file.seek(0)
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    try:
+        if file_format == IMPORT_FORMAT_JSONL:
+            for line_no, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    obj = json.loads(line)
+                except ValueError:
+                    yield line_no, None, "JSON 格式错误"
+                    continue
+                if not isinstance(obj, dict):
+                    yield line_no, None, "每行必须是 JSON 对象"
+                    continue
+                yield line_no, _normalize_jsonl(obj), None
+        else:
+            reader = csv.DictReader(text)
+            for row in reader:
+                # 表头占第 1 行，数据行号从 2 开始
+                yield reader.line_num, _normalize_csv(row), None
+    finally:
+        # 避免 TextIOWrapper 回收时关闭底层上传文件
+        text.detach()
+
+
+def count_records(binary_file, file_format):
+    """预扫描文件统计记录数，用于一次性分配连续的稀疏排序区间"""
+    return sum(1 for _ in iter_records(binary_file, file_format))
+
+
+class GoodsImporter:
+    """
+    谷子批量导入器。
+
+    - 名称解析：每批收集未知名称，每类关联一次 IN 查询，结果缓存在内存映射中跨批复用
+    - 幂等去重：每批一次 fingerprint__in 索引查询，文件内部重复同样跳过
+    - 排序值：导入前一次 Min("order") 聚合，整体分配到现有谷子之前，并保持文件内顺序
+    - 写入：Goods.bulk_create + 角色关联表 bulk_create，每批一个事务；
+      并发写入相同指纹时由唯一约束忽略冲突行（ON CONFLICT DO NOTHING），按实际写入的谷子建立角色关联
+    """
+
+    def __init__(self, user, batch_size=IMPORT_BATCH_SIZE):
+        self.user = user
+        self.batch_size = batch_size
+        self._ip_map = {}  # name -> id / None
+        self._character_map = {}  # (ip_id, name) -> id / None
+        self._category_map = {}  # path_name 或 name -> id / None
+        self._location_map = {}  # path_name -> id / None
+        self._theme_map = {}  # name -> id / None
+        self._seen_fingerprints = set()
+        self._next_order = 0
+        self.result = {
+            "total": 0,
+            "created": 0,
+            "duplicated": 0,
+            "failed": 0,
+            "errors": [],
+        }
+
+    # ---- 入口 ----
+
+    def run(self, binary_file, file_format):
+        total = count_records(binary_file, file_format)
+        min_order = (
+            Goods.objects.filter(user=self.user)
+            .aggregate(min_order=Min("order"))
+            .get("min_order")
+        )
+        # 新导入的谷子整体排在最前面，文件第一行最靠前
+        self._next_order = (min_order or 0) - ORDER_STEP * total
+
+        batch = []
+        for line_no, record, error in iter_records(binary_file, file_format):
+            self.result["total"] += 1
+            if error:
+                self._fail(line_no, {"detail": error})
+                continue
+            batch.append((line_no, record))
+            if len(batch) >= self.batch_size:
+                self._process_batch(batch)
+                batch = []
+        if batch:
+            self._process_batch(batch)
+        return self.result
+
+    # ---- 内部实现 ----
+
+    def _fail(self, line_no, errors):
+        self.result["failed"] += 1
+        self.result["errors"].append({"line": line_no, "errors": errors})
+
+    def _take_order(self):
+        order = self._next_order
+        self._next_order += ORDER_STEP
+        return order
+
+    @staticmethod
+    def _clean_text(value):
+        if value is None:
+            return ""
+        return str(value).strip()
+
+    def _resolve_names(self, batch):
+        """按批补全名称映射：每类关联最多一次 IN 查询"""
+        ip_names = set()
+        category_keys = set()
+        location_keys = set()
+        theme_names = set()
+        for _, record in batch:
+            ip_names.add(self._clean_text(record["ip_name"]))
+            category_keys.add(self._clean_text(record["category_path"]))
+            location_keys.add(self._clean_text(record["location_path"]))
+            theme_names.add(self._clean_text(record["theme_name"]))
+
+        missing = {n for n in ip_names if n and n not in self._ip_map}
+        if missing:
+            found = dict(IP.objects.filter(name__in=missing).values_list("name", "id"))
+            for name in missing:
+                self._ip_map[name] = found.get(name)
+
+        char_keys = set()
+        for _, record in batch:
+            ip_id = self._ip_map.get(self._clean_text(record["ip_name"]))
+            if ip_id is None:
+                continue
+            for name in record["character_names"]:
+                key = (ip_id, self._clean_text(name))
+                if key not in self._character_map:
+                    char_keys.add(key)
+        if char_keys:
+            rows = Character.objects.filter(
+                ip_id__in={k[0] for k in char_keys},
+                name__in={k[1] for k in char_keys},
+            ).values_list("ip_id", "name", "id")
+            found = {(ip_id, name): cid for ip_id, name, cid in rows}
+            for key in char_keys:
+                self._character_map[key] = found.get(key)
+
+        missing = {k for k in category_keys if k and k not in self._category_map}
+        if missing:
+            rows = list(
+                Category.objects.filter(
+                    Q(path_name__in=missing) | Q(name__in=missing)
+                ).values_list("id", "name", "path_name")
+            )
+            by_path = {path: cid for cid, _, path in rows if path}
+            name_hits = {}
+            for cid, name, _ in rows:
+                name_hits.setdefault(name, []).append(cid)
+            for key in missing:
+                if key in by_path:
+                    self._category_map[key] = by_path[key]
+                elif len(name_hits.get(key, [])) == 1:
+                    # 仅在名称唯一时按名称匹配，避免同名子品类歧义
+                    self._category_map[key] = name_hits[key][0]
+                else:
+                    self._category_map[key] = None
+
+        missing = {k for k in location_keys if k and k not in self._location_map}
+        if missing:
+            found = dict(
+                StorageNode.objects.filter(user=self.user, path_name__in=missing)
+                .values_list("path_name", "id")
+            )
+            for key in missing:
+                self._location_map[key] = found.get(key)
+
+        missing = {n for n in theme_names if n and n not in self._theme_map}
+        if missing:
+            found = dict(
+                Theme.objects.filter(user=self.user, name__in=missing)
+                .values_list("name", "id")
+            )
+            for name in missing:
+                self._theme_map[name] = found.get(name)
+
+    def _parse_record(self, record):
+        """校验并转换单行数据，返回 (字段字典, 角色ID列表, 错误字典)"""
+        errors = {}
+
+        name = self._clean_text(record["name"])
+        if not name:
+            errors["name"] = "必填"
+        elif len(name) > Goods._meta.get_field("name").max_length:
+            errors["name"] = "名称过长"
+
+        ip_name = self._clean_text(record["ip_name"])
+        ip_id = self._ip_map.get(ip_name) if ip_name else None
+        if not ip_name:
+            errors["ip_name"] = "必填"
+        elif ip_id is None:
+            errors["ip_name"] = f"IP作品不存在: {ip_name}"
+
+        character_ids = []
+        names = [self._clean_text(n) for n in record["character_names"] if self._clean_text(n)]
+        if not names:
+            errors["character_names"] = "至少需要关联一个角色"
+        elif ip_id is not None:
+            unknown = []
+            for char_name in names:
+                cid = self._character_map.get((ip_id, char_name))
+                if cid is None:
+                    unknown.append(char_name)
+                elif cid not in character_ids:
+                    character_ids.append(cid)
+            if unknown:
+                errors["character_names"] = f"角色不存在: {', '.join(unknown)}"
+
+        category_key = self._clean_text(record["category_path"])
+        category_id = self._category_map.get(category_key) if category_key else None
+        if not category_key:
+            errors["category_path"] = "必填"
+        elif category_id is None:
+            errors["category_path"] = f"品类不存在: {category_key}"
+
+        location_key = self._clean_text(record["location_path"])
+        location_id = None
+        if location_key:
+            location_id = self._location_map.get(location_key)
+            if location_id is None:
+                errors["location_path"] = f"位置不存在: {location_key}"
+
+        theme_name = self._clean_text(record["theme_name"])
+        theme_id = None
+        if theme_name:
+            theme_id = self._theme_map.get(theme_name)
+            if theme_id is None:
+                errors["theme_name"] = f"主题不存在: {theme_name}"
+
+        quantity = 1
+        quantity_text = self._clean_text(record["quantity"])
+        if quantity_text:
+            try:
+                quantity = int(quantity_text)
+                if quantity < 0:
+                    raise ValueError
+            except ValueError:
+                errors["quantity"] = "数量必须为非负整数"
+
+        price = None
+        price_text = self._clean_text(record["price"])
+        if price_text:
+            try:
+                price = Decimal(price_text).quantize(Decimal("0.01"))
+                if not price.is_finite() or abs(price) >= _PRICE_LIMIT:
+                    raise InvalidOperation
+            except (InvalidOperation, ValueError):
+                errors["price"] = "单价格式错误"
+                price = None
+
+        purchase_date = None
+        date_text = self._clean_text(record["purchase_date"])
+        if date_text:
+            try:
+                purchase_date = datetime.date.fromisoformat(date_text[:10])
+            except ValueError:
+                errors["purchase_date"] = "日期格式错误，应为 YYYY-MM-DD"
+
+        is_official = True
+        official_text = self._clean_text(record["is_official"]).lower()
+        if official_text:
+            if official_text in _TRUE_VALUES:
+                is_official = True
+            elif official_text in _FALSE_VALUES:
+                is_official = False
+            else:
+                errors["is_official"] = "是否官谷格式错误"
+
+        status_value = self._clean_text(record["status"]) or "in_cabinet"
+        if status_value not in _STATUS_VALUES:
+            errors["status"] = f"状态不合法: {status_value}"
+
+        fields = {
+            "name": name,
+            "ip_id": ip_id,
+            "category_id": category_id,
+            "location_id": location_id,
+            "theme_id": theme_id,
+            "quantity": quantity,
+            "price": price,
+            "purchase_date": purchase_date,
+            "is_official": is_official,
+            "status": status_value,
+            "notes": self._clean_text(record["notes"]) or None,
+        }
+        return fields, character_ids, errors
+
+    def _existing_fingerprints(self, fingerprints):
+        """一次索引查询取出本批已存在的指纹"""
+        if not fingerprints:
+            return set()
+        return set(
+            Goods.objects.filter(user=self.user, fingerprint__in=fingerprints)
+            .values_list("fingerprint", flat=True)
+        )
+
+    def _process_batch(self, batch):
+        self._resolve_names(batch)
+
+        parsed = []
+        for line_no, record in batch:
+            fields, character_ids, errors = self._parse_record(record)
+            if errors:
+                self._fail(line_no, errors)
+                continue
+            parsed.append((line_no, fields, character_ids))
+
+        fingerprints = [
+            Goods.build_fingerprint(
+                fields["ip_id"],
+                fields["name"],
+                fields["purchase_date"],
+                fields["price"],
+                character_ids,
+            )
+            for _, fields, character_ids in parsed
+        ]
+        existing = self._existing_fingerprints(set(fingerprints))
+
+        new_goods = []
+        goods_characters = []
+        for (line_no, fields, character_ids), fingerprint in zip(parsed, fingerprints):
+            if fingerprint in existing or fingerprint in self._seen_fingerprints:
+                self.result["duplicated"] += 1
+                continue
+            self._seen_fingerprints.add(fingerprint)
+
+            goods = Goods(
+                user=self.user,
+                order=self._take_order(),
+                fingerprint=fingerprint,
+                **fields,
+            )
+            new_goods.append(goods)
+            goods_characters.append((goods, character_ids))
+
+        if not new_goods:
+            return
+
+        Through = Goods.characters.through
+        with transaction.atomic():
+            # 预查指纹之后其他请求可能已写入相同谷子：忽略违反 (user, fingerprint) 唯一约束的行，
+            # 再按主键（客户端生成的 UUID）查出实际写入的谷子
+            Goods.objects.bulk_create(new_goods, batch_size=self.batch_size, ignore_conflicts=True)
+            inserted = set(
+                Goods.objects.filter(pk__in=[goods.pk for goods in new_goods])
+                .values_list("pk", flat=True)
+            )
+            Through.objects.bulk_create(
+                [
+                    Through(goods_id=goods.id, character_id=cid)
+                    for goods, character_ids in goods_characters
+                    if goods.pk in inserted
+                    for cid in character_ids
+                ],
+                batch_size=self.batch_size,
+            )
+        self.result["created"] += len(inserted)
+        self.result["duplicated"] += len(new_goods) - len(inserted)
@@ -0,0 +1,220 @@
+import datetime
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.goods.models import Character, Goods, GuziImage, MediaBlob, Showcase, ThemeImage
+from apps.location.models import StorageNode
+
+# 需要扫描的媒体目录 -> 引用该目录文件的模型字段（按此顺序扫描，断点续跑依赖该顺序）
+MEDIA_REFERENCES = (
+    ("goods/main/", Goods, "main_photo"),
+    ("goods/extra/", GuziImage, "image"),
+    ("themes/extra/", ThemeImage, "image"),
+    ("showcases/covers/", Showcase, "cover_image"),
+    ("location/", StorageNode, "image"),
+    ("characters/", Character, "avatar"),
+    ("blobs/", MediaBlob, "path"),
+)
+
+
+def _path_key(name):
+    """按路径分段比较，保证与逐层排序遍历的顺序一致"""
+    return tuple(name.split("/"))
+
+
+class Command(BaseCommand):
+    """
+    清理存储中未被任何记录引用的孤儿媒体文件。
+
+    产生原因：图片替换、级联删除（GuziImage / ThemeImage 没有删除信号）、上传失败等。
+    扫描方式：
+    - 逐目录流式列出存储中的文件（按路径排序），每凑满一批文件
+      对相应模型做一次 `字段 IN (...)` 查询，内存占用只与批大小有关
+    - 每批处理完写入断点文件，中断后再次运行从断点继续，全部完成后删除断点
+    - 修改时间在 --min-age 之内的文件视为可能仍在上传 / 未提交，跳过
+    """
+
+    help = "Delete media files that are no longer referenced by any record."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prefix",
+            action="append",
+            choices=[prefix for prefix, _, _ in MEDIA_REFERENCES],
+            help="只扫描指定目录（可重复），默认扫描全部",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="只列出将被删除的文件，不实际删除",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="每批比对的文件数，默认 500",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=20,
+            help="每秒最多删除的文件数，默认 20，0 表示不限速",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=3600,
+            help="只清理修改时间早于该秒数的文件，默认 3600",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=os.path.join(settings.MEDIA_ROOT, ".media_gc_checkpoint.json"),
+            help="断点文件路径",
+        )
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="忽略已有断点，从头开始扫描",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size <= 0:
+            raise CommandError("batch-size 必须为正整数")
+        if options["rate"] < 0:
+            raise CommandError("rate 不能为负数")
+
+        self.dry_run = options["dry_run"]
+        self.delete_interval = 1 / options["rate"] if options["rate"] else 0
+        self.cutoff = timezone.now() - datetime.timedelta(seconds=options["min_age"])
+        self.checkpoint_path = options["checkpoint"]
+        self.stats = {"scanned": 0, "orphaned": 0, "deleted": 0}
+
+        selected = set(options["prefix"] or [])
+        references = [ref for ref in MEDIA_REFERENCES if not selected or ref[0] in selected]
+
+        checkpoint = None if options["reset"] else self._load_checkpoint()
+        if checkpoint and checkpoint["prefix"] not in {ref[0] for ref in references}:
+            self.stdout.write(f"断点目录 {checkpoint['prefix']} 不在本次扫描范围内，从头开始")
+            checkpoint = None
+        if checkpoint:
+            self.stdout.write(f"从断点继续：{checkpoint['prefix']} 之后的 {checkpoint['last'] or '开头'}")
+            self.stats.update(checkpoint.get("stats", {}))
+
+        started = checkpoint is None
+        for prefix, model, field in references:
+            last = None
+            if not started:
+                if prefix != checkpoint["prefix"]:
+                    continue
+                started = True
+                last = checkpoint["last"]
+            self._scan_prefix(prefix, model, field, last, batch_size)
+
+        if not self.dry_run and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+        action = "将删除" if self.dry_run else "已删除"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"扫描完成：共 {self.stats['scanned']} 个文件，孤儿文件 {self.stats['orphaned']} 个，"
+                f"{action} {self.stats['orphaned'] if self.dry_run else self.stats['deleted']} 个"
+            )
+        )
+
+    # ---- 扫描 ----
+
+    def _iter_files(self, directory, last):
+        """
+        按路径顺序逐目录列出文件，跳过断点之前的部分。
+        使用 storage.listdir，兼容本地与对象存储后端。
+        """
+        try:
+            dirs, files = default_storage.listdir(directory)
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        last_key = _path_key(last) if last else None
+        entries = [(name, True) for name in dirs] + [(name, False) for name in files]
+        for name, is_dir in sorted(entries):
+            path = f"{directory.rstrip('/')}/{name}"
+            key = _path_key(path)
+            if is_dir:
+                # 整个子目录都在断点之前时跳过
+                if last_key and key < last_key[: len(key)]:
+                    continue
+                yield from self._iter_files(path, last)
+            else:
+                if last_key and key <= last_key:
+                    continue
+                yield path
+
+    def _scan_prefix(self, prefix, model, field, last, batch_size):
+        self.stdout.write(f"扫描 {prefix} ...")
+        batch = []
+        for name in self._iter_files(prefix, last):
+            batch.append(name)
+            if len(batch) >= batch_size:
+                self._process_batch(model, field, batch)
+                self._save_checkpoint(prefix, batch[-1])
+                batch = []
+        if batch:
+            self._process_batch(model, field, batch)
+            self._save_checkpoint(prefix, batch[-1])
+
+    def _process_batch(self, model, field, names):
+        self.stats["scanned"] += len(names)
+        referenced = set(
+            model.objects.filter(**{f"{field}__in": names}).values_list(field, flat=True)
+        )
+        for name in names:
+            if name in referenced or not self._old_enough(name):
+                continue
+            self.stats["orphaned"] += 1
+            if self.dry_run:
+                self.stdout.write(f"[dry-run] {name}")
+                continue
+            try:
+                default_storage.delete(name)
+            except OSError as e:
+                self.stderr.write(f"删除失败 {name}: {e}")
+                continue
+            self.stats["deleted"] += 1
+            if self.delete_interval:
+                time.sleep(self.delete_interval)
+
+    def _old_enough(self, name):
+        try:
+            return default_storage.get_modified_time(name) < self.cutoff
+        except (FileNotFoundError, NotImplementedError):
+            return False
+
+    # ---- 断点 ----
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as fp:
+                data = json.load(fp)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            raise CommandError(f"断点文件无法读取，可使用 --reset 重新开始: {e}")
+        if data.get("prefix") not in {prefix for prefix, _, _ in MEDIA_REFERENCES}:
+            raise CommandError("断点文件内容无效，可使用 --reset 重新开始")
+        return data
+
+    def _save_checkpoint(self, prefix, last):
+        if self.dry_run:
+            return
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump({"prefix": prefix, "last": last, "stats": self.stats}, fp, ensure_ascii=False)
+        os.replace(tmp_path, self.checkpoint_path)
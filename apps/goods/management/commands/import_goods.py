@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.goods.import_service import IMPORT_BATCH_SIZE, IMPORT_FORMATS, GoodsImporter, detect_format
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    """
+    从 CSV / JSONL 文件批量导入谷子到指定用户名下。
+
+    文件格式与 /api/goods/export/ 导出格式一致，名称按批解析，
+    已存在的谷子（幂等规则同创建接口）会被跳过。
+    """
+
+    help = "Bulk import goods from a CSV/JSONL file for one user."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="导入文件路径")
+        parser.add_argument("--user-id", type=int, required=True, help="目标用户 ID")
+        parser.add_argument(
+            "--format",
+            dest="file_format",
+            choices=IMPORT_FORMATS,
+            default=None,
+            help="文件格式，默认按扩展名推断",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help=f"批量写入大小，默认 {IMPORT_BATCH_SIZE}",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(id=options["user_id"])
+        except User.DoesNotExist:
+            raise CommandError(f"用户不存在: {options['user_id']}")
+
+        if options["batch_size"] <= 0:
+            raise CommandError("batch-size 必须为正整数")
+
+        path = options["path"]
+        file_format = options["file_format"] or detect_format(path)
+        importer = GoodsImporter(user, batch_size=options["batch_size"])
+
+        try:
+            with open(path, "rb") as fp:
+                result = importer.run(fp, file_format)
+        except OSError as e:
+            raise CommandError(f"无法读取文件: {e}")
+        except UnicodeDecodeError:
+            raise CommandError("文件编码必须为 UTF-8")
+
+        for item in result["errors"]:
+            self.stderr.write(f"第 {item['line']} 行: {item['errors']}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"导入完成：共 {result['total']} 行，新增 {result['created']}，"
+                f"重复跳过 {result['duplicated']}，失败 {result['failed']}"
+            )
+        )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.goods.upload_service import purge_expired
+
+
+class Command(BaseCommand):
+    """
+    清理全部用户过期未完成的分片上传会话及其临时文件。
+
+    创建会话时只会顺带清理当前用户的过期会话，不再上传的用户遗留的会话与临时文件
+    需要通过定时任务定期运行本命令回收。
+    """
+
+    help = "Purge expired chunked upload sessions and their temp files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="批量删除大小，默认 500",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size <= 0:
+            raise CommandError("batch-size 必须为正整数")
+
+        total = purge_expired(batch_size=batch_size)
+        self.stdout.write(f"已清理 {total} 个过期上传会话")
+        self.stdout.write(self.style.SUCCESS("完成"))
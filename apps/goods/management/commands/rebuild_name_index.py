@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.goods.name_search_service import rebuild_index
+
+
+class Command(BaseCommand):
+    """
+    重建 IP / IP 关键词 / 角色的名称检索索引（拼音、首字母、三元组）。
+
+    索引平时由信号在写入时自动维护；首次部署、升级拼音词库，
+    或通过绕过信号的方式（如直接执行 SQL）写入数据后运行本命令。
+    """
+
+    help = "Rebuild the fuzzy name index for IPs, IP keywords and characters."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="批量写入大小，默认 500",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size <= 0:
+            raise CommandError("batch-size 必须为正整数")
+
+        total = rebuild_index(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"已重建 {total} 条名称索引"))
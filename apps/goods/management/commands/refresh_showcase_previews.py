@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.goods.showcase_service import refresh_all_previews, reshuffle_random_keys
+
+
+class Command(BaseCommand):
+    """
+    重新打乱公共展柜的随机排序键，并重新计算全部展柜预览。
+
+    公共展柜列表按 random_key 取连续区间抽样，建议通过定时任务定期运行本命令，
+    使每次抽样窗口中的展柜组合不断变化；预览平时由信号自动维护，
+    --previews 用于修复批量导入等绕过信号写入的数据。
+    """
+
+    help = "Reshuffle showcase random keys and rebuild showcase previews."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--previews",
+            action="store_true",
+            help="同时重新计算全部展柜预览",
+        )
+        parser.add_argument(
+            "--no-reshuffle",
+            action="store_true",
+            help="不打乱随机排序键（只配合 --previews 使用）",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="批量写入大小，默认 500",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size <= 0:
+            raise CommandError("batch-size 必须为正整数")
+
+        if not options["no_reshuffle"]:
+            total = reshuffle_random_keys(batch_size=batch_size)
+            self.stdout.write(f"已打乱 {total} 个展柜的随机排序键")
+        if options["previews"]:
+            total = refresh_all_previews(batch_size=batch_size)
+            self.stdout.write(f"已重新计算 {total} 个展柜的预览")
+        self.stdout.write(self.style.SUCCESS("完成"))
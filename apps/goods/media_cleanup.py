@@ -0,0 +1,147 @@
+"""
+媒体文件延迟清理模块
+- 模型实例加载时记录文件字段的原始值，保存时直接比较，无需再查询数据库
+- 待删除的旧文件在事务提交后进入队列，由后台线程按批删除，不占用请求耗时
+- 事务回滚时不会删除任何文件；进程退出时尚未处理的文件由 cleanup_orphan_media 命令兜底
+"""
+import logging
+import queue
+import threading
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# 每批删除的最大文件数
+CLEANUP_BATCH_SIZE = 100
+
+_pending = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+# ---- 字段变更跟踪 ----
+
+def _file_name(value):
+    """FileField 取存储名，CharField（如角色头像）直接返回字符串"""
+    if value is None:
+        return None
+    return getattr(value, "name", value) or None
+
+
+def remember_files(instance, fields):
+    """
+    记录实例当前的文件字段值（供 post_init / post_save 调用）。
+    延迟加载（only/defer）未取出的字段不记录，避免触发额外查询。
+    """
+    loaded = instance.__dict__.setdefault("_loaded_files", {})
+    for field in fields:
+        attname = instance._meta.get_field(field).attname
+        if attname in instance.__dict__:
+            loaded[field] = _file_name(instance.__dict__[attname])
+
+
+def replaced_file(instance, field, update_fields=None):
+    """
+    返回保存后被替换掉的旧文件名；字段未参与本次保存或未变化时返回 None。
+    """
+    if update_fields is not None and field not in update_fields:
+        return None
+    loaded = instance.__dict__.get("_loaded_files", {})
+    if field not in loaded:
+        return None
+    old_name = loaded[field]
+    new_name = _file_name(getattr(instance, field, None))
+    if old_name and old_name != new_name:
+        return old_name
+    return None
+
+
+def file_changed(instance, field, update_fields=None):
+    """
+    字段在本次保存中是否变化（含从无到有）；字段未参与本次保存或加载时未记录则视为未变化。
+    """
+    if update_fields is not None and field not in update_fields:
+        return False
+    loaded = instance.__dict__.get("_loaded_files", {})
+    if field not in loaded:
+        return False
+    return loaded[field] != _file_name(getattr(instance, field, None))
+
+
+# ---- 延迟删除 ----
+
+def _is_local(name):
+    """外部 URL（如 BGM 头像）不是本地文件，不做删除"""
+    return not (name.startswith("http://") or name.startswith("https://"))
+
+
+def schedule_delete(name, storage=None):
+    """
+    在当前事务提交后删除文件（不在事务中时立即入队）。
+    """
+    if not name or not _is_local(name):
+        return
+    storage = storage or default_storage
+    transaction.on_commit(lambda: _enqueue(storage, name))
+
+
+def _enqueue(storage, name):
+    _pending.put((storage, name))
+    _ensure_worker()
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(
+                target=_run_worker,
+                name="media-cleanup",
+                daemon=True,
+            )
+            _worker.start()
+
+
+def _take_batch(block=True):
+    batch = []
+    try:
+        batch.append(_pending.get(block=block, timeout=5 if block else None))
+        while len(batch) < CLEANUP_BATCH_SIZE:
+            batch.append(_pending.get_nowait())
+    except queue.Empty:
+        pass
+    return batch
+
+
+def _delete_batch(batch):
+    for storage, name in batch:
+        try:
+            storage.delete(name)
+        except Exception:  # noqa: BLE001
+            # 单个文件失败不影响其余文件，残留由孤儿媒体清理命令兜底
+            logger.warning("删除媒体文件失败: %s", name, exc_info=True)
+
+
+def _run_worker():
+    global _worker
+    while True:
+        batch = _take_batch()
+        if batch:
+            _delete_batch(batch)
+            continue
+        # 队列空闲一段时间后退出，下次入队时再启动；加锁确认期间没有新文件入队
+        with _worker_lock:
+            if _pending.empty():
+                _worker = None
+                return
+
+
+def flush_pending():
+    """同步删除队列中剩余的文件（供管理命令 / 测试在退出前调用）"""
+    while True:
+        batch = _take_batch(block=False)
+        if not batch:
+            return
+        _delete_batch(batch)
@@ -0,0 +1,228 @@
+"""
+内容寻址的图片存储模块
+- 上传图片按「原始内容哈希」查找，命中时直接复用已存储的文件，跳过压缩与写入
+- 未命中时压缩后按「压缩后内容哈希」存储到 blobs/<前两位>/<哈希>.<扩展名>，相同内容只存一份
+- MediaBlob.ref_count 记录引用数：模型字段引用时 +1，替换 / 删除时 -1，归零后才删除文件；
+  重新上传字段当前已引用的图片时不再 +1（保存时新旧路径相同，也不会 -1）
+- 批量上传分两阶段：prepare_images 在事务外压缩并写入存储，store_prepared 在写事务内只更新引用
+"""
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .media_cleanup import schedule_delete
+from .models import MediaBlob, MediaBlobSource
+from .utils import compress_image, compress_images
+
+BLOB_PREFIX = "blobs/"
+# 读取上传文件计算哈希时的分块大小
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+def _hash_file(file_obj, salt=b""):
+    hasher = hashlib.sha256(salt)
+    file_obj.seek(0)
+    if hasattr(file_obj, "chunks"):
+        for chunk in file_obj.chunks(HASH_CHUNK_SIZE):
+            hasher.update(chunk)
+    else:
+        for chunk in iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    file_obj.seek(0)
+    return hasher.hexdigest()
+
+
+def _blob_path(content_hash, file_name):
+    ext = os.path.splitext(file_name or "")[1].lower() or ".jpg"
+    return f"{BLOB_PREFIX}{content_hash[:2]}/{content_hash}{ext}"
+
+
+def _acquire(blob_id):
+    """引用数 +1；返回 False 表示该记录已被并发释放删除"""
+    return MediaBlob.objects.filter(pk=blob_id).update(ref_count=F("ref_count") + 1) == 1
+
+
+def _source_hash(upload, max_size_kb):
+    return _hash_file(upload, salt=f"{max_size_kb}\n".encode())
+
+
+def _write_content(content):
+    """按压缩后内容计算哈希与存储路径，文件尚不存在时写入存储（不涉及数据库），返回 (哈希, 路径)"""
+    content_hash = _hash_file(content)
+    path = _blob_path(content_hash, getattr(content, "name", None))
+    if not default_storage.exists(path):
+        default_storage.save(path, content)
+    return content_hash, path
+
+
+def _register_content(source_hash, content, content_hash, path, current=None):
+    """
+    为已写入存储的内容占用一个引用（不存在记录时新建），记录原图映射，返回存储路径。
+    复用的文件即 current（字段当前已持有其引用）时不再占用引用。
+    """
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(content_hash=content_hash).first()
+        if blob is None:
+            # 写入存储后文件可能已随旧记录的释放被删除，新建记录前再确认一次
+            if not default_storage.exists(path):
+                default_storage.save(path, content)
+            try:
+                with transaction.atomic():
+                    blob = MediaBlob.objects.create(
+                        path=path,
+                        content_hash=content_hash,
+                        size=getattr(content, "size", 0) or 0,
+                        ref_count=1,
+                    )
+            except IntegrityError:
+                # 并发上传了相同内容：复用对方创建的记录
+                blob = MediaBlob.objects.get(content_hash=content_hash)
+                if blob.path != current:
+                    _acquire(blob.pk)
+        elif blob.path != current:
+            _acquire(blob.pk)
+
+        MediaBlobSource.objects.update_or_create(
+            source_hash=source_hash,
+            defaults={"blob": blob},
+        )
+    return blob.path
+
+
+def _store_content(source_hash, content, current=None):
+    """按压缩后内容存储（已存在则复用）并占用一个引用，记录原图映射，返回存储路径"""
+    content_hash, path = _write_content(content)
+    return _register_content(source_hash, content, content_hash, path, current=current)
+
+
+def store_image(upload, max_size_kb=300, current=None):
+    """
+    存储一张上传图片并占用一个引用，返回存储路径（可直接赋值给 ImageField）。
+
+    调用方需保证返回的路径最终被模型字段引用；字段被替换或记录被删除时，
+    由信号调用 release_file 释放引用。
+    替换已有字段时传入字段当前的文件名 current：结果与之相同（重新上传同一张图片）时
+    字段已持有该引用，不再重复占用。
+    """
+    source_hash = _source_hash(upload, max_size_kb)
+    source = (
+        MediaBlobSource.objects.filter(source_hash=source_hash)
+        .select_related("blob")
+        .first()
+    )
+    if source is not None:
+        if current and source.blob.path == current:
+            return current
+        if _acquire(source.blob_id):
+            return source.blob.path
+
+    compressed = compress_image(upload, max_size_kb=max_size_kb)
+    return _store_content(source_hash, compressed or upload, current=current)
+
+
+class PreparedImages:
+    """prepare_images 的结果：原图哈希、已有映射，以及已压缩并写入存储的未命中图片"""
+
+    def __init__(self, uploads, max_size_kb, source_hashes, sources, contents):
+        self.uploads = uploads
+        self.max_size_kb = max_size_kb
+        self.source_hashes = source_hashes
+        self.sources = sources  # source_hash -> (blob_id, path)
+        self.contents = contents  # source_hash -> (content, content_hash, path)
+
+
+def prepare_images(uploads, max_size_kb=300):
+    """
+    批量存储的第一阶段：计算原图哈希，一次 IN 查询取出已有的原图映射，
+    未命中的图片在进程池中并行压缩（同一批内重复的原图只压缩一次）并写入存储。
+    只读数据库，应在事务之外调用，避免写事务在压缩期间一直持有锁。
+    """
+    source_hashes = [_source_hash(upload, max_size_kb) for upload in uploads]
+    sources = {
+        source_hash: (blob_id, path)
+        for source_hash, blob_id, path in MediaBlobSource.objects.filter(
+            source_hash__in=set(source_hashes)
+        ).values_list("source_hash", "blob_id", "blob__path")
+    }
+
+    firsts = {}  # source_hash -> 该原图在本批中第一次出现的下标
+    for index, source_hash in enumerate(source_hashes):
+        if source_hash not in sources:
+            firsts.setdefault(source_hash, index)
+
+    contents = {}
+    if firsts:
+        compressed = compress_images([uploads[i] for i in firsts.values()], max_size_kb=max_size_kb)
+        for source_hash, content in zip(firsts, compressed):
+            contents[source_hash] = (content, *_write_content(content))
+    return PreparedImages(uploads, max_size_kb, source_hashes, sources, contents)
+
+
+def store_prepared(prepared, currents=None):
+    """
+    批量存储的第二阶段（在调用方的写事务中执行）：每张图片占用一个引用，
+    返回与输入一一对应的存储路径。只更新 MediaBlob / MediaBlobSource，不做压缩。
+
+    currents 与 uploads 一一对应，为被替换字段当前的文件名（新建为 None），语义同 store_image。
+    """
+    uploads = prepared.uploads
+    currents = list(currents or []) + [None] * (len(uploads) - len(currents or []))
+
+    paths = [None] * len(uploads)
+    pending = {}  # source_hash -> 该原图在本批中的下标列表
+    for index, source_hash in enumerate(prepared.source_hashes):
+        source = prepared.sources.get(source_hash)
+        if source is not None and currents[index] and source[1] == currents[index]:
+            paths[index] = currents[index]
+        elif source is not None and _acquire(source[0]):
+            paths[index] = source[1]
+        else:
+            pending.setdefault(source_hash, []).append(index)
+
+    for source_hash, indexes in pending.items():
+        prepared_content = prepared.contents.get(source_hash)
+        if prepared_content is None:
+            # 准备阶段之后原图映射对应的文件已被释放删除（罕见）：就地压缩
+            upload = uploads[indexes[0]]
+            content = compress_image(upload, max_size_kb=prepared.max_size_kb) or upload
+            prepared_content = (content, *_write_content(content))
+        path = _register_content(source_hash, *prepared_content)
+        # _register_content 已占用一个引用；字段当前已引用该文件的位置不需要引用
+        extra = sum(1 for index in indexes if currents[index] != path) - 1
+        if extra:
+            MediaBlob.objects.filter(path=path).update(ref_count=F("ref_count") + extra)
+        for index in indexes:
+            paths[index] = path
+    return paths
+
+
+def _delete_unreferenced(path, storage):
+    # 事务提交后再确认一次，避免释放与新引用并发时误删
+    if not MediaBlob.objects.filter(path=path).exists():
+        schedule_delete(path, storage)
+
+
+def release_file(name, storage=None):
+    """
+    释放字段对文件的引用：
+    - 内容寻址文件：引用数 -1，归零时删除记录，并在事务提交后删除文件
+    - 其它（历史上传的）文件：直接在事务提交后删除
+    """
+    if not name:
+        return
+    if not is_blob(name):
+        schedule_delete(name, storage)
+        return
+
+    storage = storage or default_storage
+    MediaBlob.objects.filter(path=name, ref_count__gt=0).update(ref_count=F("ref_count") - 1)
+    deleted, _ = MediaBlob.objects.filter(path=name, ref_count=0).delete()
+    if deleted:
+        transaction.on_commit(lambda: _delete_unreferenced(name, storage))
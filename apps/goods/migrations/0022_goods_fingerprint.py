@@ -0,0 +1,98 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:04
+
+import hashlib
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def _build_fingerprint(ip_id, name, purchase_date, price, character_ids):
+    # 与 Goods.build_fingerprint 保持一致（迁移中不直接引用模型方法）
+    price_text = "" if price is None else str(Decimal(price).quantize(Decimal("0.01")))
+    date_text = purchase_date.isoformat() if purchase_date else ""
+    char_text = ",".join(str(cid) for cid in sorted(set(character_ids)))
+    raw = "\x1f".join((str(ip_id), name or "", date_text, price_text, char_text))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def backfill_fingerprint(apps, schema_editor):
+    """
+    为历史谷子回填指纹。按用户、创建时间遍历，
+    历史重复数据中只有最早的一条持有指纹，其余保持 NULL，避免违反唯一约束。
+    """
+    Goods = apps.get_model("goods", "Goods")
+    Through = Goods.characters.through
+
+    batch_size = 500
+    seen = set()
+    batch = []
+    current_user_id = None
+    qs = Goods.objects.order_by("user_id", "created_at", "id").only(
+        "id", "user_id", "ip_id", "name", "purchase_date", "price"
+    )
+    for goods in qs.iterator(chunk_size=batch_size):
+        if goods.user_id != current_user_id:
+            # 指纹只需在同一用户内去重，切换用户时清空已见集合
+            if batch:
+                _flush(Goods, Through, batch, seen)
+                batch = []
+            seen.clear()
+            current_user_id = goods.user_id
+        batch.append(goods)
+        if len(batch) >= batch_size:
+            _flush(Goods, Through, batch, seen)
+            batch = []
+    if batch:
+        _flush(Goods, Through, batch, seen)
+
+
+def _flush(Goods, Through, batch, seen):
+    char_map = {}
+    rows = Through.objects.filter(goods_id__in=[g.id for g in batch]).values_list(
+        "goods_id", "character_id"
+    )
+    for goods_id, character_id in rows:
+        char_map.setdefault(goods_id, []).append(character_id)
+
+    updates = []
+    for goods in batch:
+        fingerprint = _build_fingerprint(
+            goods.ip_id,
+            goods.name,
+            goods.purchase_date,
+            goods.price,
+            char_map.get(goods.id, []),
+        )
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        goods.fingerprint = fingerprint
+        updates.append(goods)
+    if updates:
+        Goods.objects.bulk_update(updates, ["fingerprint"])
+
+
+def noop_reverse(apps, schema_editor):
+    return
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0021_backfill_owner_and_enforce_user_not_null'),
+        ('location', '0005_backfill_owner_and_enforce_user_not_null'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goods',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='由 IP、角色集合、名称、入手日期、单价计算，历史重复数据中仅保留一条持有指纹', max_length=64, null=True, verbose_name='幂等指纹'),
+        ),
+        migrations.RunPython(backfill_fingerprint, reverse_code=noop_reverse),
+        migrations.AddConstraint(
+            model_name='goods',
+            constraint=models.UniqueConstraint(fields=('user', 'fingerprint'), name='uniq_goods_user_fingerprint'),
+        ),
+    ]
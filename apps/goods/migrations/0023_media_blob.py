@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0022_goods_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(help_text='形如 blobs/ab/<sha256>.jpg', max_length=200, unique=True, verbose_name='存储路径')),
+                ('content_hash', models.CharField(help_text='压缩后文件内容的 SHA-256', max_length=64, unique=True, verbose_name='内容哈希')),
+                ('size', models.PositiveIntegerField(default=0, verbose_name='文件大小（字节）')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='引用计数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '媒体文件',
+                'verbose_name_plural': '媒体文件',
+            },
+        ),
+        migrations.CreateModel(
+            name='MediaBlobSource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_hash', models.CharField(help_text='原始上传内容（含压缩参数）的 SHA-256', max_length=64, unique=True, verbose_name='原始内容哈希')),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sources', to='goods.mediablob', verbose_name='媒体文件')),
+            ],
+            options={
+                'verbose_name': '媒体文件来源',
+                'verbose_name_plural': '媒体文件来源',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:14
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0023_media_blob'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='会话ID')),
+                ('file_name', models.CharField(max_length=255, verbose_name='原始文件名')),
+                ('total_size', models.PositiveBigIntegerField(verbose_name='文件总大小（字节）')),
+                ('received_size', models.PositiveBigIntegerField(default=0, help_text='从文件开头起连续写入的字节数，续传时从该位置继续', verbose_name='已接收大小（字节）')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='users.user', verbose_name='所属用户')),
+            ],
+            options={
+                'verbose_name': '分片上传会话',
+                'verbose_name_plural': '分片上传会话',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
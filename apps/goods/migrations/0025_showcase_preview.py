@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:19
+
+import random
+
+import apps.goods.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+# 与 showcase_service.PREVIEW_SIZE 保持一致（迁移中不直接引用服务模块）
+PREVIEW_SIZE = 4
+
+
+def backfill_random_key_and_preview(apps, schema_editor):
+    """
+    AddField 的默认值对历史展柜只计算一次，这里逐个重新打乱随机排序键，
+    并为已有展柜生成预览。
+    """
+    Showcase = apps.get_model("goods", "Showcase")
+    ShowcaseGoods = apps.get_model("goods", "ShowcaseGoods")
+    ShowcasePreview = apps.get_model("goods", "ShowcasePreview")
+
+    batch_size = 500
+    batch = []
+    for showcase in Showcase.objects.only("id").iterator(chunk_size=batch_size):
+        showcase.random_key = random.random()
+        batch.append(showcase)
+        if len(batch) >= batch_size:
+            Showcase.objects.bulk_update(batch, ["random_key"])
+            batch = []
+    if batch:
+        Showcase.objects.bulk_update(batch, ["random_key"])
+
+    photos = {}
+    # 与 showcase_service 中预览的排序一致（id 作为最后的确定性排序键）
+    rows = ShowcaseGoods.objects.order_by(
+        "showcase_id", "order", "-created_at", "id"
+    ).values_list("showcase_id", "goods__main_photo")
+    counts = {}
+    for showcase_id, main_photo in rows.iterator(chunk_size=batch_size):
+        counts[showcase_id] = counts.get(showcase_id, 0) + 1
+        if counts[showcase_id] > PREVIEW_SIZE:
+            continue
+        photos.setdefault(showcase_id, [])
+        if main_photo:
+            photos[showcase_id].append(main_photo)
+    ShowcasePreview.objects.bulk_create(
+        [ShowcasePreview(showcase_id=sid, photos=names) for sid, names in photos.items()],
+        batch_size=batch_size,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0024_upload_session'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShowcasePreview',
+            fields=[
+                ('showcase', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='preview', serialize=False, to='goods.showcase', verbose_name='所属展柜')),
+                ('photos', models.JSONField(blank=True, default=list, help_text='前几个谷子的主图存储路径（按展柜内排序）', verbose_name='预览图片')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '展柜预览',
+                'verbose_name_plural': '展柜预览',
+            },
+        ),
+        migrations.AddField(
+            model_name='showcase',
+            name='random_key',
+            field=models.FloatField(default=apps.goods.models.showcase_random_key, help_text='公共展柜随机抽样用，[0, 1) 均匀分布，由 refresh_showcase_previews 命令定期重新打乱', verbose_name='随机排序键'),
+        ),
+        migrations.AddIndex(
+            model_name='showcase',
+            index=models.Index(fields=['is_public', 'random_key'], name='showcase_public_random_idx'),
+        ),
+        migrations.RunPython(backfill_random_key_and_preview, migrations.RunPython.noop),
+    ]
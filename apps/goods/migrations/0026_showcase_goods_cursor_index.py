@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0025_showcase_preview'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='showcasegoods',
+            index=models.Index(fields=['showcase', 'order', '-created_at', 'id'], name='showcase_goods_cursor_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_name_index(apps, schema_editor):
+    """
+    为已有的 IP / IP 关键词 / 角色生成检索索引（之后由信号维护）。
+    规范化与拼音展开必须与查询时完全一致，因此直接复用服务模块的重建逻辑（按批写入）。
+    """
+    from apps.goods.name_search_service import rebuild_index
+
+    rebuild_index(batch_size=500, apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0026_showcase_goods_cursor_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NameIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('ip', 'IP'), ('ip_keyword', 'IP关键词'), ('character', '角色')], max_length=20, verbose_name='来源')),
+                ('text', models.CharField(max_length=100, verbose_name='原始名称')),
+                ('normalized', models.CharField(db_index=True, help_text='NFKC 全半角折叠 + 小写，去除空白与标点', max_length=100, verbose_name='规范化名称')),
+                ('pinyin', models.CharField(db_index=True, max_length=400, verbose_name='全拼')),
+                ('initials', models.CharField(db_index=True, max_length=100, verbose_name='拼音 / 单词首字母')),
+                ('character', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='name_index', to='goods.character', verbose_name='角色')),
+                ('ip', models.ForeignKey(help_text='来源为 IP / IP关键词时为该 IP，来源为角色时为角色所属 IP', on_delete=django.db.models.deletion.CASCADE, related_name='name_index', to='goods.ip', verbose_name='IP')),
+                ('keyword', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='name_index', to='goods.ipkeyword', verbose_name='IP关键词')),
+            ],
+            options={
+                'verbose_name': '名称检索索引',
+                'verbose_name_plural': '名称检索索引',
+            },
+        ),
+        migrations.CreateModel(
+            name='NameTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3, verbose_name='三元组')),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='goods.nameindex', verbose_name='索引行')),
+            ],
+            options={
+                'verbose_name': '名称三元组',
+                'verbose_name_plural': '名称三元组',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='nameindex',
+            constraint=models.UniqueConstraint(condition=models.Q(('source', 'ip')), fields=('ip',), name='name_index_unique_ip'),
+        ),
+        migrations.AddIndex(
+            model_name='nametrigram',
+            index=models.Index(fields=['gram', 'entry'], name='name_trigram_gram_idx'),
+        ),
+        migrations.RunPython(backfill_name_index, migrations.RunPython.noop),
+    ]
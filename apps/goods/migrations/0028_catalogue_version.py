@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:39
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    """创建唯一的版本计数行"""
+    CatalogueVersion = apps.get_model("goods", "CatalogueVersion")
+    CatalogueVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0027_name_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='版本号')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '目录版本',
+                'verbose_name_plural': '目录版本',
+            },
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
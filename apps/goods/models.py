@@ -1,6 +1,9 @@
+import hashlib
+import random
+from decimal import Decimal
 from uuid import uuid4
 
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.utils import timezone
 
 
@@ -133,6 +136,88 @@ class Character(models.Model):
         return f"{self.ip.name} - {self.name}"
 
 
+class NameIndex(models.Model):
+    """
+    IP / IP 关键词 / 角色名称的模糊检索索引（拼音、首字母、全半角与大小写折叠后的名称）。
+    每个源对象一行，写入源对象时由信号维护；删除源对象时级联删除。
+    """
+
+    SOURCE_CHOICES = (
+        ("ip", "IP"),
+        ("ip_keyword", "IP关键词"),
+        ("character", "角色"),
+    )
+
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, verbose_name="来源")
+    ip = models.ForeignKey(
+        IP,
+        on_delete=models.CASCADE,
+        related_name="name_index",
+        verbose_name="IP",
+        help_text="来源为 IP / IP关键词时为该 IP，来源为角色时为角色所属 IP",
+    )
+    keyword = models.OneToOneField(
+        IPKeyword,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="name_index",
+        verbose_name="IP关键词",
+    )
+    character = models.OneToOneField(
+        Character,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="name_index",
+        verbose_name="角色",
+    )
+    text = models.CharField(max_length=100, verbose_name="原始名称")
+    normalized = models.CharField(
+        max_length=100,
+        db_index=True,
+        verbose_name="规范化名称",
+        help_text="NFKC 全半角折叠 + 小写，去除空白与标点",
+    )
+    pinyin = models.CharField(max_length=400, db_index=True, verbose_name="全拼")
+    initials = models.CharField(max_length=100, db_index=True, verbose_name="拼音 / 单词首字母")
+
+    class Meta:
+        verbose_name = "名称检索索引"
+        verbose_name_plural = "名称检索索引"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ip"],
+                condition=models.Q(source="ip"),
+                name="name_index_unique_ip",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_source_display()} {self.text}"
+
+
+class NameTrigram(models.Model):
+    """
+    名称检索索引的三元组（规范化名称、全拼、首字母各自的三字符片段），用于模糊匹配候选召回。
+    """
+
+    entry = models.ForeignKey(
+        NameIndex,
+        on_delete=models.CASCADE,
+        related_name="trigrams",
+        verbose_name="索引行",
+    )
+    gram = models.CharField(max_length=3, verbose_name="三元组")
+
+    class Meta:
+        verbose_name = "名称三元组"
+        verbose_name_plural = "名称三元组"
+        indexes = [
+            models.Index(fields=["gram", "entry"], name="name_trigram_gram_idx"),
+        ]
+
+
 class Category(models.Model):
     """
     品类表，例如：吧唧、色纸、立牌、挂件
@@ -184,6 +269,23 @@ class Category(models.Model):
         return self.path_name or self.name
 
 
+class CatalogueVersion(models.Model):
+    """
+    目录（IP / IP 关键词 / 角色 / 品类）全局版本号，只有一行。
+    目录数据每次写入时更换为新的随机值，各进程据此判断内存中的目录缓存是否过期。
+    """
+
+    version = models.PositiveBigIntegerField(default=0, verbose_name="版本号")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "目录版本"
+        verbose_name_plural = "目录版本"
+
+    def __str__(self):
+        return f"v{self.version}"
+
+
 class Theme(models.Model):
     """
     主题表，例如：夏日主题、节日主题、限定主题等
@@ -382,18 +484,123 @@ class Goods(models.Model):
         help_text="值越小越靠前，默认0",
     )
 
+    # 幂等指纹：IP + 角色集合（顺序无关） + 名称 + 入手日期 + 单价 的哈希，
+    # 与 user 组成唯一约束，去重只需一次索引查询，并发提交时由数据库保证不重复。
+    fingerprint = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="幂等指纹",
+        help_text="由 IP、角色集合、名称、入手日期、单价计算，历史重复数据中仅保留一条持有指纹",
+    )
+
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
 
+    # 参与指纹计算的字段（角色集合由 m2m_changed 信号维护）
+    FINGERPRINT_FIELDS = frozenset({"ip", "ip_id", "name", "purchase_date", "price"})
+
     class Meta:
         verbose_name = "谷子"
         verbose_name_plural = "谷子"
         # 默认排序：先按自定义顺序值从小到大，其次按创建时间倒序（保证新建未手动排序的谷子有稳定顺序）
         ordering = ["order", "-created_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "fingerprint"],
+                name="uniq_goods_user_fingerprint",
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def build_fingerprint(ip_id, name, purchase_date, price, character_ids):
+        """
+        计算幂等指纹：同一 IP + 相同角色集合（顺序无关） + 名称 + 入手日期 + 单价 视为同一条资产。
+        """
+        price_text = "" if price is None else str(Decimal(price).quantize(Decimal("0.01")))
+        date_text = purchase_date.isoformat() if purchase_date else ""
+        char_text = ",".join(str(cid) for cid in sorted(set(character_ids)))
+        raw = "\x1f".join((str(ip_id), name or "", date_text, price_text, char_text))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        # 新建时调用方已预先计算指纹（如 perform_create），无需再次同步
+        preset = self._state.adding and self.fingerprint is not None
+        super().save(*args, **kwargs)
+        if preset:
+            return
+        if update_fields is None or self.FINGERPRINT_FIELDS.intersection(update_fields):
+            self.sync_fingerprint()
+
+    def sync_fingerprint(self, character_ids=None):
+        """
+        重新计算并写回指纹（仅在变化时执行 UPDATE）。
+        若其它谷子已持有相同指纹（历史重复数据），当前记录不占用指纹。
+        """
+        if character_ids is None:
+            character_ids = list(self.characters.values_list("id", flat=True))
+        fingerprint = self.build_fingerprint(
+            self.ip_id, self.name, self.purchase_date, self.price, character_ids
+        )
+        if fingerprint == self.fingerprint:
+            return
+        released = self.fingerprint
+        queryset = Goods.objects.filter(pk=self.pk)
+        try:
+            with transaction.atomic():
+                queryset.update(fingerprint=fingerprint)
+        except IntegrityError:
+            fingerprint = None
+            queryset.update(fingerprint=None)
+        self.fingerprint = fingerprint
+        if released:
+            Goods.hand_over_fingerprints({(self.user_id, released)})
+
+    @classmethod
+    def hand_over_fingerprints(cls, released):
+        """
+        released 为不再被持有的 (user_id, fingerprint) 集合（持有者已删除或内容已修改）。
+        将每个指纹移交给该用户未持有指纹、且计算指纹相同的谷子中创建最早的一条，
+        使历史重复数据在持有者删除 / 修改后仍能被去重命中。
+        """
+        released = {(user_id, fingerprint) for user_id, fingerprint in released if fingerprint}
+        if not released:
+            return
+        candidates = (
+            cls.objects.filter(
+                user_id__in={user_id for user_id, _ in released}, fingerprint__isnull=True
+            )
+            .order_by("created_at", "pk")
+            .prefetch_related("characters")
+        )
+        for goods in candidates.iterator(chunk_size=500):
+            fingerprint = cls.build_fingerprint(
+                goods.ip_id,
+                goods.name,
+                goods.purchase_date,
+                goods.price,
+                [character.pk for character in goods.characters.all()],
+            )
+            key = (goods.user_id, fingerprint)
+            if key not in released:
+                continue
+            released.discard(key)
+            try:
+                with transaction.atomic():
+                    cls.objects.filter(pk=goods.pk, fingerprint__isnull=True).update(
+                        fingerprint=fingerprint
+                    )
+            except IntegrityError:
+                # 并发请求已重新占用该指纹
+                pass
+            if not released:
+                break
+
 
 class GuziImage(models.Model):
     """
@@ -426,6 +633,11 @@ class GuziImage(models.Model):
         return f"{self.guzi.name} - {self.label or '补充图'}"
 
 
+def showcase_random_key():
+    """展柜随机排序键的默认值"""
+    return random.random()
+
+
 class Showcase(models.Model):
     """
     展柜模型，用于自定义展示谷子。
@@ -472,6 +684,11 @@ class Showcase(models.Model):
         verbose_name="是否公开",
         help_text="预留字段，用于未来扩展",
     )
+    random_key = models.FloatField(
+        default=showcase_random_key,
+        verbose_name="随机排序键",
+        help_text="公共展柜随机抽样用，[0, 1) 均匀分布，由 refresh_showcase_previews 命令定期重新打乱",
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
 
@@ -479,6 +696,9 @@ class Showcase(models.Model):
         verbose_name = "展柜"
         verbose_name_plural = "展柜"
         ordering = ["order", "-created_at"]
+        indexes = [
+            models.Index(fields=["is_public", "random_key"], name="showcase_public_random_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -529,6 +749,140 @@ class ShowcaseGoods(models.Model):
         verbose_name_plural = "展柜谷子关联"
         ordering = ["order", "-created_at"]
         unique_together = ("showcase", "goods")
+        indexes = [
+            # 展柜内按 (order, -created_at, id) 游标分页
+            models.Index(
+                fields=["showcase", "order", "-created_at", "id"],
+                name="showcase_goods_cursor_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.showcase.name} - {self.goods.name}"
+
+
+class ShowcasePreview(models.Model):
+    """
+    展柜预览（预先计算）：保存展柜前几个谷子的主图路径。
+    展柜内容或谷子主图变化时在事务提交后刷新，列表接口直接读取，无需加载展柜中的谷子。
+    """
+
+    showcase = models.OneToOneField(
+        Showcase,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="preview",
+        verbose_name="所属展柜",
+    )
+    photos = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name="预览图片",
+        help_text="前几个谷子的主图存储路径（按展柜内排序）",
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "展柜预览"
+        verbose_name_plural = "展柜预览"
+
+    def __str__(self):
+        return f"{self.showcase_id} 预览"
+
+
+class MediaBlob(models.Model):
+    """
+    内容寻址的媒体文件：同一份（压缩后的）图片内容只存储一次，
+    存储路径由内容哈希决定，谷子主图 / 补充图片 / 主题图片通过路径共享引用。
+    """
+
+    path = models.CharField(
+        max_length=200,
+        unique=True,
+        verbose_name="存储路径",
+        help_text="形如 blobs/ab/<sha256>.jpg",
+    )
+    content_hash = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name="内容哈希",
+        help_text="压缩后文件内容的 SHA-256",
+    )
+    size = models.PositiveIntegerField(default=0, verbose_name="文件大小（字节）")
+    ref_count = models.PositiveIntegerField(default=0, verbose_name="引用计数")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+
+    class Meta:
+        verbose_name = "媒体文件"
+        verbose_name_plural = "媒体文件"
+
+    def __str__(self):
+        return self.path
+
+
+class MediaBlobSource(models.Model):
+    """
+    原始上传内容 -> 媒体文件 的映射。
+    再次上传相同原图时直接命中，跳过压缩与写入。
+    """
+
+    source_hash = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name="原始内容哈希",
+        help_text="原始上传内容（含压缩参数）的 SHA-256",
+    )
+    blob = models.ForeignKey(
+        MediaBlob,
+        on_delete=models.CASCADE,
+        related_name="sources",
+        verbose_name="媒体文件",
+    )
+
+    class Meta:
+        verbose_name = "媒体文件来源"
+        verbose_name_plural = "媒体文件来源"
+
+    def __str__(self):
+        return self.source_hash
+
+
+class UploadSession(models.Model):
+    """
+    分片（可续传）上传会话。
+    分片按偏移量直接写入同一个临时文件，完成后交给图片压缩 / 存储流程。
+    """
+
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid4,
+        editable=False,
+        verbose_name="会话ID",
+    )
+    user = models.ForeignKey(
+        "users.User",
+        on_delete=models.CASCADE,
+        related_name="upload_sessions",
+        verbose_name="所属用户",
+    )
+    file_name = models.CharField(max_length=255, verbose_name="原始文件名")
+    total_size = models.PositiveBigIntegerField(verbose_name="文件总大小（字节）")
+    received_size = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="已接收大小（字节）",
+        help_text="从文件开头起连续写入的字节数，续传时从该位置继续",
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="创建时间")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "分片上传会话"
+        verbose_name_plural = "分片上传会话"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.file_name} ({self.received_size}/{self.total_size})"
+
+    @property
+    def is_complete(self):
+        return self.received_size >= self.total_size
@@ -0,0 +1,254 @@
+"""
+IP / 角色名称模糊检索服务模块
+为 IP、IP 关键词、角色名称预先计算检索索引（NameIndex），在写入源对象时由信号维护：
+- 规范化名称：NFKC 全半角折叠 + 小写，去除空白与标点（"ＨＳＲ" -> "hsr"）
+- 全拼 / 首字母：中文按拼音展开，其他单词取首字母（"崩坏：星穹铁道" -> "benghuaixingqiongtiedao" / "bhxqtd"，
+  "Honkai Star Rail" -> "hsr"）
+- 三元组：上述三种形式的三字符片段（NameTrigram），用于召回候选
+
+查询时一条分组查询按三元组命中数召回候选，一条查询取出候选行，再在内存中打分排序：
+完全匹配 > 前缀匹配 > 包含 > 三元组相似度。拼音相同的错别字（"流荧" / "流萤"）可直接命中。
+"""
+import re
+import unicodedata
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Count
+from pypinyin import lazy_pinyin
+
+from .models import IP, Character, IPKeyword, NameIndex, NameTrigram
+
+AUTOCOMPLETE_DEFAULT_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+# 召回的候选索引行数量上限（按三元组命中数取前 N 行再精排）
+CANDIDATE_LIMIT = 200
+# 低于该分数的候选视为不相关
+MIN_SCORE = 0.2
+
+SEARCH_TYPES = ("ip", "character")
+
+_WORD_SPLIT = re.compile(r"[\W_]+")
+
+
+# ---- 文本规范化 ----
+
+def _words(text):
+    """NFKC 全半角折叠 + 小写后，按空白与标点切分为单词"""
+    folded = unicodedata.normalize("NFKC", text or "").casefold()
+    return [word for word in _WORD_SPLIT.split(folded) if word]
+
+
+def build_tokens(text):
+    """返回 (规范化名称, 全拼, 首字母)"""
+    words = _words(text)
+    syllables = []
+    for word in words:
+        # 中文逐字转为拼音，非中文片段原样保留为一个整体
+        syllables.extend(lazy_pinyin(word))
+    normalized = "".join(words)
+    pinyin = "".join(syllables)
+    initials = "".join(syllable[0] for syllable in syllables if syllable)
+    return normalized, pinyin, initials
+
+
+def trigrams(*values):
+    """三字符片段集合；首尾补空格，使短词与前缀也能产生片段（"xq" -> "  x"、" xq"、"xq "）"""
+    grams = set()
+    for value in values:
+        if not value:
+            continue
+        padded = f"  {value} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+# ---- 索引维护 ----
+
+# 索引来源：(source, 模型名)
+_SOURCE_MODELS = (("ip", "IP"), ("ip_keyword", "IPKeyword"), ("character", "Character"))
+
+
+def _fields_for(source, obj):
+    if source == "ip":
+        return {"source": "ip", "ip_id": obj.pk}, obj.name
+    if source == "ip_keyword":
+        return {"source": "ip_keyword", "ip_id": obj.ip_id, "keyword_id": obj.pk}, obj.value
+    return {"source": "character", "ip_id": obj.ip_id, "character_id": obj.pk}, obj.name
+
+
+def _source_fields(obj):
+    for model, source in ((IP, "ip"), (IPKeyword, "ip_keyword"), (Character, "character")):
+        if isinstance(obj, model):
+            return _fields_for(source, obj)
+    raise TypeError(f"不支持的索引对象：{type(obj).__name__}")
+
+
+def _lookup(fields):
+    if fields["source"] == "ip":
+        return {"source": "ip", "ip_id": fields["ip_id"]}
+    if fields["source"] == "ip_keyword":
+        return {"keyword_id": fields["keyword_id"]}
+    return {"character_id": fields["character_id"]}
+
+
+def _entry_values(fields, text):
+    normalized, pinyin, initials = build_tokens(text)
+    return {
+        **fields,
+        "text": text,
+        "normalized": normalized[:100],
+        "pinyin": pinyin[:400],
+        "initials": initials[:100],
+    }
+
+
+def _entry_trigrams(entry, trigram_model=NameTrigram):
+    return [
+        trigram_model(entry=entry, gram=gram)
+        for gram in trigrams(entry.normalized, entry.pinyin, entry.initials)
+    ]
+
+
+def index_object(obj):
+    """
+    新建或刷新一个 IP / IP 关键词 / 角色的索引行；名称与所属 IP 均未变化时不做写入。
+    """
+    fields, text = _source_fields(obj)
+    entry = NameIndex.objects.filter(**_lookup(fields)).first()
+    if entry is not None and entry.text == text and entry.ip_id == fields["ip_id"]:
+        return entry
+
+    values = _entry_values(fields, text)
+    with transaction.atomic():
+        if entry is None:
+            entry = NameIndex.objects.create(**values)
+        else:
+            for key, value in values.items():
+                setattr(entry, key, value)
+            entry.save()
+            entry.trigrams.all().delete()
+        NameTrigram.objects.bulk_create(_entry_trigrams(entry))
+    return entry
+
+
+def _create_entries(entries, index_model, trigram_model):
+    entries = index_model.objects.bulk_create(entries)
+    trigram_model.objects.bulk_create(
+        [gram for entry in entries for gram in _entry_trigrams(entry, trigram_model)],
+        batch_size=2000,
+    )
+    return len(entries)
+
+
+def rebuild_index(batch_size=500, apps=global_apps):
+    """
+    重建全部索引（用于首次部署或修复绕过信号写入的数据），返回索引行数。
+    apps 为模型注册表：迁移回填时传入历史模型注册表，默认使用当前模型。
+    """
+    index_model = apps.get_model("goods", "NameIndex")
+    trigram_model = apps.get_model("goods", "NameTrigram")
+    total = 0
+    with transaction.atomic():
+        trigram_model.objects.all().delete()
+        index_model.objects.all().delete()
+        for source, model_name in _SOURCE_MODELS:
+            model = apps.get_model("goods", model_name)
+            batch = []
+            for obj in model.objects.order_by("pk").iterator(chunk_size=batch_size):
+                batch.append(index_model(**_entry_values(*_fields_for(source, obj))))
+                if len(batch) >= batch_size:
+                    total += _create_entries(batch, index_model, trigram_model)
+                    batch = []
+            if batch:
+                total += _create_entries(batch, index_model, trigram_model)
+    return total
+
+
+# ---- 查询 ----
+
+def _similarity(a, b):
+    grams_a, grams_b = trigrams(a), trigrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+def _score(entry, forms):
+    """候选行与查询的相关度（0~1）：完全匹配 > 前缀匹配 > 包含 > 三元组相似度"""
+    best = 0.0
+    for field in (entry.normalized, entry.pinyin, entry.initials):
+        if not field:
+            continue
+        for form in forms:
+            if field == form:
+                return 1.0
+            if field.startswith(form):
+                best = max(best, 0.9)
+            elif form in field:
+                best = max(best, 0.75)
+            else:
+                best = max(best, 0.7 * _similarity(field, form))
+    return best
+
+
+def parse_types(value):
+    """解析 ?type=ip,character；为空时检索全部类型，非法值被忽略"""
+    types = [item.strip() for item in (value or "").split(",") if item.strip() in SEARCH_TYPES]
+    return types or list(SEARCH_TYPES)
+
+
+def autocomplete(query, types=SEARCH_TYPES, ip_id=None, limit=AUTOCOMPLETE_DEFAULT_LIMIT):
+    """
+    模糊检索 IP / 角色，按相关度倒序返回：
+    [{"type": "ip"|"character", "id", "name", "matched", "score", "ip": {"id", "name"}}, ...]
+    同一 IP 通过名称和多个关键词命中时只返回一条（取最高分），matched 为命中的名称或关键词。
+    """
+    normalized, pinyin, _ = build_tokens(query)
+    forms = [form for form in dict.fromkeys((normalized, pinyin)) if form]
+    if not forms:
+        return []
+
+    sources = []
+    if "ip" in types:
+        sources += ["ip", "ip_keyword"]
+    if "character" in types:
+        sources.append("character")
+
+    candidates = NameTrigram.objects.filter(gram__in=trigrams(*forms), entry__source__in=sources)
+    if ip_id is not None:
+        candidates = candidates.filter(entry__ip_id=ip_id)
+    candidate_ids = list(
+        candidates.values("entry_id")
+        .annotate(hits=Count("id"))
+        .order_by("-hits", "entry_id")
+        .values_list("entry_id", flat=True)[:CANDIDATE_LIMIT]
+    )
+    if not candidate_ids:
+        return []
+
+    results = {}
+    for entry in NameIndex.objects.filter(id__in=candidate_ids).select_related("ip", "character"):
+        score = _score(entry, forms)
+        if score < MIN_SCORE:
+            continue
+        if entry.source == "character":
+            key = ("character", entry.character_id)
+            name = entry.character.name
+        else:
+            key = ("ip", entry.ip_id)
+            name = entry.ip.name
+        current = results.get(key)
+        if current is not None and current["score"] >= score:
+            continue
+        results[key] = {
+            "type": key[0],
+            "id": key[1],
+            "name": name,
+            "matched": entry.text,
+            "score": round(score, 3),
+            "ip": {"id": entry.ip_id, "name": entry.ip.name},
+        }
+
+    ranked = sorted(results.values(), key=lambda item: (-item["score"], len(item["name"]), item["id"]))
+    return ranked[:limit]
@@ -0,0 +1,41 @@
+"""
+批量排序服务模块
+拖拽排序后批量提交 [{"id": ..., "order": ...}, ...]：
+- 一次查询取出全部对象（同时校验 ID 是否存在）
+- 只有排序值变化的对象参与写入，一次 bulk_update（UPDATE ... SET order = CASE WHEN ...）
+- 直接复用内存中的对象按新顺序返回，无需再次查询
+- bulk_update 不触发信号，目录数据（IP / 品类）排序变化时显式更新目录版本号
+"""
+from django.db import transaction
+
+from .catalogue import CATALOGUE_MODELS, bump_version
+
+
+def bulk_update_order(queryset, items, field="order"):
+    """
+    批量更新排序值，返回 (按 (排序值, id) 排好序的对象列表, 不存在的 ID 列表)。
+    存在不存在的 ID 时不做任何修改，对象列表返回 None。
+
+    queryset 决定取出对象时的预加载 / 注解，便于调用方直接序列化返回。
+    """
+    ids = [item["id"] for item in items]
+    objects = queryset.in_bulk(ids)
+    missing_ids = sorted(set(ids) - set(objects))
+    if missing_ids:
+        return None, missing_ids
+
+    changed = []
+    for item in items:
+        obj = objects[item["id"]]
+        if getattr(obj, field) != item[field]:
+            setattr(obj, field, item[field])
+            changed.append(obj)
+
+    if changed:
+        with transaction.atomic():
+            queryset.model.objects.bulk_update(changed, [field])
+            if queryset.model in CATALOGUE_MODELS:
+                bump_version()
+
+    ordered = sorted(objects.values(), key=lambda obj: (getattr(obj, field), obj.pk))
+    return ordered, []
@@ -2,7 +2,7 @@
 Goods app serializers module.
 导出所有序列化器，保持向后兼容。
 """
-from .fields import AvatarField, KeywordsField
+from .fields import AvatarField, BulkPrimaryKeyRelatedField, KeywordsField
 from .ip import (
     IPBatchUpdateOrderSerializer,
     IPDetailSerializer,
@@ -17,12 +17,18 @@ from .category import (
     CategoryOrderItemSerializer,
     CategorySimpleSerializer,
     CategoryTreeSerializer,
+    CategoryTreeWithCountsSerializer,
 )
 from .theme import (
     ThemeDetailSerializer,
     ThemeSimpleSerializer,
 )
 from .goods import (
+    GoodsBatchDataSerializer,
+    GoodsBatchOperationSerializer,
+    GoodsBulkLocationSerializer,
+    GoodsBulkStatusSerializer,
+    GoodsBulkTargetSerializer,
     GoodsDetailSerializer,
     GoodsListSerializer,
     GoodsMoveSerializer,
@@ -32,10 +38,12 @@ from .showcase import (
     AddGoodsToShowcaseSerializer,
     MoveGoodsInShowcaseSerializer,
     RemoveGoodsFromShowcaseSerializer,
+    ShowcaseBulkGoodsSerializer,
     ShowcaseDetailSerializer,
     ShowcaseGoodsSerializer,
     ShowcaseListSerializer,
 )
+from .upload import UploadFinalizeSerializer, UploadSessionSerializer
 from .bgm import (
     BGMCharacterSerializer,
     BGMCreateCharacterRequestSerializer,
@@ -48,11 +56,13 @@ from .bgm import (
     BGMGetCharactersBySubjectIdRequestSerializer,
     BGMGetCharactersBySubjectIdResponseSerializer,
 )
+from .search import AutocompleteItemSerializer, AutocompleteQuerySerializer
 
 __all__ = [
     # Fields
     "KeywordsField",
     "AvatarField",
+    "BulkPrimaryKeyRelatedField",
     # IP
     "IPKeywordSerializer",
     "IPSimpleSerializer",
@@ -64,6 +74,7 @@ __all__ = [
     # Category
     "CategorySimpleSerializer",
     "CategoryTreeSerializer",
+    "CategoryTreeWithCountsSerializer",
     "CategoryOrderItemSerializer",
     "CategoryBatchUpdateOrderSerializer",
     "CategoryDetailSerializer",
@@ -75,6 +86,11 @@ __all__ = [
     "GoodsListSerializer",
     "GoodsDetailSerializer",
     "GoodsMoveSerializer",
+    "GoodsBatchDataSerializer",
+    "GoodsBatchOperationSerializer",
+    "GoodsBulkTargetSerializer",
+    "GoodsBulkLocationSerializer",
+    "GoodsBulkStatusSerializer",
     # Showcase
     "ShowcaseListSerializer",
     "ShowcaseDetailSerializer",
@@ -82,6 +98,10 @@ __all__ = [
     "AddGoodsToShowcaseSerializer",
     "RemoveGoodsFromShowcaseSerializer",
     "MoveGoodsInShowcaseSerializer",
+    "ShowcaseBulkGoodsSerializer",
+    # Upload
+    "UploadSessionSerializer",
+    "UploadFinalizeSerializer",
     # BGM
     "BGMSearchRequestSerializer",
     "BGMCharacterSerializer",
@@ -93,4 +113,7 @@ __all__ = [
     "BGMSearchSubjectsResponseSerializer",
     "BGMGetCharactersBySubjectIdRequestSerializer",
     "BGMGetCharactersBySubjectIdResponseSerializer",
+    # Search
+    "AutocompleteQuerySerializer",
+    "AutocompleteItemSerializer",
 ]
@@ -1,13 +1,25 @@
 """
 品类相关的序列化器
 """
+from django.db import transaction
 from rest_framework import serializers
 
-from ..models import Category
+from core.tree import (
+    InvalidMove,
+    PathTooLong,
+    check_move,
+    descendant_ids,
+    node_path,
+    rewrite_subtree_paths,
+)
 
+from ..models import Category, Goods
+from ..showcase_service import invalidate_goods_public_cache
+from .fields import CatalogueNestedMixin
 
-class CategorySimpleSerializer(serializers.ModelSerializer):
-    """品类简单序列化器（用于列表和嵌套显示）"""
+
+class CategorySimpleSerializer(CatalogueNestedMixin, serializers.ModelSerializer):
+    """品类简单序列化器（用于列表和嵌套显示；嵌套时从目录缓存读取品类）"""
     parent = serializers.PrimaryKeyRelatedField(read_only=True, help_text="父级品类ID")
     
     class Meta:
@@ -26,6 +38,18 @@ class CategoryTreeSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "parent", "path_name", "color_tag", "order")
 
 
+class CategoryTreeWithCountsSerializer(CategoryTreeSerializer):
+    """
+    品类树（带谷子数量）序列化器。
+    统计值由视图一次性计算后通过 context["counts"] 传入：{category_id: {...}}。
+    """
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data.update(self.context["counts"][instance.id])
+        return data
+
+
 class CategoryOrderItemSerializer(serializers.Serializer):
     """品类排序项序列化器（用于批量更新排序）"""
     id = serializers.IntegerField(help_text="品类ID")
@@ -86,7 +110,11 @@ class CategoryDetailSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
     
     def update(self, instance, validated_data):
-        """更新品类时，如果父节点或名称改变，自动更新 path_name"""
+        """
+        更新品类时，如果父节点或名称改变，自动更新 path_name。
+        当前节点路径变化后，在同一事务内用一条 UPDATE 把所有子孙节点的路径前缀替换为新路径，
+        并使展示这些品类下谷子的公开展柜缓存失效。
+        """
         parent = validated_data.get("parent", instance.parent)
         name = validated_data.get("name", instance.name)
         path_name = validated_data.get("path_name")
@@ -107,4 +135,25 @@ class CategoryDetailSerializer(serializers.ModelSerializer):
                     path_name = name
                 validated_data["path_name"] = path_name
         
-        return super().update(instance, validated_data)
+        # path_name 为空的品类，其子品类路径以名称为前缀（见 build_path）
+        old_path = node_path(instance)
+        path_changed = validated_data.get("path_name", instance.path_name) != instance.path_name
+        # 不能移动到自身或自身的子孙节点下，否则会形成环
+        try:
+            check_move(Category, instance, parent)
+        except InvalidMove:
+            raise serializers.ValidationError({"parent": "不能将品类移动到自身或其子品类下"})
+        subtree_ids = descendant_ids(Category, instance.pk) if path_changed else []
+        
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            new_path = node_path(instance)
+            if new_path != old_path:
+                try:
+                    rewrite_subtree_paths(Category, subtree_ids, old_path, new_path)
+                except PathTooLong:
+                    raise serializers.ValidationError({"path_name": "子品类的完整路径超出长度限制"})
+                invalidate_goods_public_cache(
+                    Goods.objects.filter(category_id__in=[instance.pk, *subtree_ids]).values("id")
+                )
+        return instance
@@ -4,13 +4,13 @@
 from rest_framework import serializers
 
 from ..models import Character, IP
-from .fields import AvatarField
+from .fields import AvatarField, BulkPrimaryKeyRelatedField
 from .ip import IPSimpleSerializer
 
 
 class CharacterSimpleSerializer(serializers.ModelSerializer):
     ip = IPSimpleSerializer(read_only=True)
-    ip_id = serializers.PrimaryKeyRelatedField(
+    ip_id = BulkPrimaryKeyRelatedField(
         queryset=IP.objects.all(),
         source="ip",
         write_only=True,
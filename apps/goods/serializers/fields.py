@@ -4,9 +4,12 @@
 import os
 from uuid import uuid4
 from django.core.files.base import ContentFile
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.core.files.storage import default_storage
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
+from ..catalogue import lookup
 from ..models import IPKeyword
 from ..utils import compress_image
 
@@ -128,3 +131,82 @@ class AvatarField(serializers.Field):
             return data
         
         raise serializers.ValidationError("头像必须是文件或URL字符串")
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """many=True 的 BulkPrimaryKeyRelatedField：整组 ID 交给子字段一次性校验"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+        return self.child_relation.to_internal_value_many(data)
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    主键关联字段：
+    - many=True 时整组 ID 去重后一次 filter(pk__in=...) 校验（而不是逐个 get），
+      并一次性报告全部不存在的 ID，返回的对象保持请求中的顺序
+    - 用于写入校验，始终查库（不读进程内目录缓存，避免其他进程刚删除的对象通过校验）
+    """
+
+    default_error_messages = {
+        "does_not_exist_many": "{name}不存在: {pk_list}",
+    }
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def _to_pk(self, data):
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        if data is None or isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return self.get_queryset().model._meta.pk.to_python(data)
+        except (DjangoValidationError, TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+    def to_internal_value(self, data):
+        pk = self._to_pk(data)
+        obj = self.get_queryset().filter(pk=pk).first()
+        if obj is None:
+            self.fail("does_not_exist", pk_value=data)
+        return obj
+
+    def to_internal_value_many(self, data):
+        pks = list(dict.fromkeys(self._to_pk(item) for item in data))
+        objects = self.get_queryset().in_bulk(pks)
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            self.fail(
+                "does_not_exist_many",
+                name=self.get_queryset().model._meta.verbose_name,
+                pk_list=", ".join(str(pk) for pk in missing),
+            )
+        return [objects[pk] for pk in pks]
+
+
+class CatalogueNestedMixin:
+    """
+    嵌套只读序列化器混入：按外键 ID 从进程内目录缓存取出关联对象，
+    父查询无需 select_related，也不会逐条查询；未命中时回退为普通的属性读取。
+    """
+
+    def get_attribute(self, instance):
+        if len(self.source_attrs) == 1:
+            field = instance._meta.get_field(self.source)
+            pk = getattr(instance, field.attname)
+            if pk is None:
+                return None
+            obj = lookup(self.Meta.model, pk)
+            if obj is not None:
+                return obj
+        return super().get_attribute(instance)
@@ -6,9 +6,10 @@ from rest_framework import serializers
 from ..models import Category, Character, Goods, GuziImage, IP, Theme
 from apps.location.models import StorageNode
 from core.permissions import is_admin
-from ..utils import compress_image
+from ..media_store import store_image
 from .category import CategorySimpleSerializer
 from .character import CharacterSimpleSerializer
+from .fields import BulkPrimaryKeyRelatedField
 from .ip import IPSimpleSerializer
 from .theme import ThemeSimpleSerializer
 
@@ -19,21 +20,19 @@ class GuziImageSerializer(serializers.ModelSerializer):
         fields = ("id", "image", "label")
 
     def create(self, validated_data):
-        """创建补充图片时自动压缩"""
+        """创建补充图片时自动压缩（内容寻址存储，相同图片只存一份）"""
         image = validated_data.get('image')
         if image:
-            compressed_image = compress_image(image, max_size_kb=300)
-            if compressed_image:
-                validated_data['image'] = compressed_image
+            validated_data['image'] = store_image(image, max_size_kb=300)
         return super().create(validated_data)
 
     def update(self, instance, validated_data):
-        """更新补充图片时自动压缩"""
+        """更新补充图片时自动压缩（内容寻址存储，相同图片只存一份）"""
         image = validated_data.get('image')
         if image:
-            compressed_image = compress_image(image, max_size_kb=300)
-            if compressed_image:
-                validated_data['image'] = compressed_image
+            validated_data['image'] = store_image(
+                image, max_size_kb=300, current=instance.image.name
+            )
         return super().update(instance, validated_data)
 
 
@@ -77,7 +76,7 @@ class GoodsDetailSerializer(serializers.ModelSerializer):
     """
 
     ip = IPSimpleSerializer(read_only=True)
-    ip_id = serializers.PrimaryKeyRelatedField(
+    ip_id = BulkPrimaryKeyRelatedField(
         queryset=IP.objects.all(),
         source="ip",
         write_only=True,
@@ -85,7 +84,7 @@ class GoodsDetailSerializer(serializers.ModelSerializer):
         help_text="所属IP作品ID",
     )
     characters = CharacterSimpleSerializer(many=True, read_only=True)
-    character_ids = serializers.PrimaryKeyRelatedField(
+    character_ids = BulkPrimaryKeyRelatedField(
         queryset=Character.objects.all(),
         many=True,
         source="characters",
@@ -94,7 +93,7 @@ class GoodsDetailSerializer(serializers.ModelSerializer):
         help_text="关联角色ID列表，例如：[5, 6] 表示同时关联流萤和花火",
     )
     category = CategorySimpleSerializer(read_only=True)
-    category_id = serializers.PrimaryKeyRelatedField(
+    category_id = BulkPrimaryKeyRelatedField(
         queryset=Category.objects.all(),
         source="category",
         write_only=True,
@@ -102,7 +101,7 @@ class GoodsDetailSerializer(serializers.ModelSerializer):
         help_text="品类ID",
     )
     theme = ThemeSimpleSerializer(read_only=True)
-    theme_id = serializers.PrimaryKeyRelatedField(
+    theme_id = BulkPrimaryKeyRelatedField(
         queryset=Theme.objects.all(),
         source="theme",
         write_only=True,
@@ -110,7 +109,7 @@ class GoodsDetailSerializer(serializers.ModelSerializer):
         allow_null=True,
         help_text="主题ID（可选）",
     )
-    location = serializers.PrimaryKeyRelatedField(
+    location = BulkPrimaryKeyRelatedField(
         queryset=StorageNode.objects.all(),
         required=False,
         allow_null=True,
@@ -194,12 +193,10 @@ class GoodsDetailSerializer(serializers.ModelSerializer):
         # 提取多对多关系数据
         characters = validated_data.pop("characters", [])
         
-        # 处理主图压缩
+        # 处理主图压缩（内容寻址存储，相同图片只存一份）
         main_photo = validated_data.get('main_photo')
         if main_photo:
-            compressed_image = compress_image(main_photo, max_size_kb=300)
-            if compressed_image:
-                validated_data['main_photo'] = compressed_image
+            validated_data['main_photo'] = store_image(main_photo, max_size_kb=300)
         
         # 创建谷子实例
         instance = super().create(validated_data)
@@ -215,12 +212,12 @@ class GoodsDetailSerializer(serializers.ModelSerializer):
         # 提取多对多关系数据
         characters = validated_data.pop("characters", None)
         
-        # 处理主图压缩
+        # 处理主图压缩（内容寻址存储，相同图片只存一份）
         main_photo = validated_data.get('main_photo')
         if main_photo:
-            compressed_image = compress_image(main_photo, max_size_kb=300)
-            if compressed_image:
-                validated_data['main_photo'] = compressed_image
+            validated_data['main_photo'] = store_image(
+                main_photo, max_size_kb=300, current=instance.main_photo.name
+            )
         
         # 更新其他字段
         instance = super().update(instance, validated_data)
@@ -244,3 +241,101 @@ class GoodsMoveSerializer(serializers.Serializer):
         required=True,
         help_text="移动位置：before(之前) / after(之后)",
     )
+
+
+class GoodsBatchDataSerializer(serializers.Serializer):
+    """
+    批量操作中单个谷子的字段数据（仅 JSON 字段，图片仍走上传接口）。
+
+    外键只校验为整数，存在性与归属由批量服务按关联统一做一次 IN 查询校验。
+    """
+
+    name = serializers.CharField(max_length=200, required=False)
+    ip_id = serializers.IntegerField(required=False, help_text="所属IP作品ID")
+    character_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        allow_empty=False,
+        help_text="关联角色ID列表",
+    )
+    category_id = serializers.IntegerField(required=False, help_text="品类ID")
+    theme_id = serializers.IntegerField(required=False, allow_null=True, help_text="主题ID（可选）")
+    location = serializers.IntegerField(required=False, allow_null=True, help_text="位置节点ID（可选）")
+    quantity = serializers.IntegerField(required=False, min_value=0)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
+    purchase_date = serializers.DateField(required=False, allow_null=True)
+    is_official = serializers.BooleanField(required=False)
+    status = serializers.ChoiceField(choices=Goods.STATUS_CHOICES, required=False)
+    notes = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+
+
+class GoodsBatchOperationSerializer(serializers.Serializer):
+    """谷子批量操作中的单条操作"""
+
+    op = serializers.ChoiceField(
+        choices=["create", "update", "delete"],
+        help_text="操作类型：create(新建) / update(部分更新) / delete(删除)",
+    )
+    id = serializers.UUIDField(required=False, help_text="目标谷子ID（update / delete 必填）")
+    data = GoodsBatchDataSerializer(required=False, help_text="字段数据（create / update 必填）")
+
+    def validate(self, attrs):
+        op = attrs["op"]
+        if op in ("update", "delete") and not attrs.get("id"):
+            raise serializers.ValidationError({"id": f"{op} 操作必须提供 id"})
+        if op in ("create", "update") and not attrs.get("data"):
+            raise serializers.ValidationError({"data": f"{op} 操作必须提供 data"})
+        if op == "create":
+            missing = [
+                field
+                for field in ("name", "ip_id", "character_ids", "category_id")
+                if field not in attrs["data"]
+            ]
+            if missing:
+                raise serializers.ValidationError(
+                    {"data": {field: "创建时必填" for field in missing}}
+                )
+        return attrs
+
+
+
+class GoodsBulkTargetSerializer(serializers.Serializer):
+    """
+    集合批量修改的目标：提供 ids 时按 ID 列表，否则由视图按列表筛选参数（GoodsFilter）确定范围。
+    """
+
+    ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        required=False,
+        allow_empty=False,
+        max_length=5000,
+        help_text="谷子ID列表（可选，不提供时使用查询参数中的筛选条件）",
+    )
+
+
+class GoodsBulkLocationSerializer(GoodsBulkTargetSerializer):
+    """批量迁移收纳位置请求序列化器"""
+
+    location = BulkPrimaryKeyRelatedField(
+        queryset=StorageNode.objects.all(),
+        allow_null=True,
+        help_text="目标位置节点ID，传 null 表示清空位置",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        user = getattr(request, "user", None) if request is not None else None
+        if user is None or not getattr(user, "id", None) or is_admin(user):
+            return
+        # 只能迁移到自己的收纳节点
+        self.fields["location"].queryset = StorageNode.objects.filter(user=user)
+
+
+class GoodsBulkStatusSerializer(GoodsBulkTargetSerializer):
+    """批量修改状态请求序列化器"""
+
+    status = serializers.ChoiceField(
+        choices=Goods.STATUS_CHOICES,
+        help_text="目标状态：in_cabinet(在馆) / outdoor(出街中) / sold(已售出)",
+    )
@@ -4,7 +4,7 @@ IP作品相关的序列化器
 from rest_framework import serializers
 
 from ..models import IP, IPKeyword
-from .fields import KeywordsField
+from .fields import CatalogueNestedMixin, KeywordsField
 
 
 class IPKeywordSerializer(serializers.ModelSerializer):
@@ -15,8 +15,8 @@ class IPKeywordSerializer(serializers.ModelSerializer):
         fields = ("id", "value")
 
 
-class IPSimpleSerializer(serializers.ModelSerializer):
-    """IP简单序列化器（用于列表和嵌套显示）"""
+class IPSimpleSerializer(CatalogueNestedMixin, serializers.ModelSerializer):
+    """IP简单序列化器（用于列表和嵌套显示；嵌套时从目录缓存读取IP）"""
 
     keywords = IPKeywordSerializer(many=True, read_only=True, help_text="IP关键词列表")
     character_count = serializers.SerializerMethodField(help_text="该IP下的角色数量")
@@ -0,0 +1,40 @@
+"""
+名称模糊检索（自动补全）相关的序列化器
+"""
+from rest_framework import serializers
+
+from ..name_search_service import AUTOCOMPLETE_DEFAULT_LIMIT, AUTOCOMPLETE_MAX_LIMIT
+
+
+class AutocompleteQuerySerializer(serializers.Serializer):
+    """自动补全查询参数序列化器"""
+    q = serializers.CharField(
+        max_length=100,
+        help_text="检索词，支持中文、拼音全拼 / 首字母、英文缩写及错别字，例如：xingtie、HSR、流荧",
+    )
+    type = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        help_text="检索类型，逗号分隔：ip、character；不传则全部检索",
+    )
+    ip = serializers.IntegerField(
+        required=False,
+        help_text="只检索该 IP（及其角色）",
+    )
+    limit = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=AUTOCOMPLETE_MAX_LIMIT,
+        default=AUTOCOMPLETE_DEFAULT_LIMIT,
+        help_text=f"返回条数，默认 {AUTOCOMPLETE_DEFAULT_LIMIT}，最大 {AUTOCOMPLETE_MAX_LIMIT}",
+    )
+
+
+class AutocompleteItemSerializer(serializers.Serializer):
+    """自动补全结果项序列化器（用于接口文档）"""
+    type = serializers.ChoiceField(choices=("ip", "character"), help_text="结果类型")
+    id = serializers.IntegerField(help_text="IP 或角色 ID")
+    name = serializers.CharField(help_text="IP 或角色名称")
+    matched = serializers.CharField(help_text="命中的名称或 IP 关键词")
+    score = serializers.FloatField(help_text="相关度（0~1）")
+    ip = serializers.DictField(help_text="所属 IP：{id, name}")
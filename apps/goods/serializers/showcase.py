@@ -1,10 +1,13 @@
 """
 展柜相关的序列化器（不含“展柜分类”功能）
 """
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 
 from ..models import Goods, Showcase, ShowcaseGoods
+from ..showcase_service import DETAIL_GOODS_LIMIT, showcase_goods_page
 from ..utils import compress_image
+from .fields import BulkPrimaryKeyRelatedField
 from .goods import GoodsListSerializer
 
 
@@ -12,7 +15,7 @@ class ShowcaseGoodsSerializer(serializers.ModelSerializer):
     """展柜谷子关联序列化器"""
 
     goods = GoodsListSerializer(read_only=True)
-    goods_id = serializers.PrimaryKeyRelatedField(
+    goods_id = BulkPrimaryKeyRelatedField(
         queryset=Goods.objects.all(),
         source="goods",
         write_only=True,
@@ -57,36 +60,35 @@ class ShowcaseListSerializer(serializers.ModelSerializer):
     def get_preview_photos(self, obj):
         """
         返回该展柜下前四个谷子的主图地址（与 Goods.main_photo 输出风格保持一致）。
-        依赖视图层的 prefetch_related，避免 N+1。
+        读取预先计算的 ShowcasePreview（视图层 select_related("preview")），
+        不加载展柜中的谷子，耗时与展柜大小无关。
         """
         request = self.context.get("request")
-        photos = []
-
-        # obj.showcase_goods 来自 related_name="showcase_goods"
-        for sg in obj.showcase_goods.all()[:4]:
-            goods = getattr(sg, "goods", None)
-            if not goods:
-                continue
-            main_photo = getattr(goods, "main_photo", None)
-            if not main_photo:
-                continue
-            try:
-                url = main_photo.url
-            except Exception:
-                url = None
-            if url:
-                # 统一构造绝对 URL（与 DRF ImageField 在有 request 时的行为一致）
-                if request is not None:
-                    url = request.build_absolute_uri(url)
-                photos.append(url)
-
-        return photos
+        # 没有预览记录（展柜中没有谷子）时 getattr 返回 None
+        preview = getattr(obj, "preview", None)
+        if preview is None:
+            return []
+
+        urls = [default_storage.url(name) for name in preview.photos]
+        # 统一构造绝对 URL（与 DRF ImageField 在有 request 时的行为一致）
+        if request is not None:
+            urls = [request.build_absolute_uri(url) for url in urls]
+        return urls
 
 
 class ShowcaseDetailSerializer(serializers.ModelSerializer):
-    """展柜详情序列化器（包含谷子）"""
+    """
+    展柜详情序列化器（谷子摘要）。
+    只内嵌排序最前的 DETAIL_GOODS_LIMIT 个谷子，其余通过 goods 接口按游标分页获取。
+    """
 
-    showcase_goods = ShowcaseGoodsSerializer(many=True, read_only=True)
+    showcase_goods = serializers.SerializerMethodField(
+        help_text="展柜中排序最前的若干个谷子"
+    )
+    goods_count = serializers.SerializerMethodField(help_text="展柜中的谷子总数")
+    goods_next_cursor = serializers.SerializerMethodField(
+        help_text="继续获取剩余谷子的游标（传给 goods 接口的 cursor 参数），没有更多时为 null"
+    )
 
     class Meta:
         model = Showcase
@@ -97,12 +99,32 @@ class ShowcaseDetailSerializer(serializers.ModelSerializer):
             "cover_image",
             "order",
             "is_public",
+            "goods_count",
             "showcase_goods",
+            "goods_next_cursor",
             "created_at",
             "updated_at",
         )
         read_only_fields = ("id", "created_at", "updated_at")
 
+    def _goods_page(self, obj):
+        # showcase_goods 与 goods_next_cursor 共用同一次查询
+        cache = self.__dict__.setdefault("_goods_pages", {})
+        if obj.pk not in cache:
+            cache[obj.pk] = showcase_goods_page(obj, limit=DETAIL_GOODS_LIMIT)
+        return cache[obj.pk]
+
+    def get_showcase_goods(self, obj):
+        items, _ = self._goods_page(obj)
+        return ShowcaseGoodsSerializer(items, many=True, context=self.context).data
+
+    def get_goods_next_cursor(self, obj):
+        _, next_cursor = self._goods_page(obj)
+        return next_cursor
+
+    def get_goods_count(self, obj):
+        return obj.showcase_goods.count()
+
     def create(self, validated_data):
         """创建展柜时自动压缩封面图片"""
         cover_image = validated_data.get("cover_image")
@@ -153,3 +175,24 @@ class MoveGoodsInShowcaseSerializer(serializers.Serializer):
         help_text="移动位置：before(之前) / after(之后)",
     )
 
+
+
+class ShowcaseBulkGoodsSerializer(serializers.Serializer):
+    """
+    批量添加 / 移除展柜谷子的请求序列化器。
+    提供 goods_ids 时按 ID 列表，否则由视图按查询参数中的筛选条件（GoodsFilter）确定范围。
+    """
+
+    goods_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        required=False,
+        allow_empty=False,
+        max_length=5000,
+        help_text="谷子ID列表（可选，不提供时使用查询参数中的筛选条件）",
+    )
+    notes = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        allow_null=True,
+        help_text="备注（可选，仅批量添加时使用，应用到所有新加入的谷子）",
+    )
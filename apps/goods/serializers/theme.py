@@ -4,7 +4,7 @@
 from rest_framework import serializers
 
 from ..models import Theme, ThemeImage
-from ..utils import compress_image
+from ..media_store import store_image
 
 
 class ThemeImageSerializer(serializers.ModelSerializer):
@@ -15,21 +15,19 @@ class ThemeImageSerializer(serializers.ModelSerializer):
         fields = ("id", "image", "label")
 
     def create(self, validated_data):
-        """创建时自动压缩图片"""
+        """创建时自动压缩图片（内容寻址存储，相同图片只存一份）"""
         image = validated_data.get("image")
         if image:
-            compressed_image = compress_image(image, max_size_kb=300)
-            if compressed_image:
-                validated_data["image"] = compressed_image
+            validated_data["image"] = store_image(image, max_size_kb=300)
         return super().create(validated_data)
 
     def update(self, instance, validated_data):
-        """更新时自动压缩图片"""
+        """更新时自动压缩图片（内容寻址存储，相同图片只存一份）"""
         image = validated_data.get("image")
         if image:
-            compressed_image = compress_image(image, max_size_kb=300)
-            if compressed_image:
-                validated_data["image"] = compressed_image
+            validated_data["image"] = store_image(
+                image, max_size_kb=300, current=instance.image.name
+            )
         return super().update(instance, validated_data)
 
 
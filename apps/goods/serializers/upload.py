@@ -0,0 +1,58 @@
+"""
+分片上传相关的序列化器
+"""
+from rest_framework import serializers
+
+from ..models import UploadSession
+from ..upload_service import UPLOAD_CHUNK_SIZE, UPLOAD_MAX_FILE_SIZE
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """分片上传会话（返回续传所需的进度信息）"""
+
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = (
+            "id",
+            "file_name",
+            "total_size",
+            "received_size",
+            "chunk_size",
+            "created_at",
+        )
+        read_only_fields = ("id", "received_size", "chunk_size", "created_at")
+        extra_kwargs = {
+            "total_size": {"min_value": 1, "max_value": UPLOAD_MAX_FILE_SIZE},
+        }
+
+    def get_chunk_size(self, obj):
+        return UPLOAD_CHUNK_SIZE
+
+
+class UploadFinalizeSerializer(serializers.Serializer):
+    """完成分片上传：指定图片的用途"""
+
+    TARGET_CHOICES = (
+        ("goods_main_photo", "谷子主图"),
+        ("goods_additional_photo", "谷子补充图片"),
+        ("theme_image", "主题附加图片"),
+    )
+
+    target = serializers.ChoiceField(choices=TARGET_CHOICES, help_text="图片用途")
+    goods_id = serializers.UUIDField(required=False, help_text="谷子ID（goods_* 用途必填）")
+    photo_id = serializers.IntegerField(
+        required=False,
+        help_text="要替换的补充图片 / 主题图片ID（可选，不提供时新建）",
+    )
+    theme_id = serializers.IntegerField(required=False, help_text="主题ID（theme_image 用途必填）")
+    label = serializers.CharField(required=False, allow_blank=True, max_length=100)
+
+    def validate(self, attrs):
+        target = attrs["target"]
+        if target.startswith("goods_") and not attrs.get("goods_id"):
+            raise serializers.ValidationError({"goods_id": "该用途必须提供 goods_id"})
+        if target == "theme_image" and not attrs.get("theme_id"):
+            raise serializers.ValidationError({"theme_id": "该用途必须提供 theme_id"})
+        return attrs
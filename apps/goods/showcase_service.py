@@ -0,0 +1,351 @@
+"""
+展柜预览与公共展柜抽样服务模块
+- 预览：每个展柜前几个谷子的主图路径预先计算到 ShowcasePreview，
+  展柜内容或谷子主图变化时在事务提交后刷新，列表接口无需再加载展柜中的谷子
+- 抽样：公共展柜按随机排序键 random_key 取一段连续区间，走 (is_public, random_key) 索引，
+  不需要把全部展柜 ID 读入内存；random_key 由 refresh_showcase_previews 命令定期重新打乱
+- 分页：展柜中的谷子按 (order, -created_at, id) 游标分页，翻页走索引范围查询，与页码深度无关
+- 缓存：匿名访问公开展柜详情 / 谷子分页时缓存响应数据，键中带展柜版本号；
+  展柜、展柜谷子或其中的谷子变化时删除版本号，旧缓存不再命中，按超时自然淘汰
+- 批量添加 / 移除：一次查询跳过已存在的关联，新关联分配连续的稀疏排序值并 bulk_create
+"""
+import base64
+import datetime
+import hashlib
+import json
+import random
+import threading
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Min, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import Showcase, ShowcaseGoods, ShowcasePreview
+
+# 每个展柜预览的谷子数
+PREVIEW_SIZE = 4
+# 公共展柜列表每次返回的数量
+PUBLIC_SAMPLE_SIZE = 10
+# 展柜谷子分页：默认 / 最大每页数量
+GOODS_PAGE_SIZE = 50
+GOODS_MAX_PAGE_SIZE = 200
+# 展柜详情中内嵌的谷子数量（其余通过 goods 接口分页获取）
+DETAIL_GOODS_LIMIT = 20
+# 展柜中谷子的排序（与 ShowcaseGoods.Meta.ordering 一致，id 保证顺序唯一）
+GOODS_ORDERING = ("order", "-created_at", "id")
+# 公开展柜响应缓存时间（秒）；IP / 角色 / 品类等名称修改不主动失效，最多延迟该时长
+PUBLIC_CACHE_TIMEOUT = getattr(settings, "SHOWCASE_PUBLIC_CACHE_TIMEOUT", 300)
+PUBLIC_CACHE_PREFIX = "showcase:public"
+# 批量添加 / 移除单次允许的最大谷子数
+BULK_MAX_GOODS = 5000
+# 稀疏排序步长（与 ShowcaseViewSet.ORDER_STEP 保持一致）
+ORDER_STEP = 1000
+
+_local = threading.local()
+
+
+class InvalidCursor(ValueError):
+    """游标无法解析"""
+
+
+# ---- 批量操作期间延迟同步 ----
+
+@contextmanager
+def deferred_sync():
+    """
+    批量操作期间跳过信号中逐条的预览刷新与缓存失效，由调用方结束后统一处理一次。
+    """
+    _local.depth = getattr(_local, "depth", 0) + 1
+    try:
+        yield
+    finally:
+        _local.depth -= 1
+
+
+def sync_deferred():
+    return getattr(_local, "depth", 0) > 0
+
+
+# ---- 预览 ----
+
+def refresh_previews(showcase_ids):
+    """
+    重新计算指定展柜的预览：一次窗口函数查询取每个展柜的前 PREVIEW_SIZE 个谷子，
+    再一次 upsert 写回。已删除的展柜会被忽略。
+    """
+    showcase_ids = set(showcase_ids)
+    if not showcase_ids:
+        return 0
+    existing = set(
+        Showcase.objects.filter(pk__in=showcase_ids).values_list("pk", flat=True)
+    )
+    if not existing:
+        return 0
+
+    rows = (
+        ShowcaseGoods.objects.filter(showcase_id__in=existing)
+        .annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=[F("showcase_id")],
+                order_by=[F("order").asc(), F("created_at").desc(), F("id").asc()],
+            )
+        )
+        .filter(rank__lte=PREVIEW_SIZE)
+        .order_by("showcase_id", "rank")
+        .values_list("showcase_id", "goods__main_photo")
+    )
+    photos = {showcase_id: [] for showcase_id in existing}
+    for showcase_id, main_photo in rows:
+        if main_photo:
+            photos[showcase_id].append(main_photo)
+
+    ShowcasePreview.objects.bulk_create(
+        [ShowcasePreview(showcase_id=sid, photos=names) for sid, names in photos.items()],
+        update_conflicts=True,
+        unique_fields=["showcase"],
+        update_fields=["photos", "updated_at"],
+    )
+    return len(photos)
+
+
+def refresh_previews_for_goods(goods_ids):
+    """谷子主图变化时，刷新包含这些谷子的展柜预览"""
+    showcase_ids = ShowcaseGoods.objects.filter(goods_id__in=goods_ids).values_list(
+        "showcase_id", flat=True
+    )
+    return refresh_previews(showcase_ids)
+
+
+def schedule_preview_refresh(showcase_ids):
+    """在当前事务提交后刷新展柜预览（不在事务中时立即刷新）"""
+    showcase_ids = set(showcase_ids)
+    if showcase_ids:
+        transaction.on_commit(lambda: refresh_previews(showcase_ids))
+
+
+def schedule_goods_preview_refresh(goods_ids):
+    """在当前事务提交后刷新包含这些谷子的展柜预览"""
+    goods_ids = set(goods_ids)
+    if goods_ids:
+        transaction.on_commit(lambda: refresh_previews_for_goods(goods_ids))
+
+
+def refresh_all_previews(batch_size=500):
+    """按批重新计算全部展柜的预览，返回处理的展柜数"""
+    total = 0
+    batch = []
+    for showcase_id in Showcase.objects.values_list("pk", flat=True).iterator(
+        chunk_size=batch_size
+    ):
+        batch.append(showcase_id)
+        if len(batch) >= batch_size:
+            total += refresh_previews(batch)
+            batch = []
+    if batch:
+        total += refresh_previews(batch)
+    return total
+
+
+# ---- 抽样 ----
+
+def sample_public_showcase_ids(queryset=None, limit=PUBLIC_SAMPLE_SIZE):
+    """
+    随机抽取公共展柜 ID：随机取一个起点，按 random_key 顺序向后取 limit 个，
+    不足时从头部补齐（环形）。最多两次索引范围查询，与展柜总数无关。
+    """
+    if queryset is None:
+        queryset = Showcase.objects.filter(is_public=True)
+    queryset = queryset.order_by("random_key")
+    pivot = random.random()
+    ids = list(
+        queryset.filter(random_key__gte=pivot).values_list("id", flat=True)[:limit]
+    )
+    if len(ids) < limit:
+        ids += list(
+            queryset.filter(random_key__lt=pivot)
+            .exclude(id__in=ids)
+            .values_list("id", flat=True)[: limit - len(ids)]
+        )
+    return ids
+
+
+def reshuffle_random_keys(batch_size=500):
+    """
+    重新打乱全部展柜的 random_key，使抽样窗口中的相邻展柜定期变化，返回处理的展柜数。
+    """
+    total = 0
+    batch = []
+    for showcase in Showcase.objects.only("id").iterator(chunk_size=batch_size):
+        showcase.random_key = random.random()
+        batch.append(showcase)
+        if len(batch) >= batch_size:
+            Showcase.objects.bulk_update(batch, ["random_key"])
+            total += len(batch)
+            batch = []
+    if batch:
+        Showcase.objects.bulk_update(batch, ["random_key"])
+        total += len(batch)
+    return total
+
+
+# ---- 展柜谷子游标分页 ----
+
+def encode_goods_cursor(item):
+    """把一条 ShowcaseGoods 的排序键编码为游标（URL 安全的 base64）"""
+    payload = json.dumps([item.order, item.created_at.isoformat(), str(item.id)])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_goods_cursor(cursor):
+    """解析游标，返回 (order, created_at, id)；格式不符（含 JSON 合法但字段类型不对）时抛出 InvalidCursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(payload, list) or len(payload) != 3:
+            raise InvalidCursor(cursor)
+        order, created_at, item_id = payload
+        if isinstance(order, bool) or not isinstance(order, int):
+            raise InvalidCursor(cursor)
+        if not isinstance(created_at, str) or not isinstance(item_id, str):
+            raise InvalidCursor(cursor)
+        return order, datetime.datetime.fromisoformat(created_at), uuid.UUID(item_id)
+    except (TypeError, ValueError, AttributeError):
+        raise InvalidCursor(cursor)
+
+
+def showcase_goods_page(showcase, cursor=None, limit=GOODS_PAGE_SIZE):
+    """
+    取展柜中游标之后的 limit 个谷子，返回 (items, next_cursor)；没有下一页时 next_cursor 为 None。
+    """
+    qs = (
+        ShowcaseGoods.objects.filter(showcase=showcase)
+        # IP、品类以及角色所属 IP 由序列化器从进程内目录缓存读取
+        .select_related("goods__location", "goods__theme")
+        .prefetch_related("goods__characters")
+        .order_by(*GOODS_ORDERING)
+    )
+    if cursor:
+        order, created_at, item_id = decode_goods_cursor(cursor)
+        qs = qs.filter(
+            Q(order__gt=order)
+            | Q(order=order, created_at__lt=created_at)
+            | Q(order=order, created_at=created_at, id__gt=item_id)
+        )
+    items = list(qs[: limit + 1])
+    if len(items) > limit:
+        return items[:limit], encode_goods_cursor(items[limit - 1])
+    return items, None
+
+
+# ---- 公开展柜响应缓存 ----
+
+def _version_key(showcase_id):
+    return f"{PUBLIC_CACHE_PREFIX}:version:{showcase_id}"
+
+
+def public_cache_key(showcase_id, name, url):
+    """
+    公开展柜响应的缓存键：展柜 ID + 当前版本号 + 接口名 + 请求地址（含查询参数）摘要。
+    版本号不存在（首次访问或已失效）时生成新的随机版本号。
+    """
+    version_key = _version_key(showcase_id)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(version_key)
+    digest = hashlib.sha256(url.encode()).hexdigest()[:32]
+    return f"{PUBLIC_CACHE_PREFIX}:{showcase_id}:{version}:{name}:{digest}"
+
+
+def invalidate_public_cache(showcase_ids):
+    """在当前事务提交后使指定展柜的响应缓存失效（不在事务中时立即失效）"""
+    keys = [_version_key(showcase_id) for showcase_id in set(showcase_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def public_showcase_ids_for_goods(goods_ids):
+    """包含这些谷子的公开展柜 ID（goods_ids 可以是主键子查询）"""
+    return list(
+        ShowcaseGoods.objects.filter(goods_id__in=goods_ids, showcase__is_public=True)
+        .order_by()
+        .values_list("showcase_id", flat=True)
+        .distinct()
+    )
+
+
+def invalidate_goods_public_cache(goods_ids):
+    """谷子变化时，使包含这些谷子的公开展柜缓存失效"""
+    invalidate_public_cache(public_showcase_ids_for_goods(goods_ids))
+
+
+# ---- 批量添加 / 移除 ----
+
+def add_goods_bulk(showcase, goods_ids, notes=None):
+    """
+    批量把谷子加入展柜，goods_ids 需已校验归属，按期望的展示顺序排列。
+    已在展柜中的谷子跳过；新加入的谷子排在最前，占用一段连续的稀疏排序值。
+    返回 (added, skipped)。
+    """
+    with transaction.atomic():
+        existing = set(
+            ShowcaseGoods.objects.filter(showcase=showcase, goods_id__in=goods_ids)
+            .values_list("goods_id", flat=True)
+        )
+        new_ids = []
+        for goods_id in goods_ids:
+            if goods_id not in existing:
+                existing.add(goods_id)
+                new_ids.append(goods_id)
+
+        if new_ids:
+            min_order = (
+                ShowcaseGoods.objects.filter(showcase=showcase)
+                .aggregate(min_order=Min("order"))
+                .get("min_order")
+            )
+            start = (min_order or 0) - ORDER_STEP * len(new_ids)
+            orders = {goods_id: start + index * ORDER_STEP for index, goods_id in enumerate(new_ids)}
+            # 并发加入同一谷子时由唯一约束 (showcase, goods) 兜底跳过
+            ShowcaseGoods.objects.bulk_create(
+                [
+                    ShowcaseGoods(showcase=showcase, goods_id=goods_id, order=order, notes=notes)
+                    for goods_id, order in orders.items()
+                ],
+                batch_size=500,
+                ignore_conflicts=True,
+            )
+            # ignore_conflicts 时 bulk_create 不返回实际插入的行，
+            # 按本次分配的排序值回查，被并发请求抢先加入的谷子计入 skipped
+            added = sum(
+                1
+                for goods_id, order in ShowcaseGoods.objects.filter(
+                    showcase=showcase, goods_id__in=new_ids
+                ).values_list("goods_id", "order")
+                if orders[goods_id] == order
+            )
+            # bulk_create 不触发信号，手动刷新预览并使缓存失效
+            schedule_preview_refresh([showcase.pk])
+            invalidate_public_cache([showcase.pk])
+        else:
+            added = 0
+    return added, len(goods_ids) - added
+
+
+def remove_goods_bulk(showcase, goods_ids):
+    """
+    批量从展柜移除谷子（goods_ids 可以是主键子查询），返回移除的数量。
+    """
+    with transaction.atomic(), deferred_sync():
+        removed, _ = ShowcaseGoods.objects.filter(
+            showcase=showcase, goods_id__in=goods_ids
+        ).delete()
+        if removed:
+            schedule_preview_refresh([showcase.pk])
+            invalidate_public_cache([showcase.pk])
+    return removed
@@ -1,83 +1,214 @@
-from django.core.files.storage import default_storage
-from django.db.models.signals import post_delete, pre_save
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
 from django.dispatch import receiver
 
-from .models import Character, Goods
+from .catalogue import bump_version
+from .media_cleanup import file_changed, remember_files, replaced_file, schedule_delete
+from .media_store import release_file
+from .models import IP, Category, Character, Goods, GuziImage, IPKeyword, Showcase, ShowcaseGoods, ThemeImage
+from .name_search_service import index_object
+from .showcase_service import (
+    invalidate_goods_public_cache,
+    invalidate_public_cache,
+    schedule_goods_preview_refresh,
+    schedule_preview_refresh,
+    sync_deferred,
+)
+
+# 公开展柜中谷子卡片（GoodsListSerializer）用到的谷子字段（含外键的 attname 写法）。
+# 谷子自身的排序值不影响展柜内的顺序（展柜使用 ShowcaseGoods.order），不在此列
+PUBLIC_GOODS_FIELDS = frozenset(
+    {
+        "name",
+        "ip",
+        "ip_id",
+        "category",
+        "category_id",
+        "theme",
+        "theme_id",
+        "location",
+        "location_id",
+        "main_photo",
+        "status",
+        "quantity",
+        "is_official",
+    }
+)
+
+
+@receiver(post_init, sender=Character)
+def remember_character_avatar(sender, instance, **kwargs):
+    """加载角色时记录头像原值，保存时据此判断是否替换，无需再查库"""
+    remember_files(instance, ("avatar",))
 
 
 @receiver(post_delete, sender=Character)
 def delete_avatar_on_character_delete(sender, instance, **kwargs):
     """
     删除角色时同步删除存储中的头像文件，避免残留。
-    只删除本地文件，不删除外部URL。
+    只删除本地文件，不删除外部URL（事务提交后由后台批量删除）。
     """
     avatar = getattr(instance, "avatar", None)
     if avatar and isinstance(avatar, str):
-        # 判断是否为本地路径（不是http://或https://开头的URL）
-        if not avatar.startswith('http://') and not avatar.startswith('https://'):
-            # 是本地路径，删除文件
-            if default_storage.exists(avatar):
-                default_storage.delete(avatar)
+        schedule_delete(avatar)
 
 
-@receiver(pre_save, sender=Character)
-def delete_old_avatar_on_update(sender, instance, **kwargs):
+@receiver(post_save, sender=Character)
+def delete_old_avatar_on_update(sender, instance, created, update_fields=None, **kwargs):
     """
     更新角色头像时删除旧文件，避免废弃文件占用存储。
-    只删除本地文件，不删除外部URL。
+    只删除本地文件，不删除外部URL；未保存 avatar 字段时直接跳过。
     """
-    if not instance.pk:
-        return
-
-    try:
-        old = Character.objects.get(pk=instance.pk)
-    except Character.DoesNotExist:
-        return
+    if not created:
+        schedule_delete(replaced_file(instance, "avatar", update_fields))
+    remember_files(instance, ("avatar",))
 
-    old_avatar = getattr(old, "avatar", None)
-    new_avatar = getattr(instance, "avatar", None)
 
-    # 只有当旧头像和新头像不同，且旧头像是本地路径时，才删除
-    if old_avatar and isinstance(old_avatar, str) and old_avatar != new_avatar:
-        # 判断是否为本地路径（不是http://或https://开头的URL）
-        if not old_avatar.startswith('http://') and not old_avatar.startswith('https://'):
-            # 是本地路径，删除文件
-            if default_storage.exists(old_avatar):
-                default_storage.delete(old_avatar)
+@receiver(post_init, sender=Goods)
+def remember_goods_main_photo(sender, instance, **kwargs):
+    """加载谷子时记录主图原值，保存时据此判断是否替换，无需再查库"""
+    remember_files(instance, ("main_photo",))
 
 
 @receiver(post_delete, sender=Goods)
 def delete_main_photo_on_goods_delete(sender, instance, **kwargs):
     """
-    删除谷子时同步删除主图文件。
+    删除谷子时释放主图引用（内容寻址文件引用归零后才删除，事务提交后由后台批量删除）。
     """
     main_photo = getattr(instance, "main_photo", None)
     if main_photo and main_photo.name:
-        storage = main_photo.storage
-        name = main_photo.name
-        if storage.exists(name):
-            storage.delete(name)
+        release_file(main_photo.name, main_photo.storage)
 
 
-@receiver(pre_save, sender=Goods)
-def delete_old_main_photo_on_update(sender, instance, **kwargs):
+@receiver(post_delete, sender=Goods)
+def hand_over_fingerprint_on_goods_delete(sender, instance, **kwargs):
+    """删除持有指纹的谷子后，把指纹移交给剩余的历史重复数据"""
+    if instance.fingerprint:
+        Goods.hand_over_fingerprints({(instance.user_id, instance.fingerprint)})
+
+
+@receiver(post_save, sender=Goods)
+def delete_old_main_photo_on_update(sender, instance, created, update_fields=None, **kwargs):
+    """
+    更新谷子主图时释放旧文件引用。
+    update_fields 不含 main_photo（如排序移动、刷新 updated_at）时直接跳过。
+    同时维护包含该谷子的展柜预览与公开展柜缓存；update_fields 不涉及展柜卡片字段时不使缓存失效。
     """
-    更新谷子主图时删除旧文件。
+    if not created:
+        old_name = replaced_file(instance, "main_photo", update_fields)
+        if old_name:
+            release_file(old_name, instance.main_photo.storage)
+        if file_changed(instance, "main_photo", update_fields):
+            # 主图变化时刷新包含该谷子的展柜预览
+            schedule_goods_preview_refresh([instance.pk])
+        # 谷子信息变化时使包含它的公开展柜缓存失效
+        if update_fields is None or PUBLIC_GOODS_FIELDS.intersection(update_fields):
+            invalidate_goods_public_cache([instance.pk])
+    remember_files(instance, ("main_photo",))
+
+
+@receiver(post_init, sender=GuziImage)
+@receiver(post_init, sender=ThemeImage)
+def remember_extra_image(sender, instance, **kwargs):
+    """加载补充图片 / 主题图片时记录图片原值"""
+    remember_files(instance, ("image",))
+
+
+@receiver(post_delete, sender=GuziImage)
+@receiver(post_delete, sender=ThemeImage)
+def release_image_on_delete(sender, instance, **kwargs):
     """
-    if not instance.pk:
+    删除补充图片 / 主题图片（含随谷子、主题级联删除）时释放图片引用。
+    """
+    image = getattr(instance, "image", None)
+    if image and image.name:
+        release_file(image.name, image.storage)
+
+
+@receiver(post_save, sender=GuziImage)
+@receiver(post_save, sender=ThemeImage)
+def release_old_image_on_update(sender, instance, created, update_fields=None, **kwargs):
+    """替换补充图片 / 主题图片时释放旧文件引用"""
+    if not created:
+        old_name = replaced_file(instance, "image", update_fields)
+        if old_name:
+            release_file(old_name, instance.image.storage)
+    remember_files(instance, ("image",))
+
+
+@receiver(post_save, sender=Showcase)
+@receiver(post_delete, sender=Showcase)
+def invalidate_cache_on_showcase_change(sender, instance, **kwargs):
+    """展柜修改（含公开状态变化）或删除时使其响应缓存失效"""
+    invalidate_public_cache([instance.pk])
+
+
+@receiver(post_save, sender=ShowcaseGoods)
+def refresh_preview_on_showcase_goods_save(sender, instance, created, update_fields=None, **kwargs):
+    """
+    展柜中加入谷子或调整顺序时刷新展柜预览（只修改备注时跳过），并使展柜响应缓存失效。
+    """
+    if sync_deferred():
+        return
+    invalidate_public_cache([instance.showcase_id])
+    if update_fields is not None and not {"order", "goods", "showcase"} & set(update_fields):
         return
+    schedule_preview_refresh([instance.showcase_id])
 
-    try:
-        old = Goods.objects.get(pk=instance.pk)
-    except Goods.DoesNotExist:
+
+@receiver(post_delete, sender=ShowcaseGoods)
+def refresh_preview_on_showcase_goods_delete(sender, instance, origin=None, **kwargs):
+    """
+    从展柜移除谷子时刷新展柜预览并使缓存失效；
+    随展柜一起级联删除或批量移除（调用方统一处理）时跳过。
+    """
+    origin_model = getattr(origin, "model", type(origin))
+    if origin_model is Showcase or sync_deferred():
+        return
+    invalidate_public_cache([instance.showcase_id])
+    schedule_preview_refresh([instance.showcase_id])
+
+
+@receiver(m2m_changed, sender=Goods.characters.through)
+def sync_fingerprint_on_characters_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    谷子角色集合变化时同步幂等指纹。
+    """
+    if action not in ("post_add", "post_remove", "post_clear"):
         return
 
-    old_photo = getattr(old, "main_photo", None)
-    new_photo = getattr(instance, "main_photo", None)
+    if not reverse:
+        instance.sync_fingerprint()
+        invalidate_goods_public_cache([instance.pk])
+        return
+
+    # 从角色一侧修改关联（character.goods.add/remove）时，逐个同步受影响的谷子
+    if pk_set:
+        for goods in Goods.objects.filter(pk__in=pk_set):
+            goods.sync_fingerprint()
+        invalidate_goods_public_cache(pk_set)
+
+
+@receiver(post_save, sender=IP)
+@receiver(post_save, sender=IPKeyword)
+@receiver(post_save, sender=Character)
+def refresh_name_index(sender, instance, update_fields=None, **kwargs):
+    """
+    IP / IP 关键词 / 角色保存后刷新名称检索索引；
+    只更新了与名称无关的字段（如头像、作品类型）时跳过。
+    """
+    if update_fields is not None and not {"name", "value", "ip"} & set(update_fields):
+        return
+    index_object(instance)
 
-    if old_photo and old_photo.name and old_photo != new_photo:
-        storage = old_photo.storage
-        name = old_photo.name
-        if storage.exists(name):
-            storage.delete(name)
 
+@receiver(post_save, sender=IP)
+@receiver(post_save, sender=IPKeyword)
+@receiver(post_save, sender=Character)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=IP)
+@receiver(post_delete, sender=IPKeyword)
+@receiver(post_delete, sender=Character)
+@receiver(post_delete, sender=Category)
+def bump_catalogue_version(sender, **kwargs):
+    """目录数据（IP / 关键词 / 角色 / 品类，含级联删除）变化时更新目录版本号，各进程据此刷新目录缓存"""
+    bump_version()
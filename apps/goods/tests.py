@@ -1,3 +1,817 @@
-from django.test import TestCase
+import base64
+import datetime
+import importlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import uuid
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.location.models import StorageNode
+from apps.users.models import Role, User
+
+from . import catalogue, upload_service
+from .batch_service import GoodsBatchProcessor
+from .import_service import GoodsImporter
+from .models import (
+    IP,
+    Category,
+    Character,
+    Goods,
+    GuziImage,
+    MediaBlob,
+    NameIndex,
+    Showcase,
+    ShowcaseGoods,
+    UploadSession,
+)
+from .name_search_service import autocomplete
+from .serializers import GoodsDetailSerializer
+from .utils import compress_images
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix="shigu-test-media-")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class GoodsTestCase(TestCase):
+    """公共测试数据：两个普通用户，一个 IP 及两个角色，两级品类，两级收纳节点"""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.get_or_create(name="User")[0]
+        cls.user = User.objects.create(username="u1", password="", role=role)
+        cls.other_user = User.objects.create(username="u2", password="", role=role)
+        cls.ip = IP.objects.create(name="崩坏：星穹铁道")
+        cls.firefly = Character.objects.create(ip=cls.ip, name="流萤")
+        cls.sparkle = Character.objects.create(ip=cls.ip, name="花火")
+        cls.category_root = Category.objects.create(name="周边", path_name="周边")
+        cls.category = Category.objects.create(
+            name="吧唧", parent=cls.category_root, path_name="周边/吧唧"
+        )
+        cls.room = StorageNode.objects.create(name="书房", path_name="书房", user=cls.user)
+        cls.shelf = StorageNode.objects.create(
+            name="书架A", parent=cls.room, path_name="书房/书架A", user=cls.user
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # 目录快照是进程级的，而每个用例结束后数据库会回滚，开始前强制重新核对版本号
+        catalogue.expire()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @staticmethod
+    def image_file(color="red", name="photo.png"):
+        """一张很小的 PNG（不超过压缩阈值，不会触发压缩）"""
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def create_goods(self, name, user=None, characters=None, **fields):
+        fields.setdefault("ip", self.ip)
+        fields.setdefault("category", self.category)
+        goods = Goods.objects.create(user=user or self.user, name=name, **fields)
+        goods.characters.set(characters or [self.firefly])
+        return goods
+
+
+class ExportTests(GoodsTestCase):
+    def export(self, file_format):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/goods/export/?file_format={file_format}")
+            content = b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return content, len(queries)
+
+    def test_zip_media_matches_manifest(self):
+        for index in range(3):
+            goods = self.create_goods(f"吧唧{index}", location=self.shelf)
+            goods.main_photo = default_storage.save(
+                f"goods/main/{index}.jpg", ContentFile(b"main%d" % index)
+            )
+            goods.save(update_fields=["main_photo"])
+            GuziImage.objects.create(
+                guzi=goods,
+                image=default_storage.save(f"goods/extra/{index}.jpg", ContentFile(b"extra")),
+            )
+
+        content, _ = self.export("zip")
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            rows = [json.loads(line) for line in archive.read("goods.jsonl").splitlines()]
+            media = {name for name in archive.namelist() if name.startswith("media/")}
+
+        referenced = set()
+        for row in rows:
+            referenced.add("media/" + row["main_photo"])
+            referenced.update("media/" + photo["image"] for photo in row["additional_photos"])
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(media, referenced)
+
+    def test_zip_writes_shared_media_once(self):
+        shared = default_storage.save("goods/main/shared.jpg", ContentFile(b"shared"))
+        for index in range(3):
+            self.create_goods(f"吧唧{index}", main_photo=shared)
+
+        content, _ = self.export("zip")
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            names = archive.namelist()
+            self.assertEqual(len(archive.read("goods.jsonl").splitlines()), 3)
+        self.assertEqual(names.count("media/" + shared), 1)
+
+    def test_export_query_count_is_independent_of_row_count(self):
+        self.create_goods("吧唧0", location=self.shelf)
+        for file_format in ("jsonl", "csv", "zip"):
+            with self.subTest(file_format=file_format):
+                _, one_row = self.export(file_format)
+                for index in range(1, 30):
+                    self.create_goods(f"{file_format}{index}", location=self.shelf)
+                _, many_rows = self.export(file_format)
+                self.assertEqual(many_rows, one_row)
+                Goods.objects.exclude(name="吧唧0").delete()
+
+    def test_zip_reads_goods_in_a_single_pass(self):
+        for index in range(5):
+            self.create_goods(f"吧唧{index}")
+        _, jsonl_queries = self.export("jsonl")
+        _, zip_queries = self.export("zip")
+        self.assertEqual(zip_queries, jsonl_queries)
+
+
+class CatalogueTests(GoodsTestCase):
+    def ip_names(self):
+        return [ip.name for ip in catalogue.get_catalogue().ips]
+
+    def test_write_refreshes_snapshot(self):
+        self.assertEqual(self.ip_names(), ["崩坏：星穹铁道"])
+        IP.objects.create(name="原神", order=-1)
+        self.assertEqual(self.ip_names(), ["原神", "崩坏：星穹铁道"])
+
+    def test_bulk_update_order_refreshes_snapshot(self):
+        other = IP.objects.create(name="原神", order=1)
+        self.assertEqual(self.ip_names(), ["崩坏：星穹铁道", "原神"])
+        self.user.role = Role.objects.get_or_create(name="Admin")[0]
+        self.user.save()
+        response = self.client.post(
+            "/api/ips/batch-update-order/", {"items": [{"id": other.id, "order": -1}]}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.ip_names(), ["原神", "崩坏：星穹铁道"])
+
+    def test_rolled_back_snapshot_is_not_reused(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            IP.objects.create(name="回滚的IP")
+            self.assertIn("回滚的IP", self.ip_names())
+            raise RuntimeError
+        IP.objects.create(name="原神")
+        self.assertEqual(sorted(self.ip_names()), ["原神", "崩坏：星穹铁道"])
+
+    def test_write_validation_ignores_stale_snapshot(self):
+        # 模拟其他进程删除品类：本进程的快照仍在检查间隔内，包含已删除的品类
+        removed_id = Category.objects.create(name="已删除", path_name="已删除").pk
+        self.assertIsNotNone(catalogue.lookup(Category, removed_id))
+        with mock.patch("apps.goods.signals.bump_version"):
+            Category.objects.filter(pk=removed_id).delete()
+        self.assertIsNotNone(catalogue.lookup(Category, removed_id))
+
+        data = {
+            "name": "吧唧",
+            "ip_id": self.ip.id,
+            "character_ids": [self.firefly.id],
+            "category_id": removed_id,
+        }
+        response = self.client.post("/api/goods/", data, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("category_id", response.data)
+
+        response = self.client.post(
+            "/api/goods/batch/", {"operations": [{"op": "create", "data": data}]}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("category_id", response.data["results"][0]["errors"]["data"])
+
+    def test_goods_list_does_not_query_catalogue_per_row(self):
+        for index in range(20):
+            self.create_goods(f"吧唧{index}", characters=[self.firefly, self.sparkle])
+        catalogue.get_catalogue()
+        with self.assertNumQueries(4):
+            response = self.client.get("/api/goods/?page_size=20")
+        self.assertEqual(len(response.data["results"]), 20)
+        self.assertEqual(response.data["results"][0]["ip"]["character_count"], 2)
+
+
+class BulkUpdateFieldTests(GoodsTestCase):
+    def test_bulk_location_moves_only_own_goods(self):
+        mine = self.create_goods("吧唧1", location=self.room)
+        moved = self.create_goods("吧唧2")
+        others = self.create_goods("吧唧3", user=self.other_user)
+        updated_at = mine.updated_at
+
+        response = self.client.post(
+            "/api/goods/bulk-location/",
+            {"location": self.shelf.id, "ids": [str(mine.id), str(moved.id), str(others.id)]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"updated": 2})
+        mine.refresh_from_db()
+        others.refresh_from_db()
+        self.assertEqual(mine.location_id, self.shelf.id)
+        self.assertGreater(mine.updated_at, updated_at)
+        self.assertIsNone(others.location_id)
+
+    def test_bulk_location_rejects_other_users_node(self):
+        goods = self.create_goods("吧唧")
+        node = StorageNode.objects.create(name="别人的柜子", path_name="别人的柜子", user=self.other_user)
+        response = self.client.post(
+            "/api/goods/bulk-location/", {"location": node.id, "ids": [str(goods.id)]}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        goods.refresh_from_db()
+        self.assertIsNone(goods.location_id)
+
+    def test_bulk_status_by_filter(self):
+        sparkle = self.create_goods("花火吧唧", characters=[self.sparkle])
+        sold = self.create_goods("花火色纸", characters=[self.sparkle], status="sold")
+        firefly = self.create_goods("流萤吧唧")
+
+        response = self.client.post(
+            f"/api/goods/bulk-status/?character={self.sparkle.id}", {"status": "sold"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        # 已是目标状态的谷子不计入
+        self.assertEqual(response.data, {"updated": 1})
+        self.assertEqual(
+            dict(Goods.objects.values_list("id", "status")),
+            {sparkle.id: "sold", sold.id: "sold", firefly.id: "in_cabinet"},
+        )
+
+    def test_bulk_status_requires_ids_or_filter(self):
+        self.create_goods("吧唧")
+        response = self.client.post("/api/goods/bulk-status/", {"status": "sold"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Goods.objects.filter(status="sold").exists())
+
+
+class BulkOrderTests(GoodsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.role = Role.objects.get_or_create(name="Admin")[0]
+        self.user.save()
+
+    def reorder(self, url, objects, queries):
+        items = [{"id": obj.id, "order": -index - 1} for index, obj in enumerate(objects)]
+        with self.assertNumQueries(queries):
+            response = self.client.post(url, {"items": items}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_ip_reorder_query_count_is_independent_of_item_count(self):
+        # 取出并校验、预取关键词、SAVEPOINT、一条 CASE WHEN UPDATE、目录版本号、RELEASE
+        ips = [self.ip] + [IP.objects.create(name=f"IP{index}") for index in range(1, 40)]
+        self.reorder("/api/ips/batch-update-order/", ips[:1], 6)
+        response = self.reorder("/api/ips/batch-update-order/", ips, 6)
+        self.assertEqual([item["id"] for item in response.data["ips"]], [ip.id for ip in reversed(ips)])
+
+    def test_category_reorder_query_count_is_independent_of_item_count(self):
+        categories = [self.category_root] + [
+            Category.objects.create(name=f"品类{index}", path_name=f"品类{index}")
+            for index in range(1, 40)
+        ]
+        self.reorder("/api/categories/batch-update-order/", categories[:1], 5)
+        self.reorder("/api/categories/batch-update-order/", categories, 5)
+        self.assertEqual(
+            list(Category.objects.filter(parent=None).order_by("order").values_list("id", flat=True)),
+            [category.id for category in reversed(categories)],
+        )
+
+
+class FacetTests(GoodsTestCase):
+    def list_with_facets(self, queries):
+        catalogue.get_catalogue()
+        with self.assertNumQueries(queries):
+            response = self.client.get(
+                "/api/goods/?page_size=5&facets=ip,status,character&search=吧唧"
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.data["facets"]
+
+    def test_each_facet_costs_one_query_regardless_of_row_count(self):
+        # 列表本身 4 条（计数、当前页、两个预取），每个维度再加一条分组统计
+        for index in range(5):
+            self.create_goods(f"吧唧{index}", characters=[self.firefly, self.sparkle])
+        self.list_with_facets(4 + 3)
+
+        for index in range(5, 30):
+            self.create_goods(f"吧唧{index}", characters=[self.firefly], status="sold")
+        self.create_goods("色纸", status="sold")
+        facets = self.list_with_facets(4 + 3)
+        self.assertEqual(facets["ip"], [{"value": self.ip.id, "label": self.ip.name, "count": 30}])
+        self.assertEqual(
+            [(row["value"], row["count"]) for row in facets["status"]],
+            [("sold", 25), ("in_cabinet", 5)],
+        )
+        self.assertEqual(
+            [(row["label"], row["count"]) for row in facets["character"]],
+            [("流萤", 30), ("花火", 5)],
+        )
+
+
+class RelationValidationTests(GoodsTestCase):
+    def goods_data(self, characters):
+        return {
+            "name": "吧唧",
+            "ip_id": self.ip.id,
+            "character_ids": [character.id for character in characters],
+            "category_id": self.category.id,
+            "location": self.shelf.id,
+        }
+
+    def validate(self, data, queries):
+        serializer = GoodsDetailSerializer(data=data, context={"request": mock.Mock(user=self.user)})
+        with self.assertNumQueries(queries):
+            serializer.is_valid()
+        return serializer
+
+    def test_each_relation_is_validated_with_one_query(self):
+        # IP、角色、品类、位置各一条，与角色数量无关
+        characters = [self.firefly, self.sparkle] + [
+            Character.objects.create(ip=self.ip, name=f"角色{index}") for index in range(10)
+        ]
+        self.assertTrue(self.validate(self.goods_data(characters[:1]), 4).is_valid())
+        serializer = self.validate(self.goods_data(characters), 4)
+        self.assertEqual(serializer.validated_data["characters"], characters)
+
+    def test_all_missing_ids_are_reported_at_once(self):
+        data = self.goods_data([self.firefly])
+        data["character_ids"] += [99998, 99999]
+        serializer = self.validate(data, 4)
+        self.assertIn("99998, 99999", str(serializer.errors["character_ids"]))
+
+    def test_batch_validates_each_relation_once_per_request(self):
+        def batch(count):
+            operations = [
+                {"op": "create", "data": dict(self.goods_data([self.firefly]), name=f"吧唧{index}")}
+                for index in range(count)
+            ]
+            # 关联校验 4 条（IP、品类、位置、角色各一次 IN 查询），其余为指纹预查与批量写入
+            with self.assertNumQueries(12):
+                response = self.client.post("/api/goods/batch/", {"operations": operations}, format="json")
+            self.assertEqual(response.status_code, 200)
+            return response.data["created"]
+
+        self.assertEqual(batch(1), 1)
+        Goods.objects.all().delete()
+        self.assertEqual(batch(20), 20)
+
+
+class BatchTests(GoodsTestCase):
+    def batch(self, operations):
+        return self.client.post("/api/goods/batch/", {"operations": operations}, format="json")
+
+    def create_data(self, name):
+        return {
+            "name": name,
+            "ip_id": self.ip.id,
+            "character_ids": [self.firefly.id],
+            "category_id": self.category.id,
+        }
+
+    def test_delete_goods_in_showcase_is_rejected(self):
+        kept = self.create_goods("展柜中的吧唧")
+        free = self.create_goods("普通吧唧")
+        showcase = Showcase.objects.create(user=self.user, name="我的展柜")
+        ShowcaseGoods.objects.create(showcase=showcase, goods=kept)
+
+        response = self.batch(
+            [{"op": "delete", "id": str(kept.id)}, {"op": "delete", "id": str(free.id)}]
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.data["applied"])
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]], ["error", "skipped"]
+        )
+        self.assertIn("id", response.data["results"][0]["errors"])
+        self.assertEqual(Goods.objects.filter(id__in=[kept.id, free.id]).count(), 2)
+
+    def test_create_conflicting_with_concurrent_request_returns_existing(self):
+        # 模拟并发：预查指纹时尚不存在，落库时已被另一请求写入
+        existing = self.create_goods("并发吧唧")
+        lookup = GoodsBatchProcessor._existing_fingerprints
+        calls = []
+
+        def stale_first_lookup(processor, fingerprints):
+            calls.append(fingerprints)
+            return {} if len(calls) == 1 else lookup(processor, fingerprints)
+
+        with mock.patch.object(GoodsBatchProcessor, "_existing_fingerprints", stale_first_lookup):
+            response = self.batch(
+                [
+                    {"op": "create", "data": self.create_data("并发吧唧")},
+                    {"op": "create", "data": self.create_data("并发吧唧")},
+                    {"op": "create", "data": self.create_data("新吧唧")},
+                ]
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["applied"])
+        self.assertEqual(
+            [(result["status"], result["id"]) for result in response.data["results"][:2]],
+            [("duplicated", str(existing.id))] * 2,
+        )
+        self.assertEqual(response.data["results"][2]["status"], "created")
+        self.assertEqual((response.data["created"], response.data["duplicated"]), (1, 2))
+
+        created = Goods.objects.get(id=response.data["results"][2]["id"])
+        self.assertEqual(list(created.characters.all()), [self.firefly])
+        self.assertEqual(list(existing.characters.all()), [self.firefly])
+        self.assertEqual(Goods.objects.filter(user=self.user).count(), 2)
+
+
+class FingerprintHandOverTests(GoodsTestCase):
+    def create_duplicates(self):
+        holder = self.create_goods("吧唧", characters=[self.firefly])
+        older = self.create_goods("吧唧", characters=[self.firefly])
+        newer = self.create_goods("吧唧", characters=[self.firefly])
+        self.assertIsNotNone(holder.fingerprint)
+        self.assertEqual(Goods.objects.filter(fingerprint__isnull=True).count(), 2)
+        return holder, older, newer
+
+    def fingerprints(self, *goods_list):
+        return [Goods.objects.get(pk=goods.pk).fingerprint for goods in goods_list]
+
+    def test_delete_hands_fingerprint_to_oldest_duplicate(self):
+        holder, older, newer = self.create_duplicates()
+        fingerprint = holder.fingerprint
+        holder.delete()
+        self.assertEqual(self.fingerprints(older, newer), [fingerprint, None])
+
+    def test_edit_hands_fingerprint_to_oldest_duplicate(self):
+        holder, older, newer = self.create_duplicates()
+        fingerprint = holder.fingerprint
+        holder.name = "吧唧（改）"
+        holder.save()
+        self.assertEqual(self.fingerprints(older, newer), [fingerprint, None])
+        self.assertNotIn(holder.fingerprint, (None, fingerprint))
+
+    def test_batch_edit_hands_fingerprint_to_oldest_duplicate(self):
+        holder, older, newer = self.create_duplicates()
+        fingerprint = holder.fingerprint
+        response = self.client.post(
+            "/api/goods/batch/",
+            {"operations": [{"op": "update", "id": str(holder.id), "data": {"name": "吧唧（改）"}}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.fingerprints(older, newer), [fingerprint, None])
+
+
+class ImportTests(GoodsTestCase):
+    def import_jsonl(self, names):
+        lines = [
+            json.dumps(
+                {"name": name, "ip": self.ip.name, "characters": [self.firefly.name], "category": "周边/吧唧"},
+                ensure_ascii=False,
+            )
+            for name in names
+        ]
+        content = io.BytesIO("\n".join(lines).encode("utf-8"))
+        return GoodsImporter(self.user).run(content, "jsonl")
+
+    def test_duplicates_are_skipped(self):
+        self.create_goods("已有吧唧")
+        result = self.import_jsonl(["已有吧唧", "新吧唧", "新吧唧"])
+        self.assertEqual((result["created"], result["duplicated"], result["failed"]), (1, 2, 0))
+
+    def test_concurrent_duplicate_is_reported_instead_of_failing(self):
+        # 模拟并发：预查指纹时尚不存在，写入时已被另一请求写入
+        existing = self.create_goods("并发吧唧")
+        with mock.patch.object(GoodsImporter, "_existing_fingerprints", return_value=set()):
+            result = self.import_jsonl(["并发吧唧", "新吧唧"])
+        self.assertEqual((result["created"], result["duplicated"], result["failed"]), (1, 1, 0))
+        self.assertEqual(Goods.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(list(existing.characters.all()), [self.firefly])
+        created = Goods.objects.get(user=self.user, name="新吧唧")
+        self.assertEqual(list(created.characters.all()), [self.firefly])
+
+
+class CategoryTreeTests(GoodsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.role = Role.objects.get_or_create(name="Admin")[0]
+        self.user.save()
+        self.leaf = Category.objects.create(name="圆形", parent=self.category, path_name="周边/吧唧/圆形")
+
+    def patch(self, category, data):
+        return self.client.patch(f"/api/categories/{category.id}/", data, format="json")
+
+    def paths(self):
+        return dict(Category.objects.values_list("name", "path_name"))
+
+    def test_rename_rewrites_descendant_paths(self):
+        response = self.patch(self.category, {"name": "徽章"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.paths(), {"周边": "周边", "徽章": "周边/徽章", "圆形": "周边/徽章/圆形"}
+        )
+
+    def test_move_rewrites_descendant_paths(self):
+        other = Category.objects.create(name="纸片", path_name="纸片")
+        response = self.patch(self.category, {"parent": other.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.paths()["吧唧"], "纸片/吧唧")
+        self.assertEqual(self.paths()["圆形"], "纸片/吧唧/圆形")
+
+    def test_rename_node_without_path_rewrites_descendant_paths(self):
+        Category.objects.filter(pk=self.category_root.pk).update(path_name=None)
+        response = self.patch(self.category_root, {"name": "谷子"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.paths(), {"谷子": "谷子", "吧唧": "谷子/吧唧", "圆形": "谷子/吧唧/圆形"}
+        )
+
+    def test_move_under_descendant_is_rejected(self):
+        for parent in (self.category_root, self.leaf):
+            with self.subTest(parent=parent.name):
+                response = self.patch(self.category_root, {"parent": parent.id})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("parent", response.data)
+        self.assertIsNone(Category.objects.get(pk=self.category_root.pk).parent_id)
+
+    def test_delete_removes_whole_subtree(self):
+        other = Category.objects.create(name="纸片", path_name="纸片")
+        response = self.client.delete(f"/api/categories/{self.category_root.id}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(list(Category.objects.all()), [other])
+        self.assertEqual([category.name for category in catalogue.get_catalogue().categories], ["纸片"])
+
+    def test_delete_with_goods_in_subtree_is_rejected(self):
+        self.create_goods("吧唧", category=self.leaf)
+        response = self.client.delete(f"/api/categories/{self.category_root.id}/")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Category.objects.count(), 3)
+
+    def test_goods_added_during_delete_returns_conflict(self):
+        # 模拟并发：检查时尚无关联商品，删除时已有商品引用子树中的品类
+        self.create_goods("吧唧", category=self.leaf)
+        with mock.patch("apps.goods.views.category.count_in_subtree", return_value=0):
+            response = self.client.delete(f"/api/categories/{self.category_root.id}/")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Category.objects.count(), 3)
+
+
+class PublicCacheSignalTests(GoodsTestCase):
+    def test_only_payload_fields_invalidate_public_cache(self):
+        goods = self.create_goods("吧唧")
+        cases = [
+            (["order"], False),
+            (["updated_at"], False),
+            (["status", "updated_at"], True),
+            (["location"], True),
+            (None, True),
+        ]
+        for update_fields, invalidated in cases:
+            with self.subTest(update_fields=update_fields), mock.patch(
+                "apps.goods.signals.invalidate_goods_public_cache"
+            ) as invalidate:
+                goods.save(update_fields=update_fields)
+                self.assertEqual(invalidate.called, invalidated)
+
+
+class MediaRefCountTests(GoodsTestCase):
+    def upload_main_photo(self, goods, image):
+        response = self.client.post(
+            f"/api/goods/{goods.id}/upload-main-photo/", {"main_photo": image}, format="multipart"
+        )
+        self.assertEqual(response.status_code, 200)
+        goods.refresh_from_db()
+        return goods.main_photo.name
+
+    def ref_counts(self):
+        return dict(MediaBlob.objects.values_list("path", "ref_count"))
+
+    def test_reupload_same_main_photo_keeps_single_reference(self):
+        goods = self.create_goods("吧唧")
+        path = self.upload_main_photo(goods, self.image_file())
+        self.assertEqual(self.upload_main_photo(goods, self.image_file()), path)
+        self.assertEqual(self.ref_counts(), {path: 1})
+
+    def test_shared_image_is_counted_and_released(self):
+        first = self.create_goods("吧唧1")
+        second = self.create_goods("吧唧2")
+        path = self.upload_main_photo(first, self.image_file())
+        self.upload_main_photo(second, self.image_file())
+        self.assertEqual(self.ref_counts(), {path: 2})
+
+        other = self.upload_main_photo(second, self.image_file("blue"))
+        self.assertEqual(self.ref_counts(), {path: 1, other: 1})
+        first.delete()
+        self.assertEqual(self.ref_counts(), {other: 1})
+
+    def test_replace_additional_photo_with_same_image_keeps_single_reference(self):
+        goods = self.create_goods("吧唧")
+        url = f"/api/goods/{goods.id}/upload-additional-photos/"
+        response = self.client.post(url, {"additional_photos": [self.image_file()]}, format="multipart")
+        self.assertEqual(response.status_code, 200)
+        photo = GuziImage.objects.get(guzi=goods)
+
+        response = self.client.post(
+            url,
+            {"additional_photos": [self.image_file()], "photo_ids": [photo.id]},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.ref_counts(), {GuziImage.objects.get(pk=photo.pk).image.name: 1})
+
+    def test_additional_photos_are_compressed_outside_the_write_transaction(self):
+        goods = self.create_goods("吧唧")
+        depth = len(connection.atomic_blocks)
+        depths = []
+
+        def compress(files, max_size_kb=300):
+            depths.append(len(connection.atomic_blocks))
+            return compress_images(files, max_size_kb=max_size_kb)
+
+        with mock.patch("apps.goods.media_store.compress_images", compress):
+            response = self.client.post(
+                f"/api/goods/{goods.id}/upload-additional-photos/",
+                {"additional_photos": [self.image_file(), self.image_file("blue")]},
+                format="multipart",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(depths, [depth])
+        self.assertEqual(sorted(self.ref_counts().values()), [1, 1])
+
+
+class ShowcaseGoodsPageTests(GoodsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.showcase = Showcase.objects.create(user=self.user, name="我的展柜")
+        for index in range(5):
+            ShowcaseGoods.objects.create(
+                showcase=self.showcase, goods=self.create_goods(f"吧唧{index}"), order=index
+            )
+
+    def page(self, **params):
+        return self.client.get(f"/api/showcases/{self.showcase.id}/goods/", params)
+
+    def test_cursor_pages_cover_all_goods(self):
+        names = []
+        params = {"page_size": 2}
+        while True:
+            response = self.page(**params)
+            self.assertEqual(response.status_code, 200)
+            names += [item["goods"]["name"] for item in response.data["results"]]
+            if not response.data["next_cursor"]:
+                break
+            params["cursor"] = response.data["next_cursor"]
+        self.assertEqual(names, [f"吧唧{index}" for index in range(5)])
+
+    def test_malformed_cursor_is_rejected(self):
+        def encode(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+        cursors = [
+            "not-base64!",
+            encode({"order": 1}),
+            encode([1, "2024-01-01T00:00:00"]),
+            encode([1, "2024-01-01T00:00:00", 5]),
+            encode([True, "2024-01-01T00:00:00", str(uuid.uuid4())]),
+            encode([1, 20240101, str(uuid.uuid4())]),
+            encode([1, "2024-01-01T00:00:00", "not-a-uuid"]),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.page(cursor=cursor).status_code, 400)
+
+
+class ShowcaseBulkGoodsTests(GoodsTestCase):
+    def test_goods_added_concurrently_are_counted_as_skipped(self):
+        showcase = Showcase.objects.create(user=self.user, name="我的展柜")
+        first, second = self.create_goods("吧唧1"), self.create_goods("吧唧2")
+        bulk_create = ShowcaseGoods.objects.bulk_create
+
+        def concurrent_bulk_create(objs, **kwargs):
+            # 模拟并发：预查已有谷子之后、写入之前，另一请求已把 first 加入展柜
+            ShowcaseGoods.objects.create(showcase=showcase, goods=first, order=0)
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(ShowcaseGoods.objects, "bulk_create", concurrent_bulk_create):
+            response = self.client.post(
+                f"/api/showcases/{showcase.id}/bulk-add-goods/",
+                {"goods_ids": [str(first.id), str(second.id)]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"added": 1, "skipped": 1})
+        self.assertEqual(showcase.showcase_goods.count(), 2)
+
+
+class NameIndexMigrationTests(GoodsTestCase):
+    def test_migration_backfills_existing_names(self):
+        from django.db.migrations.loader import MigrationLoader
+
+        migration = importlib.import_module("apps.goods.migrations.0027_name_index")
+        NameIndex.objects.all().delete()
+        self.assertEqual(autocomplete("xqtd"), [])
+
+        state = MigrationLoader(connection).project_state(("goods", "0027_name_index"))
+        migration.backfill_name_index(state.apps, None)
+        self.assertEqual(NameIndex.objects.count(), 3)
+        self.assertEqual(autocomplete("xqtd")[0]["name"], "崩坏：星穹铁道")
+        self.assertEqual(autocomplete("liuying", types=["character"])[0]["id"], self.firefly.id)
+
+
+class ChunkedUploadTests(GoodsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.mkdtemp(prefix="shigu-test-uploads-")
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        patcher = mock.patch.object(upload_service, "UPLOAD_TEMP_DIR", self.temp_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, content):
+        """登记会话并分两片上传完整内容，返回会话ID"""
+        response = self.client.post(
+            "/api/uploads/", {"file_name": "photo.png", "total_size": len(content)}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        session_id = response.data["id"]
+        middle = len(content) // 2
+        for start, end in ((0, middle), (middle, len(content))):
+            response = self.client.put(
+                f"/api/uploads/{session_id}/",
+                content[start:end],
+                content_type="application/octet-stream",
+                HTTP_CONTENT_RANGE=f"bytes {start}-{end - 1}/{len(content)}",
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["complete"])
+        return session_id
+
+    def finalize(self, session_id, goods):
+        return self.client.post(
+            f"/api/uploads/{session_id}/finalize/",
+            {"target": "goods_additional_photo", "goods_id": str(goods.id)},
+            format="json",
+        )
+
+    def test_finalize_attaches_image_once(self):
+        goods = self.create_goods("吧唧")
+        session_id = self.upload(self.image_file().read())
+
+        response = self.finalize(session_id, goods)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["additional_photos"]), 1)
+        self.assertFalse(UploadSession.objects.filter(pk=session_id).exists())
+        self.assertEqual(self.finalize(session_id, goods).status_code, 404)
+
+    def test_concurrent_finalize_is_rejected(self):
+        session = UploadSession.objects.get(pk=self.upload(self.image_file().read()))
+        inner = mock.Mock()
+
+        def handler(upload):
+            # 模拟并发：第一个 finalize 尚未完成时，另一个请求对同一会话调用 finalize
+            with self.assertRaises(upload_service.UploadError) as raised:
+                upload_service.finalize(session, inner)
+            self.assertEqual(raised.exception.status, 410)
+            return "done"
+
+        self.assertEqual(upload_service.finalize(session, handler), "done")
+        inner.assert_not_called()
+
+    def test_failed_finalize_keeps_session_for_retry(self):
+        goods = self.create_goods("吧唧")
+        session_id = self.upload(b"not an image")
+        self.assertEqual(self.finalize(session_id, goods).status_code, 400)
+        self.assertTrue(UploadSession.objects.filter(pk=session_id).exists())
+
+    def test_purge_removes_expired_sessions_of_all_users(self):
+        expired = timezone.now() - upload_service.UPLOAD_SESSION_TTL - datetime.timedelta(minutes=1)
+        sessions = [
+            upload_service.create_session(user, "photo.png", 10)
+            for user in (self.user, self.other_user)
+        ]
+        fresh = upload_service.create_session(self.user, "photo.png", 10)
+        UploadSession.objects.filter(pk__in=[s.pk for s in sessions]).update(created_at=expired)
+
+        self.assertEqual(upload_service.purge_expired(), 2)
+        self.assertEqual(list(UploadSession.objects.values_list("pk", flat=True)), [fresh.pk])
+        self.assertEqual(os.listdir(self.temp_dir), [f"{fresh.pk}.part"])
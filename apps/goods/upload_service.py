@@ -0,0 +1,245 @@
+"""
+分片（可续传）上传服务模块
+协议：init（登记文件大小）→ 按偏移量 PUT 分片 → finalize（交给压缩 / 存储流程）
+
+- 分片直接流式写入同一个临时文件的对应偏移处，不整块读入内存，也无需最后再拼接
+- 网络中断后查询会话的 received_size，从该位置继续上传即可
+- finalize 时临时文件以 UploadedFile 形式交给 media_store.store_image，
+  无需压缩时本地存储会直接移动临时文件而非复制；同一会话并发 finalize 时只有一个请求生效
+- 过期会话在用户新建会话时顺带清理，全局清理由 purge_upload_sessions 命令定期执行
+"""
+import datetime
+import os
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from .models import UploadSession
+
+# 临时分片文件目录（多进程部署时需为同一主机共享的目录）
+UPLOAD_TEMP_DIR = getattr(
+    settings,
+    "CHUNKED_UPLOAD_DIR",
+    os.path.join(tempfile.gettempdir(), "shigu-uploads"),
+)
+# 建议的分片大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# 单个分片允许的最大大小
+UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024
+# 单个文件允许的最大大小
+UPLOAD_MAX_FILE_SIZE = 50 * 1024 * 1024
+# 会话过期时间：超过该时间未完成的会话会被清理
+UPLOAD_SESSION_TTL = datetime.timedelta(hours=24)
+# 从请求体读取数据的块大小
+STREAM_READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """分片上传协议错误，status 为建议的 HTTP 状态码"""
+
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+def temp_path(session):
+    return os.path.join(UPLOAD_TEMP_DIR, f"{session.pk}.part")
+
+
+def _remove_temp(session):
+    try:
+        os.remove(temp_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def create_session(user, file_name, total_size):
+    """登记上传会话并预先创建临时文件；顺带清理该用户已过期的会话"""
+    purge_expired(user)
+    session = UploadSession.objects.create(
+        user=user,
+        file_name=os.path.basename(file_name)[:255],
+        total_size=total_size,
+    )
+    os.makedirs(UPLOAD_TEMP_DIR, exist_ok=True)
+    with open(temp_path(session), "wb"):
+        pass
+    return session
+
+
+def purge_expired(user=None, batch_size=500):
+    """
+    删除过期未完成的会话及其临时文件，返回删除的会话数。
+    不指定 user 时清理全部用户，并删除临时目录中没有对应会话的过期临时文件。
+    """
+    cutoff = timezone.now() - UPLOAD_SESSION_TTL
+    expired = UploadSession.objects.filter(created_at__lt=cutoff)
+    if user is not None:
+        expired = expired.filter(user=user)
+
+    total = 0
+    while True:
+        sessions = list(expired.order_by("pk")[:batch_size])
+        if not sessions:
+            break
+        for session in sessions:
+            _remove_temp(session)
+        total += UploadSession.objects.filter(pk__in=[s.pk for s in sessions]).delete()[0]
+
+    if user is None:
+        _remove_stray_temps(cutoff)
+    return total
+
+
+def _remove_stray_temps(cutoff, batch_size=500):
+    """删除修改时间早于 cutoff、且没有对应会话的临时文件（如删除会话后未能删除的文件）"""
+    try:
+        names = os.listdir(UPLOAD_TEMP_DIR)
+    except FileNotFoundError:
+        return
+    stale = {}  # 会话ID -> 临时文件路径
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        path = os.path.join(UPLOAD_TEMP_DIR, name)
+        try:
+            if ext != ".part" or os.path.getmtime(path) >= cutoff.timestamp():
+                continue
+            stale[uuid.UUID(stem)] = path
+        except (FileNotFoundError, ValueError):
+            continue
+
+    ids = list(stale)
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        alive = set(UploadSession.objects.filter(pk__in=chunk).values_list("pk", flat=True))
+        for session_id in chunk:
+            if session_id not in alive:
+                try:
+                    os.remove(stale[session_id])
+                except FileNotFoundError:
+                    pass
+
+
+def parse_content_range(header, total_size):
+    """
+    解析 Content-Range: bytes <start>-<end>/<total>，返回 (start, length)。
+    """
+    try:
+        unit, _, spec = header.strip().partition(" ")
+        byte_range, _, total = spec.partition("/")
+        start_text, _, end_text = byte_range.partition("-")
+        start, end = int(start_text), int(end_text)
+    except ValueError:
+        raise UploadError("Content-Range 格式错误，应为 bytes <start>-<end>/<total>")
+    if unit != "bytes" or end < start:
+        raise UploadError("Content-Range 格式错误，应为 bytes <start>-<end>/<total>")
+    if total not in ("*", str(total_size)):
+        raise UploadError("Content-Range 中的文件总大小与会话不一致")
+    return start, end - start + 1
+
+
+def write_chunk(session, stream, offset, length):
+    """
+    将请求体流式写入临时文件的 offset 处，返回更新后的 received_size。
+
+    只接受从已接收位置（或之前的位置，用于重试）开始的分片，保证文件从头起连续。
+    """
+    if length <= 0:
+        raise UploadError("分片不能为空")
+    if length > UPLOAD_MAX_CHUNK_SIZE:
+        raise UploadError(f"单个分片不能超过 {UPLOAD_MAX_CHUNK_SIZE} 字节")
+    if offset > session.received_size:
+        raise UploadError(
+            f"分片不连续，请从 {session.received_size} 处继续上传",
+            status=409,
+        )
+    if offset + length > session.total_size:
+        raise UploadError("分片超出文件总大小")
+
+    path = temp_path(session)
+    if not os.path.exists(path):
+        raise UploadError("上传会话已失效，请重新开始", status=410)
+
+    written = 0
+    with open(path, "r+b") as fp:
+        fp.seek(offset)
+        while written < length:
+            data = stream.read(min(STREAM_READ_SIZE, length - written))
+            if not data:
+                break
+            fp.write(data)
+            written += len(data)
+    if written != length:
+        raise UploadError("分片数据不完整，请重试该分片")
+
+    received = max(session.received_size, offset + written)
+    UploadSession.objects.filter(pk=session.pk).update(
+        received_size=received,
+        updated_at=timezone.now(),
+    )
+    session.received_size = received
+    return received
+
+
+class _AssembledFile(UploadedFile):
+    """
+    指向已拼好的临时文件的 UploadedFile。
+    提供 temporary_file_path，使本地存储保存时直接移动文件而不是复制。
+    """
+
+    def __init__(self, path, name, size):
+        super().__init__(open(path, "rb"), name=name, size=size)
+        self._path = path
+
+    def temporary_file_path(self):
+        return self._path
+
+
+def finalize(session, handler):
+    """
+    校验分片已全部到达且为有效图片，将组装好的文件交给 handler(file) 处理，
+    完成后删除会话与临时文件，返回 handler 的返回值。
+
+    整个过程在一个事务中执行，并以删除会话行认领该会话：同一会话并发的另一个 finalize
+    会等待本事务结束，随后取不到会话而返回 410，不会重复挂载图片；
+    校验或 handler 失败时事务回滚，会话保留，可修正后重试。
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().filter(pk=session.pk).first()
+        if session is None or not UploadSession.objects.filter(pk=session.pk).delete()[0]:
+            raise UploadError("上传会话已完成或已失效", status=410)
+
+        if not session.is_complete:
+            raise UploadError(
+                f"文件尚未上传完整（{session.received_size}/{session.total_size}）",
+                status=409,
+            )
+        path = temp_path(session)
+        if not os.path.exists(path):
+            raise UploadError("上传会话已失效，请重新开始", status=410)
+
+        try:
+            with Image.open(path) as image:
+                image.verify()
+        except Exception:  # noqa: BLE001
+            raise UploadError("文件不是有效的图片")
+
+        upload = _AssembledFile(path, session.file_name, session.total_size)
+        try:
+            result = handler(upload)
+        finally:
+            upload.close()
+        transaction.on_commit(lambda: _remove_temp(session))
+    return result
+
+
+def abort(session):
+    """放弃上传：删除会话与临时文件"""
+    _remove_temp(session)
+    session.delete()
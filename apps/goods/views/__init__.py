@@ -8,12 +8,14 @@ from .character import CharacterViewSet
 from .category import CategoryViewSet
 from .theme import ThemeViewSet
 from .showcase import ShowcaseViewSet
+from .upload import ChunkedUploadViewSet
 from .bgm import (
     bgm_create_characters,
     bgm_search_characters,
     bgm_search_subjects,
     bgm_get_characters_by_subject_id,
 )
+from .search import name_autocomplete
 
 __all__ = [
     "GoodsViewSet",
@@ -24,8 +26,10 @@ __all__ = [
     "CategoryViewSet",
     "ThemeViewSet",
     "ShowcaseViewSet",
+    "ChunkedUploadViewSet",
     "bgm_search_characters",
     "bgm_create_characters",
     "bgm_search_subjects",
     "bgm_get_characters_by_subject_id",
+    "name_autocomplete",
 ]
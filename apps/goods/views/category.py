@@ -1,27 +1,34 @@
 """
 品类（Category）相关的视图
 """
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import ProtectedError
+from django.db.models import Count
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters as drf_filters, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied
 from rest_framework.response import Response
 
 from ..models import Category, Goods
+from ..ordering_service import bulk_update_order
 from ..serializers import (
     CategoryBatchUpdateOrderSerializer,
     CategoryDetailSerializer,
     CategorySimpleSerializer,
     CategoryTreeSerializer,
+    CategoryTreeWithCountsSerializer,
 )
-from core.permissions import IsAdminOrReadOnly
+from core.permissions import IsAdminOrReadOnly, is_admin
+from core.tree import count_in_subtree, rollup, subtree_ids
+from .mixins import CatalogueListMixin
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CatalogueListMixin, viewsets.ModelViewSet):
     """
     品类CRUD接口，支持树形结构。
 
-    - list: 获取所有品类列表（支持按父节点过滤）
+    - list: 获取所有品类列表（支持按父节点过滤；不带过滤 / 搜索参数时直接读取进程内目录缓存）
     - retrieve: 获取单个品类详情
     - create: 创建新品类（支持树形结构）
     - update: 更新品类
@@ -39,6 +46,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
         "parent": ["exact", "isnull"],
     }
     permission_classes = [IsAdminOrReadOnly]
+    catalogue_attr = "categories"
     
     def get_queryset(self):
         """优化查询，预加载父节点和子节点"""
@@ -52,17 +60,6 @@ class CategoryViewSet(viewsets.ModelViewSet):
             return CategoryTreeSerializer
         return CategorySimpleSerializer
     
-    def get_all_descendants(self, category):
-        """
-        递归获取品类的所有后代节点（包括子节点、子节点的子节点等）
-        返回包含该节点及其所有后代的列表
-        """
-        descendants = [category]
-        children = category.children.all()
-        for child in children:
-            descendants.extend(self.get_all_descendants(child))
-        return descendants
-    
     @action(detail=False, methods=["get"], url_path="tree")
     def tree(self, request):
         """
@@ -70,9 +67,59 @@ class CategoryViewSet(viewsets.ModelViewSet):
         URL: /api/categories/tree/
         
         返回所有节点的扁平列表（带 parent），前端在内存中组装为树。
+        
+        查询参数：
+        - with_counts=1：每个品类附带 goods_count（直接归属该品类的谷子数）
+          与 subtree_goods_count（含所有子品类的累计谷子数）
+        - scope=me（默认）：只统计当前用户的谷子；scope=all：统计全部用户（仅管理员）
+        
+        统计只需一条按品类分组的查询，子树累计在内存中沿树向上汇总；
+        不带过滤 / 搜索参数时品类列表直接读取进程内目录缓存。
         """
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
+        categories = self.catalogue_list()
+        if categories is None:
+            categories = list(self.filter_queryset(self.get_queryset()).prefetch_related(None))
+        with_counts = request.query_params.get("with_counts", "").lower() in ("1", "true")
+        if not with_counts:
+            serializer = self.get_serializer(categories, many=True)
+            return Response(serializer.data)
+        
+        scope = request.query_params.get("scope", "me").lower()
+        if scope not in ("me", "all"):
+            return Response(
+                {"detail": "scope 只能为 me 或 all"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        user = request.user
+        if not getattr(user, "id", None):
+            raise NotAuthenticated()
+        goods_qs = Goods.objects.all()
+        if scope == "all":
+            if not is_admin(user):
+                raise PermissionDenied("只有管理员可以统计全部用户的谷子")
+        else:
+            goods_qs = goods_qs.filter(user=user)
+        
+        direct = {
+            row["category_id"]: row
+            for row in goods_qs.order_by().values("category_id").annotate(goods_count=Count("id"))
+        }
+        subtree = rollup(
+            [(category.id, category.parent_id) for category in categories],
+            direct,
+            {"goods_count": 0},
+        )
+        counts = {
+            category.id: {
+                "goods_count": direct.get(category.id, {}).get("goods_count", 0),
+                "subtree_goods_count": subtree[category.id]["goods_count"],
+            }
+            for category in categories
+        }
+        
+        context = self.get_serializer_context()
+        context["counts"] = counts
+        serializer = CategoryTreeWithCountsSerializer(categories, many=True, context=context)
         return Response(serializer.data)
     
     @action(detail=False, methods=["post"], url_path="batch-update-order")
@@ -89,74 +136,53 @@ class CategoryViewSet(viewsets.ModelViewSet):
         
         items = serializer.validated_data['items']
         
-        # 验证所有品类ID是否存在
-        category_ids = [item['id'] for item in items]
-        existing_categories = Category.objects.filter(id__in=category_ids)
-        existing_ids = set(existing_categories.values_list('id', flat=True))
-        
-        missing_ids = set(category_ids) - existing_ids
-        if missing_ids:
-            return Response(
-                {"detail": f"以下品类ID不存在: {sorted(missing_ids)}"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-        
-        # 批量更新排序值（使用事务保证原子性）
+        # 一次查询取出并校验，一次 bulk_update 写回，直接用内存中的对象返回
         try:
-            with transaction.atomic():
-                # 创建字典以便快速查找
-                category_dict = {cat.id: cat for cat in existing_categories}
-                
-                # 更新每个品类的order值
-                updated_categories = []
-                for item in items:
-                    category = category_dict[item['id']]
-                    category.order = item['order']
-                    category.save(update_fields=['order'])
-                    updated_categories.append(category)
-                
-                # 返回更新后的品类列表（按新的order排序）
-                updated_ids = [cat.id for cat in updated_categories]
-                result_categories = Category.objects.filter(id__in=updated_ids).order_by('order', 'id')
-                result_serializer = CategorySimpleSerializer(result_categories, many=True)
-                
-                return Response({
-                    "detail": f"成功更新 {len(updated_categories)} 个品类的排序",
-                    "updated_count": len(updated_categories),
-                    "categories": result_serializer.data
-                }, status=status.HTTP_200_OK)
-                
+            result_categories, missing_ids = bulk_update_order(Category.objects.all(), items)
         except Exception as e:
             return Response(
                 {"detail": f"更新排序失败: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
+        if missing_ids:
+            return Response(
+                {"detail": f"以下品类ID不存在: {missing_ids}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        
+        result_serializer = CategorySimpleSerializer(result_categories, many=True)
+        return Response({
+            "detail": f"成功更新 {len(items)} 个品类的排序",
+            "updated_count": len(items),
+            "categories": result_serializer.data
+        }, status=status.HTTP_200_OK)
     
     def destroy(self, request, *args, **kwargs):
         """
-        删除品类时：
-        1. 递归获取所有子节点（包括子节点的子节点）
-        2. 检查是否有商品关联到这些品类（包括子节点）
-        3. 如果有商品关联，返回错误
-        4. 删除根节点（由于 CASCADE，删除父节点会自动删除所有子节点）
+        删除品类时（整棵子树以 WITH RECURSIVE 子查询内联）：
+        1. 在事务内锁定子树中的品类，并发新建的商品引用这些品类时需等待本事务结束
+        2. 统计整棵子树（包括子节点的子节点）下关联的商品数，如果有商品关联，返回错误
+        3. 通过 queryset.delete() 删除整棵子树（走删除收集器与信号，商品引用为 PROTECT）
+        锁不生效的数据库（如 SQLite）上，检查之后并发写入的关联商品由外键约束拦截，返回 409
         """
         instance = self.get_object()
+        subtree = subtree_ids(Category, instance.pk)
         
-        # 获取所有要删除的节点（包括当前节点及其所有后代）
-        nodes_to_delete = self.get_all_descendants(instance)
-        node_ids = [node.id for node in nodes_to_delete]
-        
-        # 检查是否有商品关联到这些品类
-        goods_count = Goods.objects.filter(category_id__in=node_ids).count()
-        if goods_count > 0:
+        try:
+            with transaction.atomic():
+                list(Category.objects.select_for_update().filter(id__in=subtree).values_list("id"))
+                # 检查是否有商品关联到这些品类
+                goods_count = count_in_subtree(Goods.objects.all(), "category_id", Category, instance.pk)
+                if goods_count > 0:
+                    return Response(
+                        {"detail": f"无法删除：有 {goods_count} 个商品关联到此品类或其子品类，请先解除关联"},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                Category.objects.filter(id__in=subtree).delete()
+        except (ProtectedError, IntegrityError):
             return Response(
-                {"detail": f"无法删除：有 {goods_count} 个商品关联到此品类或其子品类，请先解除关联"},
-                status=status.HTTP_400_BAD_REQUEST,
+                {"detail": "删除期间有商品关联到此品类或其子品类，请刷新后重试"},
+                status=status.HTTP_409_CONFLICT,
             )
         
-        # 删除根节点（由于 parent 字段使用了 on_delete=models.CASCADE，
-        # 删除父节点时，Django 会自动删除所有子节点）
-        with transaction.atomic():
-            instance.delete()
-        
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -7,13 +7,14 @@ from rest_framework import filters as drf_filters, viewsets
 from ..models import Character
 from ..serializers import CharacterSimpleSerializer
 from core.permissions import IsAdminOrReadOnly
+from .mixins import CatalogueListMixin
 
 
-class CharacterViewSet(viewsets.ModelViewSet):
+class CharacterViewSet(CatalogueListMixin, viewsets.ModelViewSet):
     """
     角色CRUD接口。
 
-    - list: 获取所有角色列表，支持按IP过滤
+    - list: 获取所有角色列表，支持按IP过滤（不带过滤 / 搜索参数时直接读取进程内目录缓存）
     - retrieve: 获取单个角色详情
     - create: 创建新角色
     - update: 更新角色
@@ -29,4 +30,5 @@ class CharacterViewSet(viewsets.ModelViewSet):
         "ip": ["exact"],
         "name": ["exact", "icontains"],
     }
-    permission_classes = [IsAdminOrReadOnly]
\ No newline at end of file
+    permission_classes = [IsAdminOrReadOnly]
+    catalogue_attr = "characters"
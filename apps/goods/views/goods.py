@@ -1,10 +1,12 @@
 """
 谷子（Goods）相关的视图和过滤器
 """
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.db.models import Count, DateField, DecimalField, ExpressionWrapper, F, Min, Q, Sum, Value
 from django.db.models.functions import Cast, Coalesce, TruncDate, TruncMonth, TruncWeek
 from django.db import connection
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django_filters import (
     BaseInFilter,
     BooleanFilter,
@@ -21,18 +23,34 @@ from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.throttling import ScopedRateThrottle
 
+import csv
 import datetime
 from decimal import Decimal
 
+from ..batch_service import BATCH_MAX_OPERATIONS, GoodsBatchProcessor
+from ..export_service import (
+    EXPORT_FORMAT_CSV,
+    EXPORT_FORMAT_JSONL,
+    EXPORT_FORMATS,
+    iter_csv,
+    iter_jsonl,
+    iter_zip,
+)
+from ..facet_service import InvalidFacet, compute_facets, parse_facets, parse_limit
+from ..import_service import IMPORT_FORMATS, GoodsImporter, detect_format
 from ..models import Category, Character, Goods, GuziImage
 from apps.location.models import StorageNode
 from ..serializers import (
+    GoodsBulkLocationSerializer,
+    GoodsBulkStatusSerializer,
     GoodsDetailSerializer,
     GoodsListSerializer,
     GoodsMoveSerializer,
 )
-from ..utils import compress_image
+from ..media_store import prepare_images, store_image, store_prepared
+from ..showcase_service import invalidate_public_cache, public_showcase_ids_for_goods
 from core.permissions import IsOwnerOnly, is_admin
+from core.tree import subtree_ids
 
 
 class GoodsPagination(PageNumberPagination):
@@ -107,40 +125,6 @@ class GoodsFilter(FilterSet):
         model = Goods
         fields = ["ip", "category", "location", "theme", "status", "status__in", "is_official", "character"]
 
-    def _get_category_descendant_ids(self, category: Category) -> list[int]:
-        """
-        获取指定品类的所有后代品类ID（包含自身）。
-        由于品类层级通常不深，这里用递归即可。
-        """
-        ids: list[int] = []
-
-        def dfs(node: Category):
-            ids.append(node.id)
-            for child in node.children.all():
-                dfs(child)
-
-        # 预加载 children，避免递归过程中 N+1
-        category = Category.objects.prefetch_related("children").get(pk=category.pk)
-        dfs(category)
-        return ids
-
-    def _get_location_descendant_ids(self, node: StorageNode) -> list[int]:
-        """
-        获取指定物理位置节点的所有后代节点 ID（包含自身）。
-        与品类类似，同样采用自关联树结构。
-        """
-        ids: list[int] = []
-
-        def dfs(n: StorageNode):
-            ids.append(n.id)
-            for child in n.children.all():
-                dfs(child)
-
-        # 预加载 children，避免递归过程中 N+1
-        node = StorageNode.objects.prefetch_related("children").get(pk=node.pk)
-        dfs(node)
-        return ids
-
     def filter_category_tree(self, queryset, name, value):
         """
         树形品类筛选：
@@ -148,13 +132,8 @@ class GoodsFilter(FilterSet):
         """
         if not value:
             return queryset
-        try:
-            category = Category.objects.get(pk=value)
-        except Category.DoesNotExist:
-            return queryset.none()
-
-        ids = self._get_category_descendant_ids(category)
-        return queryset.filter(category_id__in=ids)
+        # 子树 ID 以 WITH RECURSIVE 子查询内联到谷子查询中；品类不存在时子树为空，结果自然为空
+        return queryset.filter(category_id__in=subtree_ids(Category, int(value)))
 
     def filter_location_tree(self, queryset, name, value):
         """
@@ -163,17 +142,13 @@ class GoodsFilter(FilterSet):
         """
         if not value:
             return queryset
-        try:
-            node_qs = StorageNode.objects.all()
-            req_user = getattr(self, "request", None) and getattr(self.request, "user", None)
-            if req_user is not None and not is_admin(req_user):
-                node_qs = node_qs.filter(user=req_user)
-            node = node_qs.get(pk=value)
-        except StorageNode.DoesNotExist:
-            return queryset.none()
+        node_qs = StorageNode.objects.filter(pk=value)
+        req_user = getattr(self, "request", None) and getattr(self.request, "user", None)
+        if req_user is not None and not is_admin(req_user):
+            node_qs = node_qs.filter(user=req_user)
 
-        ids = self._get_location_descendant_ids(node)
-        return queryset.filter(location_id__in=ids)
+        # 根节点需属于当前用户；整棵子树以 WITH RECURSIVE 子查询内联到谷子查询中
+        return queryset.filter(location_id__in=subtree_ids(StorageNode, node_qs.values("id")))
 
 
 class GoodsViewSet(viewsets.ModelViewSet):
@@ -186,8 +161,8 @@ class GoodsViewSet(viewsets.ModelViewSet):
 
     queryset = (
         Goods.objects.all()
-        .select_related("ip", "category", "location", "theme")
-        .prefetch_related("characters__ip", "additional_photos")
+        .select_related("location", "theme")
+        .prefetch_related("characters", "additional_photos")
     )
     permission_classes = [IsOwnerOnly]
 
@@ -229,12 +204,13 @@ class GoodsViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """
-        使用 select_related / prefetch_related 彻底解决 N+1 查询问题。
+        使用 select_related / prefetch_related 彻底解决 N+1 查询问题；
+        IP、品类以及角色所属 IP 由序列化器从进程内目录缓存读取，无需关联查询。
         """
         qs = (
             Goods.objects.all()
-            .select_related("ip", "category", "location", "theme")
-            .prefetch_related("characters__ip", "additional_photos")
+            .select_related("location", "theme")
+            .prefetch_related("characters", "additional_photos")
         )
         user = getattr(self.request, "user", None)
         if not user or not getattr(user, "id", None):
@@ -243,55 +219,56 @@ class GoodsViewSet(viewsets.ModelViewSet):
             return qs
         return qs.filter(user=user)
 
+    def list(self, request, *args, **kwargs):
+        """
+        列表接口；传入 ?facets=ip,status,... 时，在当前过滤 / 搜索条件下附带各维度的取值计数：
+        {"count": ..., "results": [...], "facets": {"ip": [{"value", "label", "count"}, ...]}}
+        每个维度最多返回 ?facet_limit= 个取值（默认 10，最大 50）。
+        """
+        facet_param = request.query_params.get("facets")
+        if not facet_param:
+            return super().list(request, *args, **kwargs)
+
+        try:
+            facet_names = parse_facets(facet_param)
+        except InvalidFacet as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = super().list(request, *args, **kwargs)
+        response.data["facets"] = compute_facets(
+            self.filter_queryset(self.get_queryset()),
+            facet_names,
+            parse_limit(request.query_params.get("facet_limit")),
+        )
+        return response
+
     def perform_create(self, serializer):
         """
         简单幂等性：避免重复录入完全相同的谷子。
 
         规则示例（可按业务后续调整）：
         - 同一 IP + 相同角色集合（顺序无关） + 名称 + 入手日期 + 单价 认为是同一条资产。
+
+        规则固化为 Goods.fingerprint，与 user 组成唯一约束：
+        去重只需一次索引查询，并发重复提交由数据库唯一约束兜底。
         """
 
         validated = serializer.validated_data
         ip = validated.get("ip")
         characters = validated.get("characters", [])
-        name = validated.get("name")
-        purchase_date = validated.get("purchase_date")
-        price = validated.get("price")
         user = self.request.user
 
-        # 构建查询条件
-        query = Goods.objects.filter(
-            user=user,
-            ip=ip,
-            name=name,
-            purchase_date=purchase_date,
-            price=price,
+        fingerprint = Goods.build_fingerprint(
+            ip.id if ip else None,
+            validated.get("name"),
+            validated.get("purchase_date"),
+            validated.get("price"),
+            [c.id for c in characters],
         )
-
-        # 如果有角色数据，检查角色集合是否相同
-        if characters:
-            # 将角色ID列表排序后转为元组，用于比较
-            character_ids = sorted([c.id for c in characters])
-            # 过滤出角色数量相同的谷子
-            query = query.annotate(character_count=Count("characters")).filter(
-                character_count=len(character_ids)
-            )
-
-            # 遍历查询结果，检查角色集合是否完全相同
-            for candidate in query.prefetch_related("characters"):
-                candidate_ids = sorted([c.id for c in candidate.characters.all()])
-                if candidate_ids == character_ids:
-                    # 找到了完全匹配的实例
-                    serializer.instance = candidate
-                    return
-        else:
-            # 没有角色数据时，检查是否有完全相同的记录（不含角色）
-            if query.exists():
-                # 如果存在完全相同的记录（包括角色也为空），返回该实例
-                candidate = query.first()
-                if candidate.characters.count() == 0:
-                    serializer.instance = candidate
-                    return
+        existing = Goods.objects.filter(user=user, fingerprint=fingerprint).first()
+        if existing is not None:
+            serializer.instance = existing
+            return
 
         # 为新建的谷子分配稀疏的 order：当前最小值 - ORDER_STEP，让新建的谷子排在最前面
         min_order = (
@@ -300,7 +277,15 @@ class GoodsViewSet(viewsets.ModelViewSet):
             .get("min_order")
         )
         next_order = (min_order or 0) - self.ORDER_STEP
-        serializer.save(user=user, order=next_order)
+        try:
+            with transaction.atomic():
+                serializer.save(user=user, order=next_order, fingerprint=fingerprint)
+        except IntegrityError:
+            # 并发提交了相同的谷子：唯一约束冲突，返回已存在的那一条
+            existing = Goods.objects.filter(user=user, fingerprint=fingerprint).first()
+            if existing is None:
+                raise
+            serializer.instance = existing
 
     @action(detail=True, methods=["post"], url_path="move")
     def move(self, request, pk=None):
@@ -496,8 +481,9 @@ class GoodsViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        compressed = compress_image(main_photo, max_size_kb=300)
-        instance.main_photo = compressed or main_photo
+        instance.main_photo = store_image(
+            main_photo, max_size_kb=300, current=instance.main_photo.name
+        )
         instance.save(update_fields=["main_photo", "updated_at"])
 
         serializer = GoodsDetailSerializer(
@@ -571,37 +557,49 @@ class GoodsViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         # 情况2：创建新图片或同时更新图片和 label
-        updated_images = []
-        for idx, photo in enumerate(additional_photos):
-            compressed = compress_image(photo, max_size_kb=300)
-            image_file = compressed or photo
-            
-            # 如果提供了 photo_id，则更新；否则创建新图片
-            if photo_ids and idx < len(photo_ids):
-                try:
-                    photo_id = int(photo_ids[idx])
-                    guzi_image = GuziImage.objects.get(id=photo_id, guzi=instance)
-                    # 更新图片和标签
-                    guzi_image.image = image_file
-                    if label:
-                        guzi_image.label = label
-                    else:
-                        guzi_image.label = None
+        # 先确认要替换的图片都存在，再统一压缩存储，避免中途失败留下无主的图片引用
+        replace_ids = []
+        for photo_id_str in photo_ids:
+            try:
+                replace_ids.append(int(photo_id_str))
+            except ValueError:
+                return Response(
+                    {"detail": f"图片 ID {photo_id_str} 不存在或不属于该谷子"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        existing = {
+            image.id: image
+            for image in GuziImage.objects.filter(id__in=replace_ids, guzi=instance)
+        }
+        for photo_id in replace_ids:
+            if photo_id not in existing:
+                return Response(
+                    {"detail": f"图片 ID {photo_id} 不存在或不属于该谷子"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        # 多张图片在进程池中并行压缩并写入存储（事务外），事务内只占用引用并写入图片记录，
+        # 新图片一次 bulk_create 写入
+        prepared = prepare_images(additional_photos, max_size_kb=300)
+        new_images = []
+        with transaction.atomic():
+            currents = [existing[photo_id].image.name for photo_id in replace_ids]
+            image_names = store_prepared(prepared, currents=currents)
+            for idx, image_name in enumerate(image_names):
+                if idx < len(replace_ids):
+                    guzi_image = existing[replace_ids[idx]]
+                    guzi_image.image = image_name
+                    guzi_image.label = label if label else None
                     guzi_image.save()
-                    updated_images.append(guzi_image)
-                except (GuziImage.DoesNotExist, ValueError):
-                    return Response(
-                        {"detail": f"图片 ID {photo_ids[idx]} 不存在或不属于该谷子"},
-                        status=status.HTTP_400_BAD_REQUEST,
+                else:
+                    new_images.append(
+                        GuziImage(
+                            guzi=instance,
+                            image=image_name,
+                            label=label if label else None,
+                        )
                     )
-            else:
-                # 创建新图片
-                guzi_image = GuziImage.objects.create(
-                    guzi=instance,
-                    image=image_file,
-                    label=label if label else None,
-                )
-                updated_images.append(guzi_image)
+            GuziImage.objects.bulk_create(new_images)
 
         # 更新谷子的 updated_at 时间戳
         instance.save(update_fields=["updated_at"])
@@ -945,3 +943,175 @@ class GoodsViewSet(viewsets.ModelViewSet):
         }
 
         return Response(payload, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="export")
+    def export(self, request):
+        """
+        流式导出当前用户的谷子数据（不分页）。
+        URL: /api/goods/export/?file_format=jsonl|csv|zip
+
+        - 复用 list 的过滤/搜索能力（GoodsFilter + SearchFilter）
+        - jsonl（默认）：每行一个谷子，包含 IP / 角色 / 品类 / 位置路径 / 主题 / 图片路径
+        - csv：扁平化字段，多值字段以 | 分隔
+        - zip：goods.jsonl + media/ 目录下的原始图片文件
+        基于 StreamingHttpResponse + iterator(chunk_size)，内存占用与收藏规模无关。
+        """
+        file_format = (request.query_params.get("file_format") or EXPORT_FORMAT_JSONL).lower().strip()
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {"detail": f"file_format 仅支持: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # 导出直接读取 goods.ip / goods.category（不经过序列化器的目录缓存），需一并关联查询
+        queryset = self.filter_queryset(self.get_queryset()).select_related("ip", "category")
+
+        if file_format == EXPORT_FORMAT_JSONL:
+            content = iter_jsonl(queryset)
+            content_type = "application/x-ndjson; charset=utf-8"
+        elif file_format == EXPORT_FORMAT_CSV:
+            content = iter_csv(queryset)
+            content_type = "text/csv; charset=utf-8"
+        else:
+            content = iter_zip(queryset)
+            content_type = "application/zip"
+
+        filename = f"shigu-goods-{timezone.now():%Y%m%d-%H%M%S}.{file_format}"
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        parser_classes=[MultiPartParser, FormParser],
+    )
+    def import_goods(self, request):
+        """
+        批量导入谷子（CSV / JSONL），使用 multipart/form-data。
+        URL: /api/goods/import/
+
+        - file：导入文件（必填），格式与导出接口一致
+        - file_format：csv / jsonl（可选，默认按扩展名推断）
+
+        按名称批量解析 IP / 角色 / 品类 / 位置 / 主题，幂等规则与创建接口一致，
+        已存在的谷子会被跳过；返回逐行错误报告。
+        """
+        upload = request.FILES.get("file")
+        if not upload:
+            return Response(
+                {"detail": "请通过 form-data 提供 file 文件"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        file_format = (request.data.get("file_format") or "").lower().strip()
+        if not file_format:
+            file_format = detect_format(upload.name)
+        if file_format not in IMPORT_FORMATS:
+            return Response(
+                {"detail": f"file_format 仅支持: {', '.join(IMPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        importer = GoodsImporter(request.user)
+        try:
+            result = importer.run(upload, file_format)
+        except UnicodeDecodeError:
+            return Response(
+                {"detail": "文件编码必须为 UTF-8"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except csv.Error as e:
+            return Response(
+                {"detail": f"CSV 解析失败: {e}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(result, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["post"], url_path="batch")
+    def batch(self, request):
+        """
+        批量新建 / 更新 / 删除谷子（JSON）。
+        URL: /api/goods/batch/
+
+        请求体：{"operations": [{"op": "create|update|delete", "id": "...", "data": {...}}]}
+        - 所有操作先整体校验（外键按关联批量查询），任一失败则全部不生效并返回 400
+        - 校验通过后在同一事务内 bulk_create / bulk_update / 批量删除，返回逐条结果
+        - 图片不在此接口处理，仍使用上传接口
+        """
+        operations = request.data.get("operations") if isinstance(request.data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            return Response(
+                {"detail": "operations 必须为非空数组"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(operations) > BATCH_MAX_OPERATIONS:
+            return Response(
+                {"detail": f"单次最多支持 {BATCH_MAX_OPERATIONS} 条操作"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        applied, payload = GoodsBatchProcessor(request.user).run(operations)
+        return Response(
+            payload,
+            status=status.HTTP_200_OK if applied else status.HTTP_400_BAD_REQUEST,
+        )
+
+    def _bulk_update_field(self, request, serializer_class, field, model_field):
+        """
+        集合批量修改单个字段：一次 UPDATE ... WHERE，不逐条实例化模型。
+
+        - 请求体提供 ids：只作用于这些谷子
+        - 否则使用查询参数中的列表筛选条件（GoodsFilter + search），至少需要一个条件
+        范围始终限定在 get_queryset（当前用户 / 管理员全部），已是目标值的谷子不会被更新。
+        """
+        serializer = serializer_class(data=request.data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        value = serializer.validated_data[field]
+        ids = serializer.validated_data.get("ids")
+
+        queryset = Goods.objects.all()
+        if not is_admin(request.user):
+            queryset = queryset.filter(user=request.user)
+
+        if ids:
+            queryset = queryset.filter(id__in=ids)
+        else:
+            filter_params = set(self.filterset_class.base_filters) | {drf_filters.SearchFilter.search_param}
+            if not filter_params.intersection(request.query_params):
+                return Response(
+                    {"detail": "请提供 ids 或至少一个筛选条件"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            # 筛选可能带 JOIN / DISTINCT（角色、搜索），以主键子查询的形式交给 UPDATE
+            matched = self.filter_queryset(self.get_queryset()).values("id")
+            queryset = queryset.filter(id__in=matched)
+
+        queryset = queryset.exclude(**{model_field: value})
+        # 更新后筛选结果可能变化，先取出受影响的公开展柜
+        showcase_ids = public_showcase_ids_for_goods(queryset.values("id"))
+        updated = queryset.update(**{model_field: value, "updated_at": timezone.now()})
+        invalidate_public_cache(showcase_ids)
+        return Response({"updated": updated}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["post"], url_path="bulk-location")
+    def bulk_location(self, request):
+        """
+        批量迁移收纳位置（集合更新）。
+        URL: /api/goods/bulk-location/?<列表筛选参数>
+
+        请求体：{"location": 3, "ids": ["uuid", ...]}（ids 可选，location 传 null 表示清空位置）
+        """
+        return self._bulk_update_field(request, GoodsBulkLocationSerializer, "location", "location")
+
+    @action(detail=False, methods=["post"], url_path="bulk-status")
+    def bulk_status(self, request):
+        """
+        批量修改状态（集合更新）。
+        URL: /api/goods/bulk-status/?<列表筛选参数>
+
+        请求体：{"status": "sold", "ids": ["uuid", ...]}（ids 可选）
+        """
+        return self._bulk_update_field(request, GoodsBulkStatusSerializer, "status", "status")
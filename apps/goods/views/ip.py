@@ -1,7 +1,6 @@
 """
 IP作品相关的视图
 """
-from django.db import transaction
 from django.db.models import Count
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters as drf_filters, status, viewsets
@@ -9,7 +8,9 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from ..models import IP
+from ..ordering_service import bulk_update_order
 from core.permissions import IsAdminOrReadOnly
+from .mixins import CatalogueListMixin
 from ..serializers import (
     IPBatchUpdateOrderSerializer,
     IPDetailSerializer,
@@ -18,11 +19,11 @@ from ..serializers import (
 )
 
 
-class IPViewSet(viewsets.ModelViewSet):
+class IPViewSet(CatalogueListMixin, viewsets.ModelViewSet):
     """
     IP作品CRUD接口。
 
-    - list: 获取所有IP作品列表（包含关键词）
+    - list: 获取所有IP作品列表（包含关键词；不带过滤 / 搜索参数时直接读取进程内目录缓存）
     - retrieve: 获取单个IP作品详情（包含关键词）
     - create: 创建新IP作品（支持同时创建关键词）
     - update: 更新IP作品（支持同时更新关键词）
@@ -39,6 +40,7 @@ class IPViewSet(viewsets.ModelViewSet):
         "subject_type": ["exact", "in"],  # exact: 精确匹配，in: 多值筛选（逗号分隔）
     }
     permission_classes = [IsAdminOrReadOnly]
+    catalogue_attr = "ips"
 
     def get_queryset(self):
         """优化查询，预加载关键词并统计角色数量"""
@@ -82,44 +84,28 @@ class IPViewSet(viewsets.ModelViewSet):
 
         items = serializer.validated_data["items"]
 
-        ip_ids = [item["id"] for item in items]
-        existing_ips = IP.objects.filter(id__in=ip_ids)
-        existing_ids = set(existing_ips.values_list("id", flat=True))
-
-        missing_ids = set(ip_ids) - existing_ids
-        if missing_ids:
-            return Response(
-                {"detail": f"以下IP作品ID不存在: {sorted(missing_ids)}"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
+        # 一次查询取出并校验，一次 bulk_update 写回，直接用内存中的对象返回
         try:
-            with transaction.atomic():
-                ip_dict = {obj.id: obj for obj in existing_ips}
-
-                updated_ips = []
-                for item in items:
-                    ip_obj = ip_dict[item["id"]]
-                    ip_obj.order = item["order"]
-                    ip_obj.save(update_fields=["order"])
-                    updated_ips.append(ip_obj)
-
-                updated_ids = [obj.id for obj in updated_ips]
-                result_ips = IP.objects.filter(id__in=updated_ids).order_by("order", "id")
-                result_serializer = IPSimpleSerializer(
-                    result_ips, many=True, context={"request": request}
-                )
-
-                return Response(
-                    {
-                        "detail": f"成功更新 {len(updated_ips)} 个IP作品的排序",
-                        "updated_count": len(updated_ips),
-                        "ips": result_serializer.data,
-                    },
-                    status=status.HTTP_200_OK,
-                )
+            result_ips, missing_ids = bulk_update_order(self.get_queryset(), items)
         except Exception as e:
             return Response(
                 {"detail": f"更新排序失败: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
+        if missing_ids:
+            return Response(
+                {"detail": f"以下IP作品ID不存在: {missing_ids}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        result_serializer = IPSimpleSerializer(
+            result_ips, many=True, context={"request": request}
+        )
+        return Response(
+            {
+                "detail": f"成功更新 {len(items)} 个IP作品的排序",
+                "updated_count": len(items),
+                "ips": result_serializer.data,
+            },
+            status=status.HTTP_200_OK,
+        )
@@ -0,0 +1,38 @@
+"""
+视图混入
+"""
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from ..catalogue import get_catalogue
+
+
+class CatalogueListMixin:
+    """
+    目录数据（IP / 角色 / 品类）列表：请求不带过滤 / 搜索参数时，
+    直接序列化进程内目录缓存中的对象，不查询数据库；带参数时仍按 filter_queryset 查库。
+
+    catalogue_attr 为目录快照上的列表属性名（"ips" / "characters" / "categories"）。
+    """
+
+    catalogue_attr = None
+
+    def catalogue_list(self):
+        """不带过滤 / 搜索参数时返回目录缓存中的对象列表（顺序与查库一致），否则返回 None"""
+        filter_names = set(getattr(self, "filterset_fields", None) or ())
+        for key in self.request.query_params:
+            if key == api_settings.SEARCH_PARAM or key.split("__")[0] in filter_names:
+                return None
+        return getattr(get_catalogue(), self.catalogue_attr)
+
+    def list(self, request, *args, **kwargs):
+        objects = self.catalogue_list()
+        if objects is None:
+            return super().list(request, *args, **kwargs)
+
+        page = self.paginate_queryset(objects)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(objects, many=True)
+        return Response(serializer.data)
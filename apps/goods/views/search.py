@@ -0,0 +1,49 @@
+"""
+名称模糊检索（自动补全）视图
+"""
+from drf_spectacular.utils import extend_schema
+from rest_framework import status
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from ..name_search_service import autocomplete, parse_types
+from ..serializers import AutocompleteItemSerializer, AutocompleteQuerySerializer
+
+
+@extend_schema(
+    summary="IP / 角色名称自动补全",
+    description="按拼音全拼 / 首字母、英文缩写、全半角与大小写折叠及错别字模糊检索 IP 和角色，按相关度排序。",
+    parameters=[AutocompleteQuerySerializer],
+    responses={200: AutocompleteItemSerializer(many=True)},
+)
+@api_view(["GET"])
+def name_autocomplete(request):
+    """
+    IP / 角色名称自动补全
+
+    GET /api/search/autocomplete/?q=xingtie&type=ip,character&limit=10
+
+    响应:
+    [
+        {
+            "type": "ip",
+            "id": 1,
+            "name": "崩坏：星穹铁道",
+            "matched": "星铁",
+            "score": 0.9,
+            "ip": {"id": 1, "name": "崩坏：星穹铁道"}
+        },
+        ...
+    ]
+    """
+    serializer = AutocompleteQuerySerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+
+    results = autocomplete(
+        params["q"],
+        types=parse_types(params.get("type")),
+        ip_id=params.get("ip"),
+        limit=params["limit"],
+    )
+    return Response(results, status=status.HTTP_200_OK)
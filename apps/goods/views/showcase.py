@@ -1,26 +1,43 @@
 """
 展柜相关的视图
 """
+from django.core.cache import cache
 from django.db import transaction
 from django.db.models import Min, Q
 import random
+import uuid
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 from ..models import Goods, Showcase, ShowcaseGoods
 from ..serializers.showcase import (
     AddGoodsToShowcaseSerializer,
     MoveGoodsInShowcaseSerializer,
     RemoveGoodsFromShowcaseSerializer,
+    ShowcaseBulkGoodsSerializer,
     ShowcaseDetailSerializer,
     ShowcaseGoodsSerializer,
     ShowcaseListSerializer,
 )
+from ..showcase_service import (
+    BULK_MAX_GOODS,
+    GOODS_MAX_PAGE_SIZE,
+    GOODS_PAGE_SIZE,
+    PUBLIC_CACHE_TIMEOUT,
+    InvalidCursor,
+    add_goods_bulk,
+    public_cache_key,
+    remove_goods_bulk,
+    sample_public_showcase_ids,
+    showcase_goods_page,
+)
 from ..utils import compress_image
+from .goods import GoodsFilter
 from core.permissions import IsOwnerOrPublicReadOnly, is_admin
 
 
@@ -49,16 +66,16 @@ class ShowcasePagination(PageNumberPagination):
 class ShowcaseViewSet(viewsets.ModelViewSet):
     """展柜视图集"""
 
-    queryset = Showcase.objects.all().prefetch_related(
-        "showcase_goods__goods__ip", "showcase_goods__goods__characters"
-    )
+    queryset = Showcase.objects.all()
     permission_classes = [IsOwnerOrPublicReadOnly]
 
     # 稀疏排序步长
     ORDER_STEP = 1000
+    # 列表类动作只需要预先计算的预览，不加载展柜中的谷子
+    LIST_ACTIONS = ("list", "public_list", "private_list")
 
     def get_serializer_class(self):
-        if self.action in ["list", "public_list", "private_list"]:
+        if self.action in self.LIST_ACTIONS:
             return ShowcaseListSerializer
         return ShowcaseDetailSerializer
 
@@ -66,16 +83,11 @@ class ShowcaseViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """优化查询，避免 N+1 问题"""
-        qs = (
-            Showcase.objects.all()
-            .prefetch_related(
-                "showcase_goods__goods__ip",
-                "showcase_goods__goods__characters__ip",
-                "showcase_goods__goods__category",
-                "showcase_goods__goods__theme",
-            )
-            .select_related()
-        )
+        # 详情只内嵌少量谷子（序列化器中分页查询），无需预取展柜中的全部谷子
+        if self.action in self.LIST_ACTIONS:
+            qs = Showcase.objects.select_related("preview")
+        else:
+            qs = Showcase.objects.all()
         
         # 如果是公共列表动作，直接返回公开的展柜
         if self.action in ['public_list', 'public']:
@@ -89,8 +101,8 @@ class ShowcaseViewSet(viewsets.ModelViewSet):
 
         user = getattr(self.request, "user", None)
         if not user or not getattr(user, "id", None):
-            # 对于匿名用户，如果是获取详情且该展柜是公开的，允许访问
-            if self.action == 'retrieve':
+            # 对于匿名用户，如果是获取详情 / 谷子分页且该展柜是公开的，允许访问
+            if self.action in ('retrieve', 'goods'):
                 return qs.filter(is_public=True)
             return qs.none()
             
@@ -98,26 +110,49 @@ class ShowcaseViewSet(viewsets.ModelViewSet):
             return qs
         return qs.filter(Q(user=user) | Q(is_public=True))
 
+    def _public_cached(self, request, name, build):
+        """
+        匿名访问公开展柜时缓存响应数据，命中时不查询数据库、不经过序列化器。
+        缓存键含展柜版本号，展柜、展柜谷子或其中的谷子变化时失效（见 showcase_service）。
+        登录用户的响应可能包含私有展柜，不走缓存。
+        """
+        if getattr(request.user, "is_authenticated", False):
+            return build()
+        try:
+            showcase_id = uuid.UUID(str(self.kwargs.get(self.lookup_field)))
+        except ValueError:
+            return build()
+
+        key = public_cache_key(showcase_id, name, request.build_absolute_uri())
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = build()
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, PUBLIC_CACHE_TIMEOUT)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        parent = super().retrieve
+        return self._public_cached(
+            request, "detail", lambda: parent(request, *args, **kwargs)
+        )
+
     @action(detail=False, methods=["get"], url_path="public", permission_classes=[AllowAny])
     def public_list(self, request):
         """
         获取公共展柜列表
-        随机返回 10 条记录，每次刷新结果不同
+        随机返回 10 条记录，每次刷新结果不同（抽样方式见 showcase_service）
         """
         queryset = self.filter_queryset(self.get_queryset())
 
-        # 获取所有符合条件的 ID
-        all_ids = list(queryset.values_list('id', flat=True))
+        # 按随机排序键抽样，不把全部公开展柜 ID 读入内存
+        selected_ids = sample_public_showcase_ids(queryset)
 
-        # 随机抽样 10 个
-        limit = 10
-        if len(all_ids) > limit:
-            selected_ids = random.sample(all_ids, limit)
-        else:
-            selected_ids = all_ids
-
-        # 获取展柜对象
-        selected_showcases = queryset.filter(id__in=selected_ids)
+        # 预览直接读取预先计算的 ShowcasePreview，不加载展柜中的谷子
+        selected_showcases = Showcase.objects.filter(id__in=selected_ids).select_related(
+            "preview"
+        )
 
         serializer = self.get_serializer(selected_showcases, many=True)
         data = list(serializer.data)
@@ -179,17 +214,46 @@ class ShowcaseViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=["get"], url_path="goods")
     def goods(self, request, pk=None):
-        """获取展柜中的所有谷子"""
+        """
+        获取展柜中的谷子（游标分页）
+        按 (order, -created_at, id) 排序，?cursor= 传上一页返回的 next_cursor，
+        ?page_size= 每页数量（默认 50，最大 200）。
+        """
+        return self._public_cached(request, "goods", lambda: self._goods_page(request))
+
+    def _goods_page(self, request):
         showcase = self.get_object()
 
-        queryset = ShowcaseGoods.objects.filter(showcase=showcase).select_related(
-            "goods__ip",
-            "goods__category",
-            "goods__theme",
-        ).prefetch_related("goods__characters__ip")
+        try:
+            page_size = int(request.query_params.get("page_size", GOODS_PAGE_SIZE))
+        except ValueError:
+            return Response(
+                {"detail": "page_size 必须为整数"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        page_size = max(1, min(page_size, GOODS_MAX_PAGE_SIZE))
 
-        serializer = ShowcaseGoodsSerializer(queryset, many=True)
-        return Response(serializer.data)
+        cursor = request.query_params.get("cursor") or None
+        try:
+            items, next_cursor = showcase_goods_page(showcase, cursor, page_size)
+        except InvalidCursor:
+            return Response({"detail": "无效的游标"}, status=status.HTTP_400_BAD_REQUEST)
+
+        next_url = None
+        if next_cursor:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), "cursor", next_cursor
+            )
+        serializer = ShowcaseGoodsSerializer(
+            items, many=True, context=self.get_serializer_context()
+        )
+        return Response(
+            {
+                "next": next_url,
+                "next_cursor": next_cursor,
+                "page_size": page_size,
+                "results": serializer.data,
+            }
+        )
 
     @action(detail=True, methods=["post"], url_path="add-goods")
     def add_goods(self, request, pk=None):
@@ -258,6 +322,92 @@ class ShowcaseViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
+    def _resolve_bulk_goods(self, request, showcase, goods_ids, check_missing):
+        """
+        解析批量操作的谷子范围，返回 (谷子ID列表, 错误响应)。
+        - 提供 goods_ids：一次查询校验这些谷子都属于展柜所有者（check_missing 为 False 时不校验）
+        - 否则使用查询参数中的 GoodsFilter 筛选条件，至少需要一个条件
+        """
+        goods_qs = Goods.objects.all()
+        if not is_admin(request.user):
+            goods_qs = goods_qs.filter(user=showcase.user)
+
+        if goods_ids:
+            if not check_missing:
+                return goods_ids, None
+            found = set(goods_qs.filter(id__in=goods_ids).values_list("id", flat=True))
+            missing = [str(goods_id) for goods_id in goods_ids if goods_id not in found]
+            if missing:
+                return None, Response(
+                    {"detail": "部分谷子不存在", "missing_ids": missing},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return goods_ids, None
+
+        if not set(GoodsFilter.base_filters).intersection(request.query_params):
+            return None, Response(
+                {"detail": "请提供 goods_ids 或至少一个筛选条件"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        filterset = GoodsFilter(request.query_params, queryset=goods_qs, request=request)
+        if not filterset.is_valid():
+            return None, Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        ids = list(
+            dict.fromkeys(filterset.qs.values_list("id", flat=True)[: BULK_MAX_GOODS + 1])
+        )
+        if len(ids) > BULK_MAX_GOODS:
+            return None, Response(
+                {"detail": f"筛选结果超过 {BULK_MAX_GOODS} 个谷子，请缩小范围"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return ids, None
+
+    @action(detail=True, methods=["post"], url_path="bulk-add-goods")
+    def bulk_add_goods(self, request, pk=None):
+        """
+        批量添加谷子到展柜。
+        URL: POST /api/showcases/{id}/bulk-add-goods/?<谷子列表筛选参数>
+
+        请求体：{"goods_ids": ["uuid", ...], "notes": "..."}（goods_ids 可选，不提供时按筛选条件）
+        已在展柜中的谷子跳过；新加入的谷子按给定顺序排在展柜最前。
+        """
+        showcase = self.get_object()
+        serializer = ShowcaseBulkGoodsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        goods_ids, error = self._resolve_bulk_goods(
+            request, showcase, serializer.validated_data.get("goods_ids"), check_missing=True
+        )
+        if error is not None:
+            return error
+
+        added, skipped = add_goods_bulk(
+            showcase, goods_ids, notes=serializer.validated_data.get("notes")
+        )
+        return Response({"added": added, "skipped": skipped}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["post"], url_path="bulk-remove-goods")
+    def bulk_remove_goods(self, request, pk=None):
+        """
+        批量从展柜移除谷子。
+        URL: POST /api/showcases/{id}/bulk-remove-goods/?<谷子列表筛选参数>
+
+        请求体：{"goods_ids": ["uuid", ...]}（goods_ids 可选，不提供时按筛选条件）
+        不在展柜中的谷子忽略。
+        """
+        showcase = self.get_object()
+        serializer = ShowcaseBulkGoodsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        goods_ids, error = self._resolve_bulk_goods(
+            request, showcase, serializer.validated_data.get("goods_ids"), check_missing=False
+        )
+        if error is not None:
+            return error
+
+        removed = remove_goods_bulk(showcase, goods_ids)
+        return Response({"removed": removed}, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=["post"], url_path="move-goods")
     def move_goods(self, request, pk=None):
         """移动展柜中谷子的位置（类似 GoodsViewSet.move）"""
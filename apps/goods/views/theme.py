@@ -1,6 +1,7 @@
 """
 主题（Theme）相关的视图
 """
+from django.db import transaction
 from django.db.models import Count
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters as drf_filters, status, viewsets
@@ -10,7 +11,7 @@ from rest_framework.response import Response
 
 from ..models import Theme, ThemeImage
 from ..serializers import ThemeDetailSerializer, ThemeSimpleSerializer
-from ..utils import compress_image
+from ..media_store import prepare_images, store_prepared
 from core.permissions import IsOwnerOnly, is_admin
 
 
@@ -112,28 +113,49 @@ class ThemeViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         # 创建新图片或同时更新图片和标签
-        for idx, photo in enumerate(additional_photos):
-            compressed = compress_image(photo, max_size_kb=300)
-            image_file = compressed or photo
+        # 先确认要替换的图片都存在，再统一压缩存储，避免中途失败留下无主的图片引用
+        replace_ids = []
+        for photo_id_str in photo_ids:
+            try:
+                replace_ids.append(int(photo_id_str))
+            except ValueError:
+                return Response(
+                    {"detail": f"图片 ID {photo_id_str} 不存在或不属于该主题"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        existing = {
+            image.id: image
+            for image in ThemeImage.objects.filter(id__in=replace_ids, theme=instance)
+        }
+        for photo_id in replace_ids:
+            if photo_id not in existing:
+                return Response(
+                    {"detail": f"图片 ID {photo_id} 不存在或不属于该主题"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
-            if photo_ids and idx < len(photo_ids):
-                try:
-                    photo_id = int(photo_ids[idx])
-                    theme_image = ThemeImage.objects.get(id=photo_id, theme=instance)
-                    theme_image.image = image_file
+        # 多张图片在进程池中并行压缩并写入存储（事务外），事务内只占用引用并写入图片记录，
+        # 新图片一次 bulk_create 写入
+        prepared = prepare_images(additional_photos, max_size_kb=300)
+        new_images = []
+        with transaction.atomic():
+            currents = [existing[photo_id].image.name for photo_id in replace_ids]
+            image_names = store_prepared(prepared, currents=currents)
+            for idx, image_name in enumerate(image_names):
+                if idx < len(replace_ids):
+                    theme_image = existing[replace_ids[idx]]
+                    theme_image.image = image_name
                     theme_image.label = label if label else None
                     theme_image.save()
-                except (ThemeImage.DoesNotExist, ValueError):
-                    return Response(
-                        {"detail": f"图片 ID {photo_ids[idx]} 不存在或不属于该主题"},
-                        status=status.HTTP_400_BAD_REQUEST,
+                else:
+                    new_images.append(
+                        ThemeImage(
+                            theme=instance,
+                            image=image_name,
+                            label=label if label else None,
+                        )
                     )
-            else:
-                ThemeImage.objects.create(
-                    theme=instance,
-                    image=image_file,
-                    label=label if label else None,
-                )
+            ThemeImage.objects.bulk_create(new_images)
 
         serializer = ThemeDetailSerializer(
             instance, context=self.get_serializer_context()
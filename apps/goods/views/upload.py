@@ -0,0 +1,190 @@
+"""
+分片（可续传）上传相关的视图
+"""
+from django.db import transaction
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.response import Response
+
+from ..media_store import store_image
+from ..models import Goods, GuziImage, Theme, ThemeImage, UploadSession
+from ..serializers import (
+    GoodsDetailSerializer,
+    ThemeDetailSerializer,
+    UploadFinalizeSerializer,
+    UploadSessionSerializer,
+)
+from ..upload_service import (
+    UploadError,
+    abort,
+    create_session,
+    finalize,
+    parse_content_range,
+    write_chunk,
+)
+from core.permissions import IsOwnerOnly, is_admin
+
+
+class ChunkedUploadViewSet(
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    分片（可续传）图片上传接口。
+
+    - create: 登记上传会话（文件名、总大小），返回建议分片大小
+    - retrieve: 查询已接收大小，网络中断后从该位置续传
+    - upload_chunk (PUT): 按偏移量上传一个分片（请求体为原始字节）
+    - finalize: 全部分片到达后交给压缩 / 存储流程，并挂到谷子或主题上
+    - destroy: 放弃上传
+    """
+
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsOwnerOnly]
+    parser_classes = (JSONParser, FormParser, MultiPartParser)
+
+    def get_queryset(self):
+        qs = UploadSession.objects.all()
+        user = getattr(self.request, "user", None)
+        if not user or not getattr(user, "id", None):
+            return qs.none()
+        if is_admin(user):
+            return qs
+        return qs.filter(user=user)
+
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session = create_session(
+            request.user,
+            serializer.validated_data["file_name"],
+            serializer.validated_data["total_size"],
+        )
+        return Response(self.get_serializer(session).data, status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, pk=None):
+        abort(self.get_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def update(self, request, pk=None):
+        """
+        上传一个分片。
+        URL: PUT /api/uploads/{id}/
+
+        - 请求体：分片原始字节（Content-Type: application/octet-stream）
+        - 偏移量：优先读取 Content-Range: bytes <start>-<end>/<total>，
+          否则使用 ?offset=<start>（默认为当前已接收大小）
+        请求体直接从输入流分块写入临时文件，不经过表单解析，也不整块读入内存。
+        """
+        session = self.get_object()
+        content_range = request.META.get("HTTP_CONTENT_RANGE")
+        try:
+            if content_range:
+                offset, length = parse_content_range(content_range, session.total_size)
+            else:
+                try:
+                    offset = int(request.query_params.get("offset", session.received_size))
+                    length = int(request.META.get("CONTENT_LENGTH") or 0)
+                except ValueError:
+                    raise UploadError("offset 必须为整数")
+            received = write_chunk(session, request.stream, offset, length)
+        except UploadError as e:
+            return Response(
+                {"detail": e.detail, "received_size": session.received_size},
+                status=e.status,
+            )
+        return Response(
+            {
+                "id": str(session.pk),
+                "received_size": received,
+                "total_size": session.total_size,
+                "complete": session.is_complete,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=True, methods=["post"], url_path="finalize")
+    def finalize(self, request, pk=None):
+        """
+        完成上传并挂到目标对象上。
+        URL: POST /api/uploads/{id}/finalize/
+
+        请求体：{"target": "goods_main_photo|goods_additional_photo|theme_image",
+                 "goods_id": "...", "theme_id": 1, "photo_id": 10, "label": "..."}
+        返回值与对应的上传接口一致（谷子详情 / 主题详情）。
+        """
+        session = self.get_object()
+        serializer = UploadFinalizeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        target = params["target"]
+        label = (params.get("label") or "").strip() or None
+        owner_filter = {} if is_admin(request.user) else {"user": request.user}
+
+        # 先确认目标存在，再组装文件，避免占用无主的图片引用
+        if target.startswith("goods_"):
+            goods = Goods.objects.filter(pk=params["goods_id"], **owner_filter).first()
+            if goods is None:
+                return Response({"detail": "谷子不存在"}, status=status.HTTP_404_NOT_FOUND)
+            parent, image_model, parent_field = goods, GuziImage, "guzi"
+        else:
+            theme = Theme.objects.filter(pk=params["theme_id"], **owner_filter).first()
+            if theme is None:
+                return Response({"detail": "主题不存在"}, status=status.HTTP_404_NOT_FOUND)
+            parent, image_model, parent_field = theme, ThemeImage, "theme"
+
+        existing = None
+        if target != "goods_main_photo" and params.get("photo_id"):
+            existing = image_model.objects.filter(
+                pk=params["photo_id"], **{parent_field: parent}
+            ).first()
+            if existing is None:
+                return Response(
+                    {"detail": "图片不存在或不属于该对象"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        def attach(upload):
+            with transaction.atomic():
+                if target == "goods_main_photo":
+                    current = parent.main_photo.name
+                else:
+                    current = existing.image.name if existing is not None else None
+                image_name = store_image(upload, max_size_kb=300, current=current)
+                if target == "goods_main_photo":
+                    parent.main_photo = image_name
+                    parent.save(update_fields=["main_photo", "updated_at"])
+                    return
+                if existing is not None:
+                    existing.image = image_name
+                    existing.label = label
+                    existing.save()
+                else:
+                    image_model.objects.create(
+                        image=image_name,
+                        label=label,
+                        **{parent_field: parent},
+                    )
+                if target == "goods_additional_photo":
+                    parent.save(update_fields=["updated_at"])
+
+        try:
+            finalize(session, attach)
+        except UploadError as e:
+            return Response(
+                {"detail": e.detail, "received_size": session.received_size},
+                status=e.status,
+            )
+
+        if target.startswith("goods_"):
+            parent = (
+                Goods.objects.select_related("location", "theme")
+                .prefetch_related("characters", "additional_photos")
+                .get(pk=parent.pk)
+            )
+            data = GoodsDetailSerializer(parent, context=self.get_serializer_context()).data
+        else:
+            parent = Theme.objects.prefetch_related("images").get(pk=parent.pk)
+            data = ThemeDetailSerializer(parent, context=self.get_serializer_context()).data
+        return Response(data, status=status.HTTP_200_OK)
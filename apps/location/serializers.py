@@ -1,7 +1,10 @@
+from django.db import transaction
 from rest_framework import serializers
 
 from .models import StorageNode
+from .tree_service import INVALID_MOVE_MESSAGE, InvalidMove, check_move, sync_subtree_paths
 from core.permissions import is_admin
+from core.tree import PathTooLong, descendant_ids, node_path
 
 
 class StorageNodeSerializer(serializers.ModelSerializer):
@@ -51,7 +54,11 @@ class StorageNodeSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
     def update(self, instance, validated_data):
-        """更新节点时，如果父节点或名称改变，自动更新 path_name"""
+        """
+        更新节点时，如果父节点或名称改变，自动更新 path_name。
+        当前节点路径变化后，在同一事务内用一条 UPDATE 把所有子孙节点的路径前缀替换为新路径，
+        并使展示这些位置下谷子的公开展柜缓存失效（谷子卡片中包含 location_path）。
+        """
         parent = validated_data.get("parent", instance.parent)
         name = validated_data.get("name", instance.name)
         path_name = validated_data.get("path_name")
@@ -72,7 +79,38 @@ class StorageNodeSerializer(serializers.ModelSerializer):
                     path_name = name
                 validated_data["path_name"] = path_name
 
-        return super().update(instance, validated_data)
+        old_path = node_path(instance)
+        path_changed = validated_data.get("path_name", instance.path_name) != instance.path_name
+        try:
+            check_move(StorageNode, instance, parent)
+        except InvalidMove:
+            raise serializers.ValidationError({"parent": INVALID_MOVE_MESSAGE})
+        subtree_ids = descendant_ids(StorageNode, instance.pk) if path_changed else []
+
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            try:
+                sync_subtree_paths(instance, old_path, subtree_ids)
+            except PathTooLong:
+                raise serializers.ValidationError({"path_name": "子节点的完整路径超出长度限制"})
+        return instance
+
+
+class StorageNodeMoveSerializer(serializers.Serializer):
+    """移动子树序列化器"""
+    parent = serializers.PrimaryKeyRelatedField(
+        queryset=StorageNode.objects.all(),
+        allow_null=True,
+        help_text="新的父节点 ID，null 表示移动为顶层节点",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        user = getattr(request, "user", None) if request is not None else None
+        if user is None or not getattr(user, "id", None) or is_admin(user):
+            return
+        self.fields["parent"].queryset = StorageNode.objects.filter(user=user)
 
 
 class StorageNodeTreeSerializer(serializers.ModelSerializer):
@@ -86,3 +124,13 @@ class StorageNodeTreeSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "parent", "path_name", "order")
 
 
+class StorageNodeTreeWithCountsSerializer(StorageNodeTreeSerializer):
+    """
+    位置树（带谷子统计）序列化器。
+    统计值由视图一次性计算后通过 context["counts"] 传入：{node_id: {...}}。
+    """
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data.update(self.context["counts"][instance.id])
+        return data
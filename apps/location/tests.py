@@ -1,3 +1,74 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.goods.models import IP, Category, Goods
+from apps.users.models import Role, User
+
+from .models import StorageNode
+
+
+class StorageNodeTreeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username="u1", password="", role=Role.objects.get_or_create(name="User")[0]
+        )
+        cls.room = StorageNode.objects.create(name="书房", path_name="书房", user=cls.user)
+        cls.shelf = StorageNode.objects.create(
+            name="书架A", parent=cls.room, path_name="书房/书架A", user=cls.user
+        )
+        cls.layer = StorageNode.objects.create(
+            name="第3层", parent=cls.shelf, path_name="书房/书架A/第3层", user=cls.user
+        )
+        cls.bedroom = StorageNode.objects.create(name="卧室", path_name="卧室", user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def paths(self):
+        return dict(StorageNode.objects.values_list("name", "path_name"))
+
+    def test_rename_rewrites_descendant_paths(self):
+        response = self.client.patch(
+            f"/api/location/nodes/{self.room.id}/", {"name": "工作室"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.paths()["书架A"], "工作室/书架A")
+        self.assertEqual(self.paths()["第3层"], "工作室/书架A/第3层")
+
+    def test_move_rewrites_descendant_paths(self):
+        response = self.client.post(
+            f"/api/location/nodes/{self.shelf.id}/move/", {"parent": self.bedroom.id}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["path_name"], "卧室/书架A")
+        self.assertEqual(self.paths()["第3层"], "卧室/书架A/第3层")
+
+    def test_move_under_descendant_is_rejected(self):
+        for parent in (self.room, self.layer):
+            with self.subTest(parent=parent.name):
+                response = self.client.post(
+                    f"/api/location/nodes/{self.room.id}/move/", {"parent": parent.id}, format="json"
+                )
+                self.assertEqual(response.status_code, 400)
+                response = self.client.patch(
+                    f"/api/location/nodes/{self.room.id}/", {"parent": parent.id}, format="json"
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("parent", response.data)
+        self.assertEqual(self.paths()["书房"], "书房")
+
+    def test_delete_removes_subtree_and_clears_goods_location(self):
+        goods = Goods.objects.create(
+            user=self.user,
+            name="吧唧",
+            ip=IP.objects.create(name="崩坏：星穹铁道"),
+            category=Category.objects.create(name="吧唧", path_name="吧唧"),
+            location=self.layer,
+        )
+        response = self.client.delete(f"/api/location/nodes/{self.room.id}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(list(StorageNode.objects.all()), [self.bedroom])
+        goods.refresh_from_db()
+        self.assertIsNone(goods.location_id)
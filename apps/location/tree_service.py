@@ -0,0 +1,116 @@
+"""
+收纳节点子树操作服务模块
+- 删除子树：子树以 WITH RECURSIVE 子查询内联，一条 UPDATE 取消子树内谷子的位置，再一条 DELETE 删除整棵子树，
+  不再经由 ORM 级联收集器逐层加载 / 删除节点
+- 移动子树：更新节点自身后，一条 UPDATE 用前缀替换重写全部子孙节点的 path_name
+- 位置树统计：一条分组查询取出各节点直接存放的谷子统计，再在内存中沿树向上汇总
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from apps.goods.models import Goods
+from apps.goods.showcase_service import invalidate_goods_public_cache
+from core.tree import (
+    InvalidMove,
+    build_path,
+    check_move,
+    descendant_ids,
+    node_path,
+    rewrite_subtree_paths,
+    rollup,
+    subtree_ids,
+)
+
+from .models import StorageNode
+
+# 移动到自身或子孙节点下（check_move 抛出 InvalidMove）时的提示
+INVALID_MOVE_MESSAGE = "不能将节点移动到自身或其子节点下"
+
+
+def sync_subtree_paths(node, old_path, subtree_ids):
+    """
+    节点路径（node_path）已从 old_path 变为当前值后，重写子孙节点路径，
+    并使包含子树内谷子的公开展柜缓存失效（谷子卡片中包含 location_path）。
+    需在调用方的事务中执行；子孙路径超长时抛出 PathTooLong。
+    """
+    new_path = node_path(node)
+    if new_path == old_path:
+        return
+    rewrite_subtree_paths(StorageNode, subtree_ids, old_path, new_path)
+    invalidate_goods_public_cache(
+        Goods.objects.filter(location_id__in=[node.pk, *subtree_ids]).values("id")
+    )
+
+
+def move_subtree(node, new_parent):
+    """
+    把节点（连同整棵子树）移动到 new_parent 下（None 表示移动为顶层节点）。
+    """
+    check_move(StorageNode, node, new_parent)
+    subtree_ids = descendant_ids(StorageNode, node.pk)
+
+    old_path = node_path(node)
+    node.parent = new_parent
+    node.path_name = build_path(new_parent, node.name)
+    with transaction.atomic():
+        node.save(update_fields=["parent", "path_name"])
+        sync_subtree_paths(node, old_path, subtree_ids)
+    return node
+
+
+def delete_subtree(node):
+    """
+    删除节点及其全部子孙节点，子树内谷子的位置置空。
+    返回删除的节点数量。
+
+    子树节点先在事务内加锁，并发新建的谷子引用这些节点时需等待本事务结束；
+    锁不生效的数据库（如 SQLite）上并发写入的引用由外键约束拦截，抛出 IntegrityError（由调用方处理）。
+    """
+    subtree = subtree_ids(StorageNode, node.pk)
+    goods_qs = Goods.objects.filter(location_id__in=subtree)
+    nodes = StorageNode.objects.filter(id__in=subtree)
+
+    with transaction.atomic():
+        list(nodes.select_for_update().values_list("id"))
+        invalidate_goods_public_cache(goods_qs.values("id"))
+        goods_qs.update(location=None)
+        # 谷子引用已在上一步以一条 UPDATE 解除，删除收集器只需确认子树内的节点
+        _, deleted = nodes.delete()
+        return deleted.get(StorageNode._meta.label, 0)
+
+
+STAT_ZEROS = {"goods_count": 0, "quantity_sum": 0, "value_sum": Decimal("0.00")}
+
+
+def goods_stats_by_node(nodes, goods_qs):
+    """
+    位置树各节点的谷子统计，返回 {node_id: {...}}：
+    - goods_count / quantity_sum / value_sum：直接存放在该节点的谷子
+    - subtree_goods_count / subtree_quantity_sum / subtree_value_sum：该节点及全部子孙节点合计
+
+    金额按 quantity * price 估算（price 为空按 0 计），与谷子统计接口一致。
+    """
+    value_expr = ExpressionWrapper(
+        F("quantity") * Coalesce(F("price"), Value(Decimal("0.00"))),
+        output_field=DecimalField(max_digits=20, decimal_places=2),
+    )
+    direct = {
+        row.pop("location_id"): row
+        for row in goods_qs.filter(location__isnull=False)
+        .order_by()
+        .values("location_id")
+        .annotate(goods_count=Count("id"), quantity_sum=Sum("quantity"), value_sum=Sum(value_expr))
+    }
+    subtree = rollup([(node.id, node.parent_id) for node in nodes], direct, STAT_ZEROS)
+
+    stats = {}
+    for node in nodes:
+        own = direct.get(node.id, {})
+        stats[node.id] = {field: own.get(field) or zero for field, zero in STAT_ZEROS.items()}
+        stats[node.id].update(
+            {f"subtree_{field}": value for field, value in subtree[node.id].items()}
+        )
+    return stats
@@ -1,4 +1,4 @@
-from django.db import transaction
+from django.db import IntegrityError
 from rest_framework import generics, status
 from rest_framework.response import Response
 
@@ -6,8 +6,21 @@ from apps.goods.models import Goods
 from apps.goods.serializers import GoodsListSerializer
 
 from .models import StorageNode
-from .serializers import StorageNodeSerializer, StorageNodeTreeSerializer
+from .serializers import (
+    StorageNodeMoveSerializer,
+    StorageNodeSerializer,
+    StorageNodeTreeSerializer,
+    StorageNodeTreeWithCountsSerializer,
+)
+from .tree_service import (
+    INVALID_MOVE_MESSAGE,
+    InvalidMove,
+    delete_subtree,
+    goods_stats_by_node,
+    move_subtree,
+)
 from core.permissions import IsOwnerOnly, is_admin
+from core.tree import PathTooLong, subtree_ids
 
 
 class StorageNodeListCreateView(generics.ListCreateAPIView):
@@ -47,8 +60,8 @@ class StorageNodeDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsOwnerOnly]
 
     def get_queryset(self):
-        """优化查询，预加载父节点和子节点"""
-        qs = StorageNode.objects.select_related("parent").prefetch_related("children")
+        """优化查询，预加载父节点（子树操作由 tree_service 以集合方式完成，无需预加载子节点）"""
+        qs = StorageNode.objects.select_related("parent")
         user = getattr(self.request, "user", None)
         if not user or not getattr(user, "id", None):
             return qs.none()
@@ -56,48 +69,63 @@ class StorageNodeDetailView(generics.RetrieveUpdateDestroyAPIView):
             return qs
         return qs.filter(user=user)
 
-    def get_all_descendants(self, node):
-        """
-        递归获取节点的所有后代节点（包括子节点、子节点的子节点等）
-        返回包含该节点及其所有后代的列表
-        """
-        descendants = [node]
-        children = node.children.all()
-        for child in children:
-            descendants.extend(self.get_all_descendants(child))
-        return descendants
-
-    @transaction.atomic
     def destroy(self, request, *args, **kwargs):
         """
-        删除节点时：
-        1. 递归获取所有子节点（包括子节点的子节点）
-        2. 取消所有节点关联的商品（将商品的 location 设置为 null）
-        3. 删除根节点（由于 CASCADE，删除父节点会自动删除所有子节点）
+        删除节点时，由 tree_service.delete_subtree 完成：
+        1. 锁定子树节点，一条 UPDATE 取消子树内所有商品的位置（location 置为 null）
+        2. 通过 queryset.delete() 删除整棵子树
+        子树均以 WITH RECURSIVE 子查询内联，不再单独查询子孙节点
         """
         instance = self.get_object()
-        
-        # 获取所有要删除的节点（包括当前节点及其所有后代）
-        nodes_to_delete = self.get_all_descendants(instance)
-        node_ids = [node.id for node in nodes_to_delete]
-        
-        # 取消所有关联的商品（将 location 设置为 null）
-        # 虽然 Goods 的 location 使用了 on_delete=models.SET_NULL，
-        # 但为了确保在删除前显式处理，我们先取消关联
-        from apps.goods.models import Goods
-        Goods.objects.filter(user=instance.user, location_id__in=node_ids).update(location=None)
-        
-        # 删除根节点（由于 parent 字段使用了 on_delete=models.CASCADE，
-        # 删除父节点时，Django 会自动删除所有子节点）
-        instance.delete()
-        
+        try:
+            delete_subtree(instance)
+        except IntegrityError:
+            return Response(
+                {"detail": "删除期间有商品放入此位置或其子位置，请刷新后重试"},
+                status=status.HTTP_409_CONFLICT,
+            )
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class StorageNodeMoveView(generics.GenericAPIView):
+    """
+    移动收纳节点（连同整棵子树）到新的父节点下。
+
+    - POST: {"parent": <id|null>}
+    - 节点自身与所有子孙节点的 path_name 同步更新
+    """
+
+    serializer_class = StorageNodeMoveSerializer
+    permission_classes = [IsOwnerOnly]
+
+    def get_queryset(self):
+        qs = StorageNode.objects.select_related("parent")
+        user = getattr(self.request, "user", None)
+        if not user or not getattr(user, "id", None):
+            return qs.none()
+        if is_admin(user):
+            return qs
+        return qs.filter(user=user)
+
+    def post(self, request, *args, **kwargs):
+        instance = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            move_subtree(instance, serializer.validated_data["parent"])
+        except InvalidMove:
+            return Response({"detail": INVALID_MOVE_MESSAGE}, status=status.HTTP_400_BAD_REQUEST)
+        except PathTooLong:
+            return Response({"detail": "子节点的完整路径超出长度限制"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(StorageNodeSerializer(instance, context=self.get_serializer_context()).data)
+
+
 class StorageNodeTreeView(generics.ListAPIView):
     """
     位置树一次性下发接口：
     - 返回所有节点的扁平列表（带 parent），前端在 Pinia 中组装为树。
+    - ?with_counts=1：每个节点附带直接 / 子树的谷子数量、件数与估算金额，
+      由一条分组查询加内存汇总得到，无需逐个节点请求商品接口。
     - 更新频率极低，后续可在此视图外层加缓存（例如 Redis）。
     """
 
@@ -114,6 +142,20 @@ class StorageNodeTreeView(generics.ListAPIView):
             return qs
         return qs.filter(user=user)
 
+    def list(self, request, *args, **kwargs):
+        with_counts = request.query_params.get("with_counts", "").lower() in ("1", "true")
+        if not with_counts:
+            return super().list(request, *args, **kwargs)
+
+        nodes = list(self.filter_queryset(self.get_queryset()))
+        goods_qs = Goods.objects.all()
+        if not is_admin(request.user):
+            goods_qs = goods_qs.filter(user=request.user)
+        context = self.get_serializer_context()
+        context["counts"] = goods_stats_by_node(nodes, goods_qs)
+        serializer = StorageNodeTreeWithCountsSerializer(nodes, many=True, context=context)
+        return Response(serializer.data)
+
 
 class StorageNodeGoodsView(generics.ListAPIView):
     """
@@ -144,9 +186,8 @@ class StorageNodeGoodsView(generics.ListAPIView):
 
         # 如果包含子节点，需要获取所有子节点 ID
         if include_children:
-            # 获取所有子节点（包括子节点的子节点）
-            all_nodes = self.get_all_descendants(node)
-            node_ids = [n.id for n in all_nodes]
+            # 整棵子树以 WITH RECURSIVE 子查询内联到商品查询中
+            node_ids = subtree_ids(StorageNode, node.id)
         else:
             # 只查询当前节点
             node_ids = [node.id]
@@ -158,21 +199,9 @@ class StorageNodeGoodsView(generics.ListAPIView):
 
         queryset = (
             goods_qs.filter(location_id__in=node_ids)
-            .select_related("ip", "category", "location")
-            .prefetch_related("characters__ip", "additional_photos")
+            .select_related("location", "theme")
+            .prefetch_related("characters", "additional_photos")
             .order_by("-created_at")
         )
 
         return queryset
-
-    def get_all_descendants(self, node):
-        """
-        递归获取节点的所有后代节点（包括子节点、子节点的子节点等）
-        返回包含该节点及其所有后代的列表
-        """
-        descendants = [node]
-        children = node.children.all()
-        for child in children:
-            descendants.extend(self.get_all_descendants(child))
-        return descendants
-
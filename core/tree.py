@@ -0,0 +1,196 @@
+"""
+Helpers for adjacency-list trees (Category, StorageNode).
+
+Subtree and ancestor lookups use ``WITH RECURSIVE`` (SQLite and PostgreSQL),
+so a whole subtree is resolved in one round trip, or inlined as a subquery
+with no extra round trip at all.
+
+Both models keep a denormalized ``path_name`` such as "书房/书架A/第3层";
+these helpers keep descendants consistent when a node is renamed or moved.
+"""
+from __future__ import annotations
+
+from django.db import connection
+from django.db.models import Max, QuerySet, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Concat, Length, Substr
+
+PATH_SEPARATOR = "/"
+# Upper bound for ancestor walks; guards against corrupted (cyclic) data.
+MAX_DEPTH = 64
+
+
+class PathTooLong(ValueError):
+    pass
+
+
+class InvalidMove(ValueError):
+    """The new parent is the node itself or one of its descendants."""
+
+
+def _tree_columns(model):
+    qn = connection.ops.quote_name
+    return (
+        qn(model._meta.db_table),
+        qn(model._meta.pk.column),
+        qn(model._meta.get_field("parent").column),
+    )
+
+
+def _roots_sql(roots):
+    """SQL list (without parentheses) and params for an id, ids or an id queryset."""
+    if isinstance(roots, QuerySet):
+        sql, params = roots.order_by().query.sql_with_params()
+        return sql, list(params)
+    if isinstance(roots, (list, tuple, set)):
+        roots = list(roots)
+        if not roots:
+            return "NULL", []
+        return ", ".join(["%s"] * len(roots)), roots
+    return "%s", [roots]
+
+
+def subtree_ids(model, roots, include_self: bool = True) -> RawSQL:
+    """
+    Subquery expression selecting every node id in the subtrees under
+    ``roots`` (an id, a list of ids, or a ``values("id")`` queryset).
+    Use it as ``queryset.filter(category_id__in=subtree_ids(Category, pk))``
+    so the recursive lookup runs inside the outer query.
+
+    UNION (not UNION ALL) stops the recursion even if the data has a cycle.
+    """
+    table, pk, parent = _tree_columns(model)
+    roots_sql, params = _roots_sql(roots)
+    anchor = pk if include_self else parent
+    sql = (
+        f"WITH RECURSIVE subtree(id) AS ("
+        f"SELECT {pk} FROM {table} WHERE {anchor} IN ({roots_sql}) "
+        f"UNION "
+        f"SELECT child.{pk} FROM {table} child JOIN subtree ON child.{parent} = subtree.id"
+        f") SELECT id FROM subtree"
+    )
+    return RawSQL(sql, params)
+
+
+def descendant_ids(model, root_id, include_self: bool = False) -> list:
+    """Ids of every descendant of ``root_id`` (the root excluded by default), in one query."""
+    expression = subtree_ids(model, root_id, include_self=include_self)
+    with connection.cursor() as cursor:
+        cursor.execute(expression.sql, expression.params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def ancestor_ids(model, node_id) -> list:
+    """Ids of every ancestor of ``node_id``, root first (the node excluded), in one query."""
+    table, pk, parent = _tree_columns(model)
+    sql = (
+        f"WITH RECURSIVE chain(id, parent_id, depth) AS ("
+        f"SELECT {pk}, {parent}, 0 FROM {table} WHERE {pk} = %s "
+        f"UNION ALL "
+        f"SELECT node.{pk}, node.{parent}, chain.depth + 1 "
+        f"FROM {table} node JOIN chain ON node.{pk} = chain.parent_id "
+        f"WHERE chain.depth < %s"
+        f") SELECT id FROM chain WHERE depth > 0 ORDER BY depth DESC"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [node_id, MAX_DEPTH])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def count_in_subtree(queryset, field: str, model, root_id) -> int:
+    """Number of rows in ``queryset`` whose ``field`` points into the subtree of ``root_id``."""
+    return queryset.filter(**{f"{field}__in": subtree_ids(model, root_id)}).count()
+
+
+def node_path(node) -> str:
+    """
+    The path descendants of ``node`` are built from: its path_name, or its
+    name when path_name is empty (see build_path).
+    """
+    return node.path_name or node.name
+
+
+def build_path(parent, name: str) -> str:
+    """path_name for a node called ``name`` under ``parent`` (None for a root)."""
+    if parent is None:
+        return name
+    return f"{node_path(parent)}{PATH_SEPARATOR}{name}"
+
+
+def check_move(model, node, new_parent) -> None:
+    """
+    Raise InvalidMove if putting ``node`` under ``new_parent`` (None for a
+    root) would create a cycle, i.e. ``node`` is the new parent or one of its
+    ancestors. Walks the new parent's ancestor chain (one query, bounded by
+    MAX_DEPTH) rather than the node's whole subtree.
+    """
+    if new_parent is None or new_parent.pk == node.parent_id:
+        return
+    if new_parent.pk == node.pk or node.pk in ancestor_ids(model, new_parent.pk):
+        raise InvalidMove("a node cannot be moved under itself or one of its descendants")
+
+
+def rewrite_subtree_paths(model, node_ids, old_path: str, new_path: str) -> int:
+    """
+    Replace the ``old_path/`` prefix with ``new_path/`` on the given descendant
+    nodes in a single UPDATE. Rows whose path_name does not start with the old
+    prefix (manually overridden paths) are left untouched.
+
+    Raises PathTooLong (before writing anything) if a rewritten path would not
+    fit into the path_name column.
+    """
+    if not node_ids or not old_path or old_path == new_path:
+        return 0
+
+    old_prefix = old_path + PATH_SEPARATOR
+    new_prefix = new_path + PATH_SEPARATOR
+    queryset = model.objects.filter(id__in=node_ids, path_name__startswith=old_prefix)
+
+    if len(new_prefix) > len(old_prefix):
+        max_length = model._meta.get_field("path_name").max_length
+        longest = queryset.aggregate(longest=Max(Length("path_name")))["longest"] or 0
+        if longest - len(old_prefix) + len(new_prefix) > max_length:
+            raise PathTooLong(f"path_name would exceed {max_length} characters")
+
+    return queryset.update(
+        path_name=Concat(Value(new_prefix), Substr("path_name", len(old_prefix) + 1))
+    )
+
+
+def rollup(nodes, direct: dict, zeros: dict) -> dict:
+    """
+    Roll per-node values up the tree in memory.
+
+    ``nodes`` is the flat list of (id, parent_id) pairs, ``direct`` maps a
+    node id to ``{field: value}`` for that node alone, and ``zeros`` maps
+    each field to its zero value (used for missing ids and NULL sums).
+    Returns ``{node_id: {field: subtree_total}}`` for every node; nodes whose
+    parent is not in ``nodes`` are treated as roots.
+    """
+    parent_of = dict(nodes)
+    totals = {
+        node_id: {
+            field: direct.get(node_id, {}).get(field) or zero for field, zero in zeros.items()
+        }
+        for node_id in parent_of
+    }
+
+    depth = {}
+
+    def depth_of(node_id):
+        chain = []
+        while node_id in parent_of and node_id not in depth and len(chain) <= MAX_DEPTH:
+            chain.append(node_id)
+            node_id = parent_of[node_id]
+        base = depth.get(node_id, -1)
+        for offset, item in enumerate(reversed(chain), start=1):
+            depth[item] = base + offset
+        return depth[chain[0]] if chain else base
+
+    # Deepest nodes first, so every child is complete before it is added to its parent.
+    for node_id in sorted(parent_of, key=depth_of, reverse=True):
+        parent_id = parent_of[node_id]
+        if parent_id in totals and parent_id != node_id:
+            for field in zeros:
+                totals[parent_id][field] += totals[node_id][field]
+    return totals